@@ -0,0 +1,166 @@
+import os
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session, joinedload
+
+from app import models
+
+Estimativa = models.EstimativaDuracao
+
+# Boxes de lavagem atendendo ao mesmo tempo
+BOXES = int(os.getenv("DJWASH_BOXES", "2"))
+# Serviço sem nenhum histórico: duração assumida
+DURACAO_PADRAO = 60 * 60
+# A média acompanha as últimas ~JANELA lavagens (depois vira média móvel exponencial)
+JANELA = 20
+# Durações fora desta faixa (serviço esquecido aberto, finalizado por engano) não entram na média
+DURACAO_MINIMA = 5 * 60
+DURACAO_MAXIMA = 12 * 3600
+# Lavagem que já passou da previsão: assume que termina em alguns minutos
+FOLGA_ATRASO = timedelta(minutes=10)
+
+
+def _categoria(categoria: Optional[str]) -> str:
+    return (categoria or "").strip().lower() or "hatch"
+
+
+# --- ESTIMATIVA DE DURAÇÃO (SERVIÇO x CATEGORIA) ---
+def registrar_duracao(db: Session, lavagem: models.Lavagem, segundos: float):
+    """Atualiza a média de duração na transação do chamador (um upsert, sem reler o histórico).
+
+    Chamar antes de marcar a lavagem como concluída: o reenvio da finalização (lavagem já
+    concluída) não conta a amostra de novo.
+    """
+    if lavagem.status == "concluida" or lavagem.servico_id is None:
+        return
+    if not DURACAO_MINIMA <= segundos <= DURACAO_MAXIMA:
+        return
+    categoria = lavagem.veiculo.categoria if lavagem.veiculo else None
+    stmt = insert(Estimativa).values(
+        servico_id=lavagem.servico_id, categoria=_categoria(categoria), amostras=1, media_segundos=segundos
+    )
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Estimativa.servico_id, Estimativa.categoria],
+        set_={
+            "amostras": Estimativa.amostras + 1,
+            "media_segundos": Estimativa.media_segundos + (
+                stmt.excluded.media_segundos - Estimativa.media_segundos
+            ) / func.min(Estimativa.amostras + 1, JANELA),
+        }
+    ))
+
+
+def estimar_do_historico(conn):
+    # Média a partir das lavagens já concluídas (depois de uma importação)
+    duracao = "(julianday(l.data_fim) - julianday(l.data_inicio)) * 86400"
+    conn.exec_driver_sql("DELETE FROM estimativas_duracao")
+    conn.exec_driver_sql(
+        "INSERT INTO estimativas_duracao (servico_id, categoria, amostras, media_segundos) "
+        f"SELECT l.servico_id, LOWER(COALESCE(NULLIF(TRIM(v.categoria), ''), 'hatch')), COUNT(*), AVG({duracao}) "
+        "FROM lavagens l JOIN veiculos v ON v.id = l.veiculo_id "
+        "WHERE l.status = 'concluida' AND l.servico_id IS NOT NULL AND l.data_fim IS NOT NULL "
+        f"AND {duracao} BETWEEN ? AND ? "
+        "GROUP BY 1, 2",
+        (DURACAO_MINIMA, DURACAO_MAXIMA)
+    )
+
+
+def estimativas(db: Session) -> dict:
+    # Tabela pequena (serviços x categorias): lida inteira a cada previsão
+    por_chave, por_servico = {}, {}
+    for e in db.query(Estimativa):
+        por_chave[(e.servico_id, e.categoria)] = e.media_segundos
+        n, total = por_servico.get(e.servico_id, (0, 0.0))
+        por_servico[e.servico_id] = (n + e.amostras, total + e.amostras * e.media_segundos)
+    return {
+        "por_chave": por_chave,
+        "por_servico": {s: total / n for s, (n, total) in por_servico.items() if n},
+    }
+
+
+def duracao_prevista(est: dict, servico_id: Optional[int], categoria: Optional[str]) -> float:
+    # Serviço x categoria; senão a média do serviço em qualquer categoria; senão o padrão
+    return (
+        est["por_chave"].get((servico_id, _categoria(categoria)))
+        or est["por_servico"].get(servico_id)
+        or DURACAO_PADRAO
+    )
+
+
+# --- DISTRIBUIÇÃO NOS BOXES ---
+def _simular(lavagens: List[models.Lavagem], est: dict, agora: datetime) -> Tuple[Dict[int, dict], Dict[int, datetime]]:
+    """Encaixa as lavagens em andamento nos boxes, por ordem de chegada.
+
+    Cada box atende uma lavagem por vez; quem já tem box fica nele, as demais vão para o
+    box que libera primeiro. Retorna a previsão de cada lavagem e quando cada box fica livre.
+    """
+    livre: Dict[int, Optional[datetime]] = {box: None for box in range(1, BOXES + 1)}
+    previsoes = {}
+    for lavagem in sorted(lavagens, key=lambda l: (l.data_inicio or agora, l.id)):
+        box = lavagem.box if lavagem.box in livre else min(livre, key=lambda b: livre[b] or datetime.min)
+        chegada = lavagem.data_inicio or agora
+        inicio = max(chegada, livre[box]) if livre[box] else chegada
+        fim = inicio + timedelta(seconds=duracao_prevista(
+            est, lavagem.servico_id, lavagem.veiculo.categoria if lavagem.veiculo else None
+        ))
+        if fim <= agora:
+            fim = agora + FOLGA_ATRASO
+        livre[box] = fim
+        previsoes[lavagem.id] = {"box": box, "inicio_previsto": inicio, "previsao_fim": fim}
+    return previsoes, {box: fim or agora for box, fim in livre.items()}
+
+
+def _em_andamento(db: Session) -> List[models.Lavagem]:
+    return db.query(models.Lavagem).options(
+        joinedload(models.Lavagem.veiculo).joinedload(models.Veiculo.cliente),
+        joinedload(models.Lavagem.servico)
+    ).filter(models.Lavagem.status == "em_andamento").all()
+
+
+def prever(db: Session, lavagens: List[models.Lavagem], agora: Optional[datetime] = None) -> Dict[int, dict]:
+    """Previsões (box, início e fim) das lavagens em andamento já carregadas pelo chamador."""
+    ativas = [l for l in lavagens if l.status == "em_andamento"]
+    return _simular(ativas, estimativas(db), agora or datetime.now())[0]
+
+
+def proximo_box(db: Session, agora: Optional[datetime] = None) -> Tuple[int, datetime]:
+    """Box que libera primeiro (para a lavagem que está chegando) e a partir de quando."""
+    _, livre = _simular(_em_andamento(db), estimativas(db), agora or datetime.now())
+    box = min(livre, key=livre.get)
+    return box, livre[box]
+
+
+def fila(db: Session, servico_id: Optional[int] = None, categoria: Optional[str] = None,
+         agora: Optional[datetime] = None) -> dict:
+    """Fila ao vivo: previsão de cada lavagem em andamento e, se pedido, o horário de
+    retirada para um novo carro (serviço x categoria) que chegasse agora."""
+    agora = agora or datetime.now()
+    lavagens = _em_andamento(db)
+    est = estimativas(db)
+    previsoes, livre = _simular(lavagens, est, agora)
+
+    itens = []
+    for lavagem in lavagens:
+        p = previsoes[lavagem.id]
+        itens.append({
+            "id": lavagem.id,
+            "box": p["box"],
+            "placa": lavagem.veiculo.placa if lavagem.veiculo else None,
+            "modelo": lavagem.veiculo.modelo if lavagem.veiculo else None,
+            "cliente": lavagem.veiculo.cliente.nome if lavagem.veiculo and lavagem.veiculo.cliente else None,
+            "servico": lavagem.servico.nome if lavagem.servico else None,
+            "inicio_previsto": p["inicio_previsto"],
+            "previsao_fim": p["previsao_fim"],
+            "minutos_restantes": max(int((p["previsao_fim"] - agora).total_seconds() // 60), 0),
+        })
+    itens.sort(key=lambda i: (i["previsao_fim"], i["id"]))
+
+    box = min(livre, key=livre.get)
+    resposta = {"agora": agora, "boxes": BOXES, "lavagens": itens,
+                "proximo_box": {"box": box, "livre_em": livre[box]}}
+    if servico_id is not None:
+        resposta["previsao_novo"] = livre[box] + timedelta(seconds=duracao_prevista(est, servico_id, categoria))
+    return resposta
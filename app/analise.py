@@ -0,0 +1,219 @@
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Integer, cast, func, select
+from sqlalchemy.orm import Session
+
+from app import catalogo, models
+
+L, V = models.Lavagem, models.Veiculo
+Resumo = models.ResumoFinanceiroDiario
+
+# Rentabilidade das lavagens concluídas num período (pelo dia da finalização, como o resumo):
+#   - por serviço x categoria do veículo: faturamento, custos, lucro, margem e lucro por hora
+#   - por hora de entrada (0-23): movimento e lucro, para ver os horários mais cheios
+#
+# Agrupar 100k lavagens direto no SQLite leva centenas de ms (ordenação do GROUP BY), então
+# o período é montado por mês:
+#   - meses inteiros do período vêm de somas parciais em memória, uma por mês;
+#   - só as pontas (meses cobertos em parte) são agrupadas na hora, pelo índice (status, data_fim).
+# Cada mês guardado vale enquanto a assinatura dele no resumo diário (quantidade e somas em
+# centavos) e a versão do catálogo não mudarem: finalizar, apagar ou importar lavagens mexe no
+# resumo, e apagar um serviço muda o catálogo. O TTL cobre o que não passa por nenhum dos dois
+# (ex.: categoria de um veículo editada). O resultado final também fica em cache por período.
+MAX_PERIODOS = 64
+TTL_SEGUNDOS = 300
+
+Somas = Tuple[Dict[tuple, list], Dict[int, list]]  # ({(servico_id, categoria): [...]}, {hora: [...]})
+
+_meses: Dict[str, Tuple[tuple, float, Somas]] = {}
+_periodos: Dict[Tuple[Optional[date], Optional[date]], Tuple[tuple, float, dict]] = {}
+_trava = threading.Lock()
+
+
+# --- CONSULTAS ---
+def _assinaturas(db: Session, desde: Optional[date], ate: Optional[date]) -> List[tuple]:
+    """(mês, quantidade, faturamento, insumos, lucro) dos meses do período com lavagens."""
+    mes = func.strftime("%Y-%m", Resumo.dia)
+    query = db.query(mes, func.sum(Resumo.quantidade),
+                     func.sum(Resumo.faturamento_centavos), func.sum(Resumo.insumos_centavos),
+                     func.sum(Resumo.lucro_centavos)).filter(Resumo.quantidade > 0)
+    if desde:
+        query = query.filter(Resumo.dia >= desde)
+    if ate:
+        query = query.filter(Resumo.dia <= ate)
+    return [tuple(linha) for linha in query.group_by(mes).order_by(mes)]
+
+
+def consulta_agrupada(desde: date, ate: date):
+    hora = cast(func.strftime("%H", L.data_inicio), Integer)
+    return select(
+        L.servico_id, V.categoria, hora, func.count(), func.sum(L.valor_total), func.sum(L.custo_insumos),
+        func.sum(L.custo_mao_de_obra), func.sum(L.lucro_real), func.sum(L.minutos_totais)
+    ).select_from(L).outerjoin(V, V.id == L.veiculo_id).where(
+        L.status == "concluida",
+        L.data_fim >= datetime.combine(desde, datetime.min.time()),
+        L.data_fim < datetime.combine(ate + timedelta(days=1), datetime.min.time()),
+    ).group_by(L.servico_id, V.categoria, hora)
+
+
+def _agrupar(db: Session, desde: date, ate: date) -> Somas:
+    """Soma as lavagens concluídas de desde a ate (inclusive) por serviço x categoria e por hora."""
+    combinacoes, horas = {}, {}
+    for servico_id, categoria, hora_entrada, *valores in db.execute(consulta_agrupada(desde, ate)):
+        _acumular(combinacoes, (servico_id, categoria), valores)
+        _acumular(horas, hora_entrada, valores)
+    return combinacoes, horas
+
+
+def _acumular(destino: dict, chave, valores):
+    soma = destino.get(chave)
+    if soma is None:
+        destino[chave] = [v or 0 for v in valores]
+    else:
+        for i, valor in enumerate(valores):
+            soma[i] += valor or 0
+
+
+def _ultimo_dia(mes: str) -> date:
+    ano, numero = int(mes[:4]), int(mes[5:])
+    return date(ano + numero // 12, numero % 12 + 1, 1) - timedelta(days=1)
+
+
+def _somas_do_mes(db: Session, mes: str, assinatura: tuple) -> Somas:
+    agora = time.monotonic()
+    with _trava:
+        guardado = _meses.get(mes)
+    if guardado and guardado[0] == assinatura and agora - guardado[1] < TTL_SEGUNDOS:
+        return guardado[2]
+    somas = _agrupar(db, date.fromisoformat(f"{mes}-01"), _ultimo_dia(mes))
+    with _trava:
+        _meses[mes] = (assinatura, agora, somas)
+    return somas
+
+
+# --- INDICADORES ---
+def _indicadores(quantidade=0, faturamento=0.0, insumos=0.0, mao_de_obra=0.0, lucro=0.0, minutos=0, **chaves) -> dict:
+    horas = minutos / 60
+    return {
+        **chaves,
+        "quantidade": quantidade,
+        "faturamento": round(faturamento, 2),
+        "custo_insumos": round(insumos, 2),
+        "custo_mao_de_obra": round(mao_de_obra, 2),
+        "lucro_real": round(lucro, 2),
+        "minutos": minutos,
+        "ticket_medio": round(faturamento / quantidade, 2) if quantidade else 0.0,
+        "lucro_medio": round(lucro / quantidade, 2) if quantidade else 0.0,
+        "margem": round(lucro / faturamento, 4) if faturamento else None,
+        "lucro_por_hora": round(lucro / horas, 2) if horas else None,
+    }
+
+
+def _montar(db: Session, desde: Optional[date], ate: Optional[date], partes: List[Somas]) -> dict:
+    combinacoes, horas, total = {}, {}, [0, 0.0, 0.0, 0.0, 0.0, 0]
+    for parte_combinacoes, parte_horas in partes:
+        for chave, valores in parte_combinacoes.items():
+            _acumular(combinacoes, chave, valores)
+            for i, valor in enumerate(valores):
+                total[i] += valor
+        for hora, valores in parte_horas.items():
+            _acumular(horas, hora, valores)
+
+    servicos = catalogo.obter(db)["servicos"]
+    return {
+        "desde": desde,
+        "ate": ate,
+        "total": _indicadores(*total),
+        # Mais lucrativas primeiro; as que dão prejuízo ficam no fim
+        "servicos": sorted(
+            (_indicadores(*valores, servico_id=servico_id,
+                          servico=servicos[servico_id]["nome"] if servico_id in servicos else None,
+                          categoria=categoria)
+             for (servico_id, categoria), valores in combinacoes.items()),
+            key=lambda c: -c["lucro_real"]
+        ),
+        "horas": [_indicadores(*horas.get(hora, ()), hora=hora) for hora in range(24)],
+    }
+
+
+# --- API ---
+def calcular(db: Session, desde: Optional[date] = None, ate: Optional[date] = None) -> dict:
+    """Rentabilidade do período (ate inclusive), montada a partir das somas por mês."""
+    versao = catalogo.versao_atual(db)
+    return _calcular(db, desde, ate, _assinaturas(db, desde, ate), versao)
+
+
+def _calcular(db: Session, desde, ate, assinaturas: List[tuple], versao: int) -> dict:
+    partes = []
+    for mes, *somas in assinaturas:
+        inicio, fim = date.fromisoformat(f"{mes}-01"), _ultimo_dia(mes)
+        if (desde is None or desde <= inicio) and (ate is None or ate >= fim):
+            partes.append(_somas_do_mes(db, mes, (*somas, versao)))
+        else:
+            # Ponta do período: só os dias pedidos
+            partes.append(_agrupar(db, max(inicio, desde or inicio), min(fim, ate or fim)))
+    return _montar(db, desde, ate, partes)
+
+
+def rentabilidade(db: Session, desde: Optional[date] = None, ate: Optional[date] = None) -> dict:
+    """Rentabilidade do período, do cache quando nada mudou nele."""
+    chave = (desde, ate)
+    assinaturas, versao = _assinaturas(db, desde, ate), catalogo.versao_atual(db)
+    assinatura = (tuple(assinaturas), versao)
+    agora = time.monotonic()
+    with _trava:
+        guardado = _periodos.get(chave)
+    if guardado and guardado[0] == assinatura and agora - guardado[1] < TTL_SEGUNDOS:
+        return guardado[2]
+
+    resultado = _calcular(db, desde, ate, assinaturas, versao)
+    with _trava:
+        _periodos.pop(chave, None)
+        _periodos[chave] = (assinatura, agora, resultado)
+        while len(_periodos) > MAX_PERIODOS:
+            _periodos.pop(next(iter(_periodos)))  # O mais antigo
+    return resultado
+
+
+def aquecer(SessionFabrica):
+    """Calcula as somas de todos os meses (no startup, para a primeira consulta já ser rápida)."""
+    db = SessionFabrica()
+    try:
+        calcular(db)
+    finally:
+        db.close()
+
+
+def limpar_cache():
+    with _trava:
+        _meses.clear()
+        _periodos.clear()
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.analise [AAAA-MM-DD [AAAA-MM-DD]]
+    from app import migracoes
+    from app.database import SessionLeitura, engine
+
+    migracoes.aplicar(engine)
+    desde = date.fromisoformat(sys.argv[1]) if len(sys.argv) > 1 else None
+    ate = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else None
+    db = SessionLeitura()
+    try:
+        r = calcular(db, desde, ate)
+        print(f"{'serviço':<28} {'categoria':<9} {'qtd':>6} {'faturamento':>12} {'lucro':>11} {'margem':>7} {'lucro/h':>9}")
+        for c in r["servicos"]:
+            margem = f"{c['margem']:.0%}" if c["margem"] is not None else "-"
+            por_hora = f"{c['lucro_por_hora']:.2f}" if c["lucro_por_hora"] is not None else "-"
+            print(f"{(c['servico'] or '(sem serviço)')[:28]:<28} {c['categoria'] or '-':<9} {c['quantidade']:>6} "
+                  f"{c['faturamento']:>12.2f} {c['lucro_real']:>11.2f} {margem:>7} {por_hora:>9}")
+        print()
+        for h in r["horas"]:
+            if h["quantidade"]:
+                print(f"{h['hora']:02d}h  {h['quantidade']:>6} lavagem(ns)  lucro {h['lucro_real']:>11.2f}")
+    finally:
+        db.close()
@@ -0,0 +1,214 @@
+import re
+import sys
+import unicodedata
+from typing import Iterable, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app import models
+
+# Índice de busca do check-in (tabela FTS5 criada pela migração 7): uma linha por veículo
+# (rowid = veiculos.id) e, para cliente ainda sem veículo, uma linha só com os dados dele
+# (rowid = -clientes.id). Tudo é gravado já normalizado:
+#   placa    -> só letras e dígitos, nos formatos antigo e Mercosul (ABC1234 e ABC1C34)
+#   telefone -> só dígitos, com e sem DDD (e sem o 55 do país)
+#   nome     -> minúsculo e sem acentos
+#   modelo   -> marca + modelo, minúsculo e sem acentos
+TABELA = "busca_veiculos"
+CRIAR_TABELA = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {TABELA} USING fts5("
+    "placa, telefone, nome, modelo, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+)
+LIMITE_PADRAO = 10
+LIMITE_MAXIMO = 50
+# Menos que isso casa com boa parte da base e não ajuda a escolher
+MINIMO_CARACTERES = 2
+
+# Conversão Mercosul: o 5º caractere da placa antiga (dígito) vira letra (0 -> A ... 9 -> J)
+_LETRAS_MERCOSUL = "ABCDEFGHIJ"
+
+
+# --- NORMALIZAÇÃO ---
+def dobrar(texto: Optional[str]) -> str:
+    """Minúsculo e sem acentos ("João" -> "joao")."""
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def digitos(texto: Optional[str]) -> str:
+    return re.sub(r"\D", "", texto or "")
+
+
+def normalizar_placa(placa: Optional[str]) -> str:
+    # "abc-1234" -> "ABC1234"; "ABC 1D23" -> "ABC1D23"
+    return re.sub(r"[^A-Z0-9]", "", dobrar(placa).upper())
+
+
+def variantes_placa(placa: Optional[str]) -> List[str]:
+    placa = normalizar_placa(placa)
+    if re.fullmatch(r"[A-Z]{3}\d{4}", placa):
+        return [placa, placa[:4] + _LETRAS_MERCOSUL[int(placa[4])] + placa[5:]]
+    if re.fullmatch(r"[A-Z]{3}\d[A-J]\d{2}", placa):
+        return [placa, placa[:4] + str(_LETRAS_MERCOSUL.index(placa[4])) + placa[5:]]
+    return [placa] if placa else []
+
+
+def variantes_telefone(telefone: Optional[str]) -> List[str]:
+    numero = digitos(telefone)
+    if len(numero) in (12, 13) and numero.startswith("55"):
+        numero = numero[2:]
+    if len(numero) in (10, 11):
+        return [numero, numero[2:]]
+    return [numero] if numero else []
+
+
+def _termos(consulta: str) -> List[str]:
+    # Cada palavra digitada vira um termo só de letras/dígitos ("(11)" -> "11", "abc-1" -> "abc1")
+    return [t for t in (re.sub(r"[^0-9a-z]", "", dobrar(p)) for p in consulta.split()) if t]
+
+
+# --- MANUTENÇÃO DO ÍNDICE ---
+def _linha(rowid, placa, marca, modelo, nome, telefone) -> dict:
+    return {
+        "id": rowid,
+        "placa": " ".join(variantes_placa(placa)),
+        "telefone": " ".join(variantes_telefone(telefone)),
+        "nome": dobrar(nome),
+        "modelo": dobrar(f"{marca or ''} {modelo or ''}").strip(),
+    }
+
+
+def _gravar(db, linhas: List[dict]):
+    if linhas:
+        db.execute(text(
+            f"INSERT INTO {TABELA} (rowid, placa, telefone, nome, modelo) "
+            "VALUES (:id, :placa, :telefone, :nome, :modelo)"
+        ), linhas)
+
+
+def remover(db, veiculo_ids: Iterable[int] = (), cliente_ids: Iterable[int] = ()):
+    ids = [{"id": i} for i in veiculo_ids] + [{"id": -i} for i in cliente_ids]
+    if ids:
+        db.execute(text(f"DELETE FROM {TABELA} WHERE rowid = :id"), ids)
+
+
+def indexar_clientes(db: Session, cliente_ids: Iterable[int]):
+    """(Re)indexa os clientes e seus veículos na transação do chamador (chamar depois do flush).
+
+    Veículo excluído precisa sair antes com `remover`, porque não aparece mais aqui.
+    """
+    ids = list(set(cliente_ids))
+    if not ids:
+        return
+    V, C = models.Veiculo, models.Cliente
+    linhas = db.query(V.id, V.placa, V.marca, V.modelo, C.nome, C.telefone, C.id).select_from(C).outerjoin(
+        V, V.cliente_id == C.id
+    ).filter(C.id.in_(ids)).all()
+    remover(db, [l[0] for l in linhas if l[0] is not None], ids)
+    _gravar(db, [_linha(l[0] if l[0] is not None else -l[6], *l[1:6]) for l in linhas])
+
+
+def reconstruir(conn):
+    """Recria o índice inteiro a partir de veiculos + clientes (CLI e benchmark)."""
+    conn.execute(text(CRIAR_TABELA))
+    conn.execute(text(f"DELETE FROM {TABELA}"))
+    linhas = conn.execute(text(
+        "SELECT v.id, v.placa, v.marca, v.modelo, c.nome, c.telefone "
+        "FROM veiculos v LEFT JOIN clientes c ON c.id = v.cliente_id "
+        "UNION ALL "
+        "SELECT -c.id, NULL, NULL, NULL, c.nome, c.telefone FROM clientes c "
+        "WHERE NOT EXISTS (SELECT 1 FROM veiculos v WHERE v.cliente_id = c.id)"
+    )).fetchall()
+    _gravar(conn, [_linha(*l) for l in linhas])
+
+
+# --- CONSULTAS ---
+def consulta_buscar(termos: List[str], limite: int = LIMITE_PADRAO):
+    # SQL do type-ahead (separado para app.planos conferir o plano da mesma consulta)
+    return text(
+        f"SELECT v.id, v.placa, v.marca, v.modelo, v.categoria, c.id, c.nome, c.telefone "
+        f"FROM {TABELA} b JOIN veiculos v ON v.id = b.rowid LEFT JOIN clientes c ON c.id = v.cliente_id "
+        f"WHERE {TABELA} MATCH :consulta LIMIT :limite"
+    ).bindparams(consulta=" ".join(f'"{t}"*' for t in termos), limite=min(limite, LIMITE_MAXIMO))
+
+
+def buscar(db: Session, consulta: str, limite: int = LIMITE_PADRAO) -> List[dict]:
+    """Type-ahead do check-in: veículos cuja placa, telefone, nome do dono ou modelo
+    começam com cada termo digitado (todos os termos precisam casar)."""
+    termos = _termos(consulta)
+    if sum(len(t) for t in termos) < MINIMO_CARACTERES:
+        return []
+    linhas = db.execute(consulta_buscar(termos, limite))
+    return [
+        {"veiculo_id": l[0], "placa": l[1], "marca": l[2], "modelo": l[3], "categoria": l[4],
+         "cliente_id": l[5], "cliente": l[6], "telefone": l[7]}
+        for l in linhas
+    ]
+
+
+def consulta_primeira_linha(coluna: str, termos: List[str]):
+    # Qualquer um dos termos na coluna (OR numa consulta só)
+    alternativas = " OR ".join(f'"{t}"' for t in termos)
+    return text(f"SELECT rowid FROM {TABELA} WHERE {TABELA} MATCH :consulta LIMIT 1").bindparams(
+        consulta=f"{coluna} : ({alternativas})"
+    )
+
+
+def _primeira_linha(db: Session, coluna: str, termos: List[str]) -> Optional[int]:
+    return db.execute(consulta_primeira_linha(coluna, termos)).scalar()
+
+
+def veiculo_por_placa(db: Session, placa: Optional[str]) -> Optional[models.Veiculo]:
+    """Veículo da placa, com ou sem pontuação e em qualquer dos dois formatos."""
+    placa = normalizar_placa(placa)
+    if not placa:
+        return None
+    veiculo_id = _primeira_linha(db, "placa", [placa.lower()])
+    if veiculo_id is not None:
+        return db.get(models.Veiculo, veiculo_id)
+    return query_placa_exata(db, placa).first()
+
+
+def query_placa_exata(db: Session, placa: str):
+    # Fallback sem o índice de busca (veículo gravado fora dele): placa como foi cadastrada
+    return db.query(models.Veiculo).filter(models.Veiculo.placa == placa)
+
+
+def cliente_por_telefone(db: Session, telefone: Optional[str]) -> Optional[models.Cliente]:
+    """Cliente do telefone, ignorando formatação, DDD e código do país."""
+    variantes = variantes_telefone(telefone)
+    if not variantes:
+        return None
+    # Todas as variantes: o cadastrado sem DDD casa com o digitado com DDD (e vice-versa)
+    rowid = _primeira_linha(db, "telefone", variantes)
+    if rowid is None:
+        return query_telefone_exato(db, telefone).first()
+    if rowid < 0:
+        return db.get(models.Cliente, -rowid)
+    cliente_id = db.query(models.Veiculo.cliente_id).filter(models.Veiculo.id == rowid).scalar()
+    return db.get(models.Cliente, cliente_id) if cliente_id is not None else None
+
+
+
+def query_telefone_exato(db: Session, telefone: str):
+    return db.query(models.Cliente).filter(models.Cliente.telefone == telefone)
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.busca reconstruir | python -m app.busca "termo de busca"
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    if sys.argv[1:] == ["reconstruir"]:
+        with engine.begin() as conn:
+            reconstruir(conn)
+        print("Índice de busca reconstruído.")
+    else:
+        db = SessionLocal()
+        try:
+            for r in buscar(db, " ".join(sys.argv[1:])):
+                print(f"{r['placa']:<9} {r['modelo'] or '':<20} {r['cliente'] or ''} ({r['telefone'] or ''})")
+        finally:
+            db.close()
@@ -0,0 +1,91 @@
+import threading
+from typing import Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+CATEGORIAS = ("hatch", "sedan", "suv", "pickup")
+
+# Cópia em memória do catálogo (valor da hora, preços por categoria, custo por dose e custos fixos).
+# Essas tabelas mudam poucas vezes por mês; cada requisição só confere a versão (1 leitura
+# por chave primária) e o catálogo inteiro é recarregado quando outro worker o alterou.
+_catalogo: Optional[dict] = None
+_trava = threading.Lock()
+
+
+def custo_dose(produto: models.Produto) -> float:
+    if not produto.ml_total or produto.ml_total <= 0:
+        return 0.0
+    return (produto.preco_compra or 0.0) / produto.ml_total * (produto.ml_por_uso or 0)
+
+
+def versao_atual(db: Session) -> int:
+    return db.query(models.VersaoCatalogo.versao).filter(models.VersaoCatalogo.id == 1).scalar() or 0
+
+
+def _carregar(db: Session, versao: int) -> dict:
+    config = db.query(models.Configuracao).first()
+    produtos = {
+        p.id: {"id": p.id, "nome": p.nome, "custo_dose": custo_dose(p), "ml_total": p.ml_total or 0,
+               "ml_por_uso": p.ml_por_uso or 0}
+        for p in db.query(models.Produto).all()
+    }
+    fixos = {}
+    for servico_id, produto_id in db.query(models.ServicoProduto.servico_id, models.ServicoProduto.produto_id):
+        fixos.setdefault(servico_id, []).append(produto_id)
+    servicos = {
+        s.id: {
+            "id": s.id,
+            "nome": s.nome,
+            "precos": {c: getattr(s, f"preco_{c}") for c in CATEGORIAS},
+            "produtos_fixos": [produtos[i] for i in fixos.get(s.id, []) if i in produtos],
+        }
+        for s in db.query(models.ServicoCatalogo).all()
+    }
+    return {
+        "versao": versao,
+        "valor_hora": config.valor_hora if config else 0.0,
+        "custos_fixos": db.query(func.sum(models.CustoFixo.valor)).scalar() or 0.0,  # Total mensal
+        "criterio_rateio": (config.criterio_rateio if config else None) or "minutos",
+        "produtos": produtos,
+        "servicos": servicos,
+    }
+
+
+def obter(db: Session) -> dict:
+    """Catálogo atual: {"versao", "valor_hora", "custos_fixos", "criterio_rateio",
+    "produtos": {id: ...}, "servicos": {id: ...}}.
+
+    O dict devolvido é compartilhado entre as requisições: não altere.
+    """
+    global _catalogo
+    versao = versao_atual(db)
+    catalogo = _catalogo
+    if catalogo is not None and catalogo["versao"] == versao:
+        return catalogo
+    with _trava:
+        if _catalogo is None or _catalogo["versao"] != versao:
+            _catalogo = _carregar(db, versao)
+        return _catalogo
+
+
+def preco_servico(catalogo: dict, servico_id: int, categoria: Optional[str]) -> Optional[float]:
+    servico = catalogo["servicos"].get(servico_id)
+    if servico is None:
+        return None
+    precos = servico["precos"]
+    return precos.get((categoria or "hatch").lower(), precos["hatch"])
+
+
+def invalidar(db: Session):
+    """Incrementa a versão na transação do chamador (chamar antes do commit de qualquer
+    alteração em configuração, serviços, produtos ou custos fixos). Todos os workers recarregam na próxima leitura."""
+    global _catalogo
+    stmt = insert(models.VersaoCatalogo).values(id=1, versao=1)
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[models.VersaoCatalogo.id], set_={"versao": models.VersaoCatalogo.versao + 1}
+    ))
+    _catalogo = None
@@ -0,0 +1,42 @@
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+# Custeio de uma lavagem (insumos, mão de obra e lucro) num único passo.
+# Usado pela tela de finalização, pelo JSON do modal e pela gravação final,
+# para que os três mostrem sempre os mesmos valores.
+PRODUTOS_PADRAO = "Insumos padrão DJ WASH"
+
+
+def produtos_da_lista(catalogo: dict, produtos_ids: Optional[Iterable[int]]) -> List[dict]:
+    # Custos por dose vêm do catálogo em memória: nenhuma consulta por produto.
+    # Produto sem preço (custo 0) continua na lista: sai do estoque e aparece nos itens da lavagem
+    produtos = catalogo["produtos"]
+    return [produtos[i] for i in (produtos_ids or []) if i in produtos and produtos[i]["ml_total"] > 0]
+
+
+def produtos_do_servico(catalogo: dict, servico_id: Optional[int]) -> List[int]:
+    servico = catalogo["servicos"].get(servico_id)
+    return [p["id"] for p in servico["produtos_fixos"]] if servico else []
+
+
+def calcular(catalogo: dict, inicio: datetime, fim: datetime,
+             produtos_ids: Optional[Iterable[int]] = None, valor_cobrado: float = 0.0) -> dict:
+    """Tempo, custos e lucro de uma lavagem entre `inicio` e `fim`."""
+    segundos = max((fim - inicio).total_seconds(), 0)
+    produtos = produtos_da_lista(catalogo, produtos_ids)
+
+    custo_insumos = sum(p["custo_dose"] for p in produtos)
+    custo_mao_de_obra = (segundos / 3600) * catalogo["valor_hora"]
+    minutos = int(segundos / 60)
+
+    return {
+        "segundos": segundos,
+        "minutos": minutos,
+        "tempo_total": f"{minutos // 60:02d}:{minutos % 60:02d}",
+        "produtos": produtos,
+        "produtos_usados": ", ".join(p["nome"] for p in produtos) if produtos else PRODUTOS_PADRAO,
+        "custo_insumos": custo_insumos,
+        "custo_mao_de_obra": custo_mao_de_obra,
+        # Lucro Real = Faturamento - Insumos - Mão de Obra
+        "lucro_real": round(valor_cobrado - (custo_insumos + custo_mao_de_obra), 2),
+    }
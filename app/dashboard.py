@@ -0,0 +1,86 @@
+from typing import List, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session, joinedload
+
+from app import models
+
+# Quantidade de serviços concluídos exibidos por "página" do feed
+LIMITE_CONCLUIDAS = 30
+LIMITE_MAXIMO = 100
+
+
+def _query_com_veiculo(db: Session):
+    # Carrega veículo e cliente no mesmo SELECT (evita 1 + 2N consultas no template)
+    return db.query(models.Lavagem).options(
+        joinedload(models.Lavagem.veiculo).joinedload(models.Veiculo.cliente)
+    )
+
+
+# As consultas ficam em funções query_* (sem executar) para app.planos conferir o plano
+# exatamente do SQL que as telas rodam
+def query_ativas(db: Session):
+    # Serviços em andamento aparecem sempre, independente da paginação
+    return _query_com_veiculo(db).filter(
+        models.Lavagem.status == "em_andamento"
+    ).order_by(models.Lavagem.id.desc())
+
+
+def buscar_lavagens_ativas(db: Session) -> List[models.Lavagem]:
+    return query_ativas(db).all()
+
+
+def buscar_lavagem(db: Session, lavagem_id: int) -> Optional[models.Lavagem]:
+    return _query_com_veiculo(db).filter(models.Lavagem.id == lavagem_id).first()
+
+
+def buscar_lavagens_concluidas(
+    db: Session, antes_de: Optional[int] = None, limite: int = LIMITE_CONCLUIDAS
+) -> Tuple[List[models.Lavagem], Optional[int]]:
+    """Janela de serviços não ativos, paginada por cursor (id decrescente).
+
+    Retorna a lista e o cursor da próxima página (None quando acabou).
+    """
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+    lavagens = query_concluidas(db, antes_de, limite).all()
+
+    proximo_cursor = None
+    if len(lavagens) > limite:
+        lavagens = lavagens[:limite]
+        proximo_cursor = lavagens[-1].id
+
+    return lavagens, proximo_cursor
+
+
+def query_concluidas(db: Session, antes_de: Optional[int], limite: int):
+    query = _query_com_veiculo(db).filter(
+        or_(models.Lavagem.status != "em_andamento", models.Lavagem.status.is_(None))
+    )
+    if antes_de is not None:
+        query = query.filter(models.Lavagem.id < antes_de)
+    # Um registro a mais só para saber se existe próxima página
+    return query.order_by(models.Lavagem.id.desc()).limit(limite + 1)
+
+
+def query_historico(db: Session, limite: int):
+    # Tabela do /historico: as concluídas mais recentes, já com veículo carregado
+    return db.query(models.Lavagem).options(
+        joinedload(models.Lavagem.veiculo)
+    ).filter(models.Lavagem.status == "concluida").order_by(
+        models.Lavagem.data_fim.desc(), models.Lavagem.id.desc()
+    ).limit(limite)
+
+
+def query_lavagens_do_cliente(db: Session, cliente_id: int):
+    # Perfil do cliente: todas as lavagens dos veículos dele, da mais recente
+    return db.query(models.Lavagem).join(models.Veiculo).filter(
+        models.Veiculo.cliente_id == cliente_id
+    ).order_by(models.Lavagem.data_inicio.desc())
+
+
+def query_historico_do_cliente(db: Session, cliente_id: int):
+    # Concluídas do cliente pela ordem de entrega (data_fim), a mais recente primeiro
+    return db.query(models.Lavagem).join(models.Veiculo).filter(
+        models.Veiculo.cliente_id == cliente_id,
+        models.Lavagem.status == "concluida"
+    ).order_by(models.Lavagem.data_fim.desc())
@@ -1,13 +1,75 @@
-from sqlalchemy import create_engine
+import os
+
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./db_estetica.db"
+SQLALCHEMY_DATABASE_URL = os.getenv("DJWASH_DB_URL", "sqlite:///./db_estetica.db")
+
+# Perfil do banco: "producao" (WAL + pragmas + pools dimensionados) ou
+# "padrao" (comportamento antigo: engine simples, sem pragmas e sem pool de leitura)
+DB_PERFIL = os.getenv("DJWASH_DB_PERFIL", "producao")
+
+# Ajustes do perfil de produção (podem ser sobrescritos por variável de ambiente)
+POOL_ESCRITA = int(os.getenv("DJWASH_DB_POOL", "5"))
+POOL_LEITURA = int(os.getenv("DJWASH_DB_POOL_LEITURA", "10"))
+BUSY_TIMEOUT_MS = int(os.getenv("DJWASH_DB_BUSY_TIMEOUT_MS", "5000"))
+MMAP_BYTES = int(os.getenv("DJWASH_DB_MMAP_BYTES", str(256 * 1024 * 1024)))
+CACHE_KB = int(os.getenv("DJWASH_DB_CACHE_KB", str(64 * 1024)))
+
+_E_SQLITE = SQLALCHEMY_DATABASE_URL.startswith("sqlite")
+
+
+def _ativar_chaves_estrangeiras(dbapi_conn, _registro):
+    # Nos dois perfis: as exclusões em cascata (ON DELETE) dependem disso no SQLite
+    cursor = dbapi_conn.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def _aplicar_pragmas(somente_leitura: bool):
+    def on_connect(dbapi_conn, _registro):
+        cursor = dbapi_conn.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        cursor.execute(f"PRAGMA mmap_size={MMAP_BYTES}")
+        cursor.execute(f"PRAGMA cache_size=-{CACHE_KB}")  # Negativo = tamanho em KiB
+        if somente_leitura:
+            cursor.execute("PRAGMA query_only=ON")
+        cursor.close()
+    return on_connect
+
+
+def _criar_engine(somente_leitura: bool = False, pool_size: int = POOL_ESCRITA):
+    connect_args = {"check_same_thread": False} if _E_SQLITE else {}
+    novo = create_engine(
+        SQLALCHEMY_DATABASE_URL,
+        connect_args=connect_args,
+        pool_size=pool_size,
+        max_overflow=pool_size * 2,
+        pool_pre_ping=True,
+    )
+    if _E_SQLITE:
+        event.listen(novo, "connect", _aplicar_pragmas(somente_leitura))
+        event.listen(novo, "connect", _ativar_chaves_estrangeiras)
+    return novo
+
+
+if DB_PERFIL == "producao":
+    engine = _criar_engine()
+    # Pool separado para relatórios/dashboard: no WAL, leitores não bloqueiam o escritor
+    engine_leitura = _criar_engine(somente_leitura=True, pool_size=POOL_LEITURA)
+else:
+    engine = create_engine(
+        SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    )
+    if _E_SQLITE:
+        event.listen(engine, "connect", _ativar_chaves_estrangeiras)
+    engine_leitura = engine
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLeitura = sessionmaker(autocommit=False, autoflush=False, bind=engine_leitura)
 
 Base = declarative_base()
 
@@ -17,4 +79,13 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Dependência para rotas que só leem (dashboard, relatórios)
+def get_db_leitura():
+    db = SessionLeitura()
+    try:
+        yield db
+    finally:
+        db.close()
@@ -0,0 +1,190 @@
+import sys
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app import models
+
+Movimento = models.MovimentoEstoque
+Estoque = models.EstoqueAtual
+Item = models.LavagemProduto
+
+# Janela usada para a taxa de consumo (projeção de dias restantes)
+DIAS_CONSUMO = 30
+# Produto entra no alerta quando o saldo não cobre este número de dias
+DIAS_ALERTA = 7
+
+
+def movimentar(db: Session, movimentos: List[dict], quando: Optional[datetime] = None):
+    """Grava movimentos no livro e atualiza os saldos na transação do chamador.
+
+    Cada movimento é um dict com produto_id, tipo e quantidade_ml (com sinal), e
+    opcionalmente lavagem_id e observacao. São dois comandos em lote: um INSERT
+    no livro e um upsert com o delta de cada produto.
+    """
+    if not movimentos:
+        return
+    quando = quando or datetime.now()
+    db.execute(insert(Movimento), [
+        {"lavagem_id": None, "observacao": None, **m, "criado_em": quando} for m in movimentos
+    ])
+
+    deltas = Counter()
+    for m in movimentos:
+        deltas[m["produto_id"]] += m["quantidade_ml"]
+    stmt = insert(Estoque).values([
+        {"produto_id": produto_id, "saldo_ml": delta, "minimo_ml": 0, "atualizado_em": quando}
+        for produto_id, delta in deltas.items()
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[Estoque.produto_id],
+        set_={"saldo_ml": Estoque.saldo_ml + stmt.excluded.saldo_ml, "atualizado_em": stmt.excluded.atualizado_em}
+    ))
+
+
+def definir_minimo(db: Session, produto_id: int, minimo_ml: int):
+    stmt = insert(Estoque).values(produto_id=produto_id, saldo_ml=0, minimo_ml=minimo_ml, atualizado_em=datetime.now())
+    db.execute(stmt.on_conflict_do_update(index_elements=[Estoque.produto_id], set_={"minimo_ml": minimo_ml}))
+
+
+def query_consumo_da_lavagem(db: Session, lavagem_id: int):
+    # Total por produto já movimentado para a lavagem (pelo índice lavagem_id)
+    return db.query(Movimento.produto_id, func.sum(Movimento.quantidade_ml)).filter(
+        Movimento.lavagem_id == lavagem_id
+    ).group_by(Movimento.produto_id)
+
+
+def consumir_lavagem(db: Session, lavagem_id: int, produtos: Iterable[dict]):
+    """Baixa a dose (ml_por_uso) de cada produto usado na lavagem.
+
+    Se a lavagem já tinha consumo registrado (reenvio da finalização), ele é estornado
+    antes; o livro nunca é alterado, só recebe novos movimentos.
+    """
+    anteriores = query_consumo_da_lavagem(db, lavagem_id)
+    movimentos = [
+        {"produto_id": produto_id, "tipo": "estorno", "quantidade_ml": -total, "lavagem_id": lavagem_id}
+        for produto_id, total in anteriores if total
+    ]
+    movimentos += [
+        {"produto_id": p["id"], "tipo": "consumo", "quantidade_ml": -p["ml_por_uso"], "lavagem_id": lavagem_id}
+        for p in produtos if p["ml_por_uso"]
+    ]
+    movimentar(db, movimentos)
+
+
+def registrar_itens(db: Session, lavagem_id: int, quando: datetime, produtos: Iterable[dict]):
+    """Grava os produtos usados na lavagem (uma linha por produto, em lote), trocando os de
+    uma finalização anterior. `produtos` vem do catálogo (custeio.calcular); repetido = mais doses."""
+    db.query(Item).filter(Item.lavagem_id == lavagem_id).delete(synchronize_session=False)
+    por_id = {p["id"]: p for p in produtos}
+    doses = Counter(p["id"] for p in produtos)
+    if doses:
+        db.execute(insert(Item), [
+            {"lavagem_id": lavagem_id, "produto_id": produto_id, "nome": por_id[produto_id]["nome"], "doses": n,
+             "ml": por_id[produto_id]["ml_por_uso"] * n, "custo_dose": por_id[produto_id]["custo_dose"], "data": quando}
+            for produto_id, n in doses.items()
+        ])
+
+
+def consumo_mensal(db: Session, desde: Optional[datetime] = None, ate: Optional[datetime] = None,
+                   produto_id: Optional[int] = None) -> List[dict]:
+    """Doses, ml e custo de cada produto por mês, somados no banco (lavagem_produtos)."""
+    mes = func.strftime("%Y-%m", Item.data)
+    query = db.query(
+        mes, Item.produto_id, func.max(Item.nome), func.sum(Item.doses), func.sum(Item.ml),
+        func.sum(Item.doses * Item.custo_dose), func.count(Item.lavagem_id.distinct())
+    )
+    if desde:
+        query = query.filter(Item.data >= desde)
+    if ate:
+        query = query.filter(Item.data < ate)
+    if produto_id is not None:
+        query = query.filter(Item.produto_id == produto_id)
+    linhas = query.group_by(mes, Item.produto_id).order_by(mes, Item.produto_id)
+    return [
+        {"mes": m, "produto_id": pid, "nome": nome, "doses": doses, "ml": ml, "custo": round(custo or 0.0, 2),
+         "lavagens": lavagens}
+        for m, pid, nome, doses, ml, custo, lavagens in linhas
+    ]
+
+
+def query_consumo_recente(db: Session, agora: datetime):
+    # Saídas por produto na janela de DIAS_CONSUMO (pelo índice tipo + criado_em)
+    return db.query(Movimento.produto_id, func.sum(Movimento.quantidade_ml)).filter(
+        Movimento.tipo.in_(("consumo", "estorno")),
+        Movimento.criado_em >= agora - timedelta(days=DIAS_CONSUMO)
+    ).group_by(Movimento.produto_id)
+
+
+def situacao(db: Session, agora: Optional[datetime] = None) -> List[dict]:
+    """Saldo, consumo diário recente e dias restantes de cada produto.
+
+    Lê só o saldo materializado (uma linha por produto) e o consumo da janela de
+    DIAS_CONSUMO; o histórico inteiro nunca é somado.
+    """
+    agora = agora or datetime.now()
+    saidas = dict(query_consumo_recente(db, agora))
+
+    linhas = db.query(models.Produto.id, models.Produto.nome, Estoque.saldo_ml, Estoque.minimo_ml).outerjoin(
+        Estoque, Estoque.produto_id == models.Produto.id
+    ).order_by(models.Produto.nome)
+
+    resultado = []
+    for produto_id, nome, saldo, minimo in linhas:
+        saldo, minimo = saldo or 0, minimo or 0
+        por_dia = max(-(saidas.get(produto_id) or 0), 0) / DIAS_CONSUMO
+        dias = round(saldo / por_dia, 1) if por_dia > 0 else None
+        resultado.append({
+            "produto_id": produto_id,
+            "nome": nome,
+            "saldo_ml": saldo,
+            "minimo_ml": minimo,
+            "consumo_diario_ml": round(por_dia, 1),
+            "dias_restantes": dias,
+            "baixo": saldo <= minimo or (dias is not None and dias < DIAS_ALERTA),
+        })
+    return resultado
+
+
+def estoque_baixo(db: Session) -> List[dict]:
+    return [s for s in situacao(db) if s["baixo"]]
+
+
+def reconstruir(db: Session) -> int:
+    """Recalcula os saldos a partir do livro (mantém os mínimos). Retorna quantos produtos."""
+    saldos = dict(db.query(Movimento.produto_id, func.sum(Movimento.quantidade_ml)).group_by(Movimento.produto_id))
+    minimos = dict(db.query(Estoque.produto_id, Estoque.minimo_ml))
+    db.query(Estoque).delete()
+    db.bulk_insert_mappings(Estoque, [
+        {"produto_id": p, "saldo_ml": s or 0, "minimo_ml": minimos.get(p, 0), "atualizado_em": datetime.now()}
+        for p, s in saldos.items()
+    ])
+    db.commit()
+    return len(saldos)
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.estoque [situacao|reconstruir|consumo]
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    comando = sys.argv[1] if len(sys.argv) > 1 else "situacao"
+    db = SessionLocal()
+    try:
+        if comando == "reconstruir":
+            print(f"Estoque reconstruído: {reconstruir(db)} produto(s).")
+        elif comando == "consumo":
+            for c in consumo_mensal(db):
+                print(f"{c['mes']}  {c['nome'] or '-':<30} {c['doses']:>5} dose(s) {c['ml']:>8} ml  R$ {c['custo']:>9.2f}")
+        else:
+            for s in situacao(db):
+                dias = f"{s['dias_restantes']} dias" if s["dias_restantes"] is not None else "sem consumo recente"
+                alerta = "  <- BAIXO" if s["baixo"] else ""
+                print(f"{s['nome']:<30} {s['saldo_ml']:>8} ml  {dias}{alerta}")
+    finally:
+        db.close()
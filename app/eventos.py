@@ -0,0 +1,167 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import AsyncIterator, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLeitura
+
+logger = logging.getLogger(__name__)
+
+# Barramento de eventos das lavagens (criada, checklist salvo, finalizada, excluídas, previsões
+# da fila e recarregar, depois de uma mudança em lote) para o SSE. Os eventos vão para a tabela
+# eventos_ao_vivo, então valem para todos os workers do uvicorn: em cada worker uma thread lê os
+# novos a cada INTERVALO_CONSULTA e entrega às conexões abertas nele. O id do evento é o da
+# tabela, o mesmo em qualquer worker e depois de um restart: o Last-Event-ID de um tablet vale
+# onde quer que ele reconecte.
+HISTORICO = 200  # Eventos guardados para quem reconecta com Last-Event-ID
+INTERVALO_PING = 15  # Segundos entre comentários de keep-alive (proxies fecham conexões paradas)
+INTERVALO_CONSULTA = 0.5  # Segundos entre leituras da tabela (atraso máximo de um evento de outro worker)
+
+Evento = Tuple[int, str, str]  # (id, tipo, dados em JSON)
+E = models.EventoAoVivo
+
+_assinantes = set()  # (loop, fila) de cada conexão SSE aberta neste worker
+_trava = threading.Lock()
+_leitor: Optional[threading.Thread] = None
+
+
+def publicar(db: Session, tipo: str, dados: dict):
+    """Grava um evento para as conexões abertas em todos os workers e confirma a transação
+    do chamador (chamar depois de gravar a mudança que o evento anuncia)."""
+    publicar_varios(db, [(tipo, dados)])
+
+
+def publicar_varios(db: Session, novos: Iterable[Tuple[str, dict]]):
+    """Como `publicar`, para vários eventos (tipo, dados): um INSERT e um commit só.
+
+    Mudança em lote (exclusão em cascata, importação) manda um evento com a lista de ids,
+    não um por registro: cada evento ocupa uma vaga do HISTORICO.
+    """
+    agora = datetime.now()
+    linhas = [{"tipo": tipo, "dados": json.dumps(dados, default=str), "criado_em": agora} for tipo, dados in novos]
+    if not linhas:
+        return
+    db.execute(insert(E), linhas)
+    ultimo = db.execute(select(func.max(E.id))).scalar()
+    db.execute(delete(E).where(E.id <= ultimo - HISTORICO))
+    db.commit()
+
+
+def _novos(db: Session, depois_de: int) -> List[Evento]:
+    return [tuple(e) for e in db.execute(
+        select(E.id, E.tipo, E.dados).where(E.id > depois_de).order_by(E.id).limit(HISTORICO)
+    )]
+
+
+def _ultimo_id() -> int:
+    db = SessionLeitura()
+    try:
+        return db.execute(select(func.max(E.id))).scalar() or 0
+    finally:
+        db.close()
+
+
+def _acompanhar(ultimo: int):
+    # Thread do worker: repassa os eventos novos da tabela às conexões abertas nele
+    while True:
+        time.sleep(INTERVALO_CONSULTA)
+        db = SessionLeitura()
+        try:
+            eventos = _novos(db, ultimo)
+        except Exception:
+            logger.exception("Falha ao ler eventos_ao_vivo")
+            continue
+        finally:
+            db.close()
+        if not eventos:
+            continue
+        ultimo = eventos[-1][0]
+        with _trava:
+            assinantes = list(_assinantes)
+        for loop, fila in assinantes:
+            for evento in eventos:
+                try:
+                    loop.call_soon_threadsafe(_entregar, fila, evento)
+                except RuntimeError:
+                    break  # Loop já encerrado (conexão caindo junto com o worker)
+
+
+def _iniciar_leitor():
+    global _leitor
+    with _trava:
+        if _leitor is None or not _leitor.is_alive():
+            # Começa do último id de agora: quem assina em seguida recupera o anterior por conta própria
+            _leitor = threading.Thread(target=_acompanhar, args=(_ultimo_id(),), name="djwash-eventos", daemon=True)
+            _leitor.start()
+
+
+def _entregar(fila: asyncio.Queue, evento: Evento):
+    # Tablet lento: descarta o evento mais antigo em vez de acumular sem limite
+    if fila.full():
+        fila.get_nowait()
+    fila.put_nowait(evento)
+
+
+def _formatar(evento: Evento) -> str:
+    id_evento, tipo, dados = evento
+    return f"id: {id_evento}\nevent: {tipo}\ndata: {dados}\n\n"
+
+
+def _recuperar(ultimo_id: Optional[str]) -> Tuple[List[Evento], int, bool]:
+    """(eventos perdidos, id atual, precisa recarregar) para quem conecta com `ultimo_id`."""
+    _iniciar_leitor()
+    db = SessionLeitura()
+    try:
+        # Mesma transação de leitura: o mínimo, o máximo e os perdidos vêm do mesmo instante
+        menor, atual = db.execute(select(func.min(E.id), func.max(E.id))).one()
+        atual = atual or 0
+        if not ultimo_id:
+            return [], atual, False
+        # Id que não é deste banco, ou histórico que não cobre mais o intervalo perdido
+        if not ultimo_id.isdigit() or int(ultimo_id) > atual or (menor is not None and menor > int(ultimo_id) + 1):
+            return [], atual, True
+        return _novos(db, int(ultimo_id)), atual, False
+    finally:
+        db.close()
+
+
+async def assinar(ultimo_id: Optional[str], desconectado: Callable[[], Awaitable[bool]]) -> AsyncIterator[str]:
+    """Fluxo text/event-stream de uma conexão.
+
+    Quem reconecta com Last-Event-ID recebe os eventos perdidos; se o id é desconhecido ou
+    os eventos já saíram do histórico, recebe `recarregar` para buscar a página inteira de novo.
+    """
+    loop = asyncio.get_running_loop()
+    fila: asyncio.Queue = asyncio.Queue(maxsize=HISTORICO)
+    assinante = (loop, fila)
+    with _trava:
+        _assinantes.add(assinante)
+    try:
+        # Assinante registrado antes da leitura: nada publicado entre as duas coisas se perde
+        perdidos, enviado, incompleto = await loop.run_in_executor(None, _recuperar, ultimo_id)
+        yield "retry: 3000\n\n"
+        if incompleto:
+            yield _formatar((enviado, "recarregar", "{}"))
+        else:
+            for evento in perdidos:
+                yield _formatar(evento)
+        while not await desconectado():
+            try:
+                evento = await asyncio.wait_for(fila.get(), INTERVALO_PING)
+            except asyncio.TimeoutError:
+                yield ": ping\n\n"
+                continue
+            if evento[0] <= enviado:
+                continue  # Já foi junto com os perdidos
+            enviado = evento[0]
+            yield _formatar(evento)
+    finally:
+        with _trava:
+            _assinantes.discard(assinante)
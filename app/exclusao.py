@@ -0,0 +1,234 @@
+import json
+import sys
+from datetime import date, datetime
+from typing import Iterable, List, Optional
+
+from sqlalchemy import DateTime, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from app import busca, financeiro, fotos, models, rateio
+
+L, V, C = models.Lavagem, models.Veiculo, models.Cliente
+Anexo = models.AnexoLavagem
+Arquivo = models.ExclusaoArquivada
+
+# Tabelas filhas das lavagens que vão junto no arquivo (chave no JSON -> modelo)
+FILHAS_LAVAGEM = {"anexos": Anexo, "produtos": models.LavagemProduto}
+
+# Exclusões em conjunto, na transação do chamador: cada nível sai com um único
+# DELETE ... WHERE ... IN (...), de baixo para cima (lavagens, veículos, clientes), depois
+# de descontar o resumo financeiro, as fotos e o índice de busca de uma vez só.
+# As chaves estrangeiras (ON DELETE CASCADE / SET NULL, com PRAGMA foreign_keys ligado em
+# app.database) dão o mesmo resultado para qualquer outro caminho e impedem órfãos novos.
+#
+# Com arquivar=True o que sai é guardado antes em exclusoes_arquivadas (JSON) e pode ser
+# restaurado; as fotos das lavagens continuam referenciadas até o arquivo ser descartado.
+
+
+def _ids(db: Session, coluna, *filtros) -> List[int]:
+    return [i for (i,) in db.execute(select(coluna).where(*filtros))]
+
+
+def _linhas(db: Session, modelo, *filtros) -> List[dict]:
+    return [dict(linha._mapping) for linha in db.execute(select(modelo.__table__).where(*filtros))]
+
+
+def _json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def _arquivar(db: Session, tipo: str, descricao: str, clientes: List[dict], veiculo_ids: List[int]) -> int:
+    lavagens = select(L.id).where(L.veiculo_id.in_(veiculo_ids))
+    dados = {
+        "clientes": clientes,
+        "veiculos": _linhas(db, V, V.id.in_(veiculo_ids)),
+        "lavagens": _linhas(db, L, L.veiculo_id.in_(veiculo_ids)),
+        **{chave: _linhas(db, modelo, modelo.lavagem_id.in_(lavagens)) for chave, modelo in FILHAS_LAVAGEM.items()},
+    }
+    arquivo = Arquivo(
+        tipo=tipo, descricao=descricao, lavagens=len(dados["lavagens"]),
+        dados=json.dumps(dados, default=_json, ensure_ascii=False)
+    )
+    db.add(arquivo)
+    db.flush()
+    return arquivo.id
+
+
+def consulta_veiculos_dos_clientes(cliente_ids: List[int]):
+    return select(V.id).where(V.cliente_id.in_(cliente_ids))
+
+
+def query_lavagens_dos_veiculos(db: Session, veiculo_ids: List[int]):
+    return db.query(L).filter(L.veiculo_id.in_(veiculo_ids))
+
+
+def _excluir_lavagens(db: Session, veiculo_ids: List[int], liberar_fotos: bool) -> List[int]:
+    if not veiculo_ids:
+        return []
+    query = query_lavagens_dos_veiculos(db, veiculo_ids)
+    lavagem_ids = [i for (i,) in query.with_entities(L.id)]
+    if lavagem_ids:
+        financeiro.descontar_lavagens(db, query)
+        rateio.descontar_lavagens(db, query)
+        if liberar_fotos:
+            fotos.liberar_lavagens(db, query)
+        db.execute(delete(L).where(L.veiculo_id.in_(veiculo_ids)))
+    return lavagem_ids
+
+
+def excluir_clientes(db: Session, cliente_ids: Iterable[int], arquivar: bool = False) -> dict:
+    """Apaga clientes com veículos e lavagens. Retorna as lavagens removidas (para recibos/eventos)."""
+    cliente_ids = list(cliente_ids)
+    veiculo_ids = [i for (i,) in db.execute(consulta_veiculos_dos_clientes(cliente_ids))]
+    arquivo_id = None
+    if arquivar:
+        clientes = _linhas(db, C, C.id.in_(cliente_ids))
+        arquivo_id = _arquivar(db, "cliente", ", ".join(c["nome"] for c in clientes), clientes, veiculo_ids)
+
+    lavagem_ids = _excluir_lavagens(db, veiculo_ids, liberar_fotos=not arquivar)
+    busca.remover(db, veiculo_ids, cliente_ids)
+    db.execute(delete(V).where(V.id.in_(veiculo_ids)))
+    db.execute(delete(C).where(C.id.in_(cliente_ids)))
+    return {"clientes": len(cliente_ids), "veiculos": len(veiculo_ids), "lavagens": lavagem_ids,
+            "arquivo_id": arquivo_id}
+
+
+def excluir_veiculos(db: Session, veiculo_ids: Iterable[int], arquivar: bool = False) -> dict:
+    """Apaga veículos e suas lavagens; os donos continuam (e continuam achados na busca)."""
+    veiculo_ids = list(veiculo_ids)
+    cliente_ids = _ids(db, V.cliente_id.distinct(), V.id.in_(veiculo_ids), V.cliente_id.isnot(None))
+    arquivo_id = None
+    if arquivar:
+        placas = _ids(db, V.placa, V.id.in_(veiculo_ids))
+        arquivo_id = _arquivar(db, "veiculo", ", ".join(p or "" for p in placas), [], veiculo_ids)
+
+    lavagem_ids = _excluir_lavagens(db, veiculo_ids, liberar_fotos=not arquivar)
+    busca.remover(db, veiculo_ids)
+    db.execute(delete(V).where(V.id.in_(veiculo_ids)))
+    busca.indexar_clientes(db, cliente_ids)
+    return {"veiculos": len(veiculo_ids), "lavagens": lavagem_ids, "arquivo_id": arquivo_id}
+
+
+def excluir_servico(db: Session, servico_id: int):
+    """Apaga o serviço do catálogo. As lavagens ficam, sem serviço (o UPDATE renova o
+    atualizado_em, então os cards em cache saem sem o nome antigo); vínculos com produtos
+    e estimativas de duração saem pela cascata."""
+    db.execute(update(L).where(L.servico_id == servico_id).values(servico_id=None))
+    db.execute(delete(models.ServicoCatalogo).where(models.ServicoCatalogo.id == servico_id))
+
+
+# --- ARQUIVO DE EXCLUSÕES ---
+
+def listar_arquivadas(db: Session) -> List[dict]:
+    linhas = db.query(Arquivo.id, Arquivo.tipo, Arquivo.descricao, Arquivo.lavagens, Arquivo.excluido_em).order_by(
+        Arquivo.id.desc()
+    ).all()
+    return [dict(linha._mapping) for linha in linhas]
+
+
+def _reidratar(modelo, linha: dict) -> dict:
+    # O JSON guarda datas como texto ISO
+    for coluna in modelo.__table__.columns:
+        if isinstance(coluna.type, DateTime) and linha.get(coluna.name):
+            linha[coluna.name] = datetime.fromisoformat(linha[coluna.name])
+    return linha
+
+
+def restaurar(db: Session, arquivo_id: int) -> Optional[dict]:
+    """Devolve ao banco o que foi arquivado, com ids novos. None se o arquivo não existe.
+
+    Placa ou cliente que já não podem voltar (placa recadastrada, dono apagado) levantam
+    IntegrityError/ValueError; o chamador desfaz a transação.
+    """
+    arquivo = db.get(Arquivo, arquivo_id)
+    if arquivo is None:
+        return None
+    dados = json.loads(arquivo.dados)
+
+    novos_clientes = {}
+    for linha in dados["clientes"]:
+        antigo = linha.pop("id")
+        novos_clientes[antigo] = db.execute(insert(C).values(**_reidratar(C, linha))).inserted_primary_key[0]
+
+    novos_veiculos = {}
+    for linha in dados["veiculos"]:
+        antigo = linha.pop("id")
+        dono = linha["cliente_id"]
+        linha["cliente_id"] = novos_clientes.get(dono, dono)
+        if dono is not None and dono not in novos_clientes and db.get(C, dono) is None:
+            raise ValueError(f"O dono do veículo {linha['placa']} não existe mais")
+        novos_veiculos[antigo] = db.execute(insert(V).values(**_reidratar(V, linha))).inserted_primary_key[0]
+
+    # Lavagens em lote com ids explícitos (a partir do maior), para religar anexos e produtos
+    servicos = set(_ids(db, models.ServicoCatalogo.id))
+    proximo = (db.query(func.max(L.id)).scalar() or 0) + 1
+    novas_lavagens = {}
+    lavagens = []
+    for linha in dados["lavagens"]:
+        novas_lavagens[linha["id"]] = linha["id"] = proximo + len(novas_lavagens)
+        linha["veiculo_id"] = novos_veiculos[linha["veiculo_id"]]
+        if linha["servico_id"] not in servicos:
+            linha["servico_id"] = None
+        lavagens.append(_reidratar(L, linha))
+    if lavagens:
+        db.execute(insert(L), lavagens)
+        financeiro.registrar_lote(db, (
+            (l["data_inicio"], l["data_fim"], l["valor_total"], l["custo_insumos"], l["custo_mao_de_obra"],
+             l["lucro_real"], l.get("custo_fixo_rateado"))
+            for l in lavagens if l["status"] == "concluida"
+        ))
+        rateio.registrar_lavagens(db, db.query(L).filter(L.id.in_([l["id"] for l in lavagens])))
+    produtos = set(_ids(db, models.Produto.id))
+    for chave, modelo in FILHAS_LAVAGEM.items():
+        filhas = []
+        for linha in dados.get(chave, []):
+            linha.pop("id", None)
+            linha["lavagem_id"] = novas_lavagens[linha["lavagem_id"]]
+            if "produto_id" in linha and linha["produto_id"] not in produtos:
+                linha["produto_id"] = None
+            filhas.append(_reidratar(modelo, linha))
+        if filhas:
+            db.execute(insert(modelo), filhas)
+
+    db.flush()
+    busca.indexar_clientes(db, list(novos_clientes.values()) + _ids(
+        db, V.cliente_id.distinct(), V.id.in_(list(novos_veiculos.values())), V.cliente_id.isnot(None)
+    ))
+    db.delete(arquivo)  # As referências das fotos passam de volta para as lavagens
+    return {"clientes": len(novos_clientes), "veiculos": len(novos_veiculos), "lavagens": len(lavagens)}
+
+
+def descartar(db: Session, arquivo_id: int) -> bool:
+    """Apaga o arquivo de vez e solta as fotos que ele segurava (coletar_lixo depois do commit)."""
+    arquivo = db.get(Arquivo, arquivo_id)
+    if arquivo is None:
+        return False
+    fotos.atualizar_referencias(db, [a["caminho"] for a in json.loads(arquivo.dados).get("anexos", [])], [])
+    db.delete(arquivo)
+    return True
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.exclusao [arquivadas|restaurar ID|descartar ID]
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    comando = sys.argv[1] if len(sys.argv) > 1 else "arquivadas"
+    db = SessionLocal()
+    try:
+        if comando == "arquivadas":
+            for a in listar_arquivadas(db):
+                print(f"{a['id']:>5}  {a['excluido_em']:%d/%m/%Y %H:%M}  {a['tipo']:<8} {a['lavagens']:>6} lavagem(ns)  {a['descricao']}")
+        elif comando == "restaurar":
+            resultado = restaurar(db, int(sys.argv[2]))
+            db.commit()
+            print(resultado or "Arquivo não encontrado.")
+        elif comando == "descartar":
+            print("Descartado." if descartar(db, int(sys.argv[2])) else "Arquivo não encontrado.")
+            db.commit()
+            fotos.coletar_lixo(db)
+    finally:
+        db.close()
@@ -0,0 +1,46 @@
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+# Executores limitados para trabalho pesado fora do event loop.
+# As rotas síncronas já rodam no threadpool do FastAPI; estes pools só evitam
+# que muitos PDFs/gravações de fotos simultâneos ocupem todas as threads de uma vez.
+WORKERS_PDF = int(os.getenv("DJWASH_WORKERS_PDF", "2"))
+WORKERS_ARQUIVOS = int(os.getenv("DJWASH_WORKERS_ARQUIVOS", "4"))
+WORKERS_IMAGENS = int(os.getenv("DJWASH_WORKERS_IMAGENS", "2"))
+# Exportação em lote: um processo por núcleo (o ReportLab não libera o GIL)
+WORKERS_PROCESSOS = int(os.getenv("DJWASH_WORKERS_PROCESSOS", str(os.cpu_count() or 2)))
+
+executor_pdf = ThreadPoolExecutor(max_workers=WORKERS_PDF, thread_name_prefix="djwash-pdf")
+executor_arquivos = ThreadPoolExecutor(max_workers=WORKERS_ARQUIVOS, thread_name_prefix="djwash-arquivos")
+# Miniaturas/derivadas: tarefas em segundo plano, ninguém espera o resultado na requisição
+executor_imagens = ThreadPoolExecutor(max_workers=WORKERS_IMAGENS, thread_name_prefix="djwash-imagens")
+
+
+_executor_processos: Optional[ProcessPoolExecutor] = None
+_trava_processos = threading.Lock()
+
+
+def executor_processos() -> ProcessPoolExecutor:
+    # Criado só na primeira exportação; "spawn" evita fork de um processo cheio de threads
+    global _executor_processos
+    with _trava_processos:
+        if _executor_processos is None:
+            _executor_processos = ProcessPoolExecutor(
+                max_workers=WORKERS_PROCESSOS, mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor_processos
+
+
+def renderizar_pdf(funcao: Callable[..., bytes], *args) -> bytes:
+    return executor_pdf.submit(funcao, *args).result()
+
+
+def encerrar():
+    executor_pdf.shutdown(wait=True)
+    executor_arquivos.shutdown(wait=True)
+    executor_imagens.shutdown(wait=True)
+    if _executor_processos is not None:
+        _executor_processos.shutdown(wait=True, cancel_futures=True)
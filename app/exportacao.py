@@ -0,0 +1,220 @@
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, wait
+from datetime import date, datetime, timedelta
+from typing import Iterator, List, Optional
+
+from sqlalchemy.orm import joinedload
+
+from app import models, recibos
+from app.database import SessionLeitura
+from app.executores import WORKERS_PROCESSOS, executor_processos
+
+logger = logging.getLogger(__name__)
+
+PASTA_EXPORTACOES = os.getenv("DJWASH_PASTA_EXPORTACOES", "app/cache/exportacoes")
+# Lavagens lidas do banco por vez (os dados vão para os processos em lotes, não todos de uma vez)
+LOTE_CONSULTA = 200
+# Recibos em renderização ao mesmo tempo: mantém todos os núcleos ocupados sem acumular PDFs na memória
+EM_VOO = WORKERS_PROCESSOS * 2
+# Arquivos prontos ficam disponíveis para download por este tempo
+VALIDADE_SEGUNDOS = 6 * 3600
+
+# O estado de cada exportação fica num JSON ao lado do ZIP (<id>.json): qualquer worker atende o
+# polling e o download, e o estado sobrevive a um restart. Durante a renderização o arquivo é
+# regravado no máximo a cada INTERVALO_GRAVACAO; uma exportação "processando" sem nenhuma
+# gravação há ABANDONO_SEGUNDOS morreu com o processo que a rodava.
+INTERVALO_GRAVACAO = 0.5
+ABANDONO_SEGUNDOS = 300
+_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def query_periodo(db, inicio: date, fim: date):
+    # Lavagens concluídas entre as duas datas (inclusive), na ordem em que foram entregues
+    return db.query(models.Lavagem.id).filter(
+        models.Lavagem.status == "concluida",
+        models.Lavagem.data_fim >= datetime.combine(inicio, datetime.min.time()),
+        models.Lavagem.data_fim < datetime.combine(fim + timedelta(days=1), datetime.min.time())
+    ).order_by(models.Lavagem.data_fim, models.Lavagem.id)
+
+
+def ids_do_periodo(db, inicio: date, fim: date) -> List[int]:
+    return [i for (i,) in query_periodo(db, inicio, fim)]
+
+
+def _dados_em_lotes(ids: List[int]) -> Iterator[dict]:
+    for i in range(0, len(ids), LOTE_CONSULTA):
+        db = SessionLeitura()
+        try:
+            lavagens = db.query(models.Lavagem).options(
+                joinedload(models.Lavagem.veiculo).joinedload(models.Veiculo.cliente),
+                joinedload(models.Lavagem.servico)
+            ).filter(models.Lavagem.id.in_(ids[i:i + LOTE_CONSULTA])).all()
+            por_id = {l.id: recibos.dados_recibo(l) for l in lavagens}
+        finally:
+            db.close()
+        for lavagem_id in ids[i:i + LOTE_CONSULTA]:
+            if lavagem_id in por_id:
+                yield por_id[lavagem_id]
+
+
+def _caminho_estado(exportacao_id: str) -> str:
+    return os.path.join(PASTA_EXPORTACOES, f"{exportacao_id}.json")
+
+
+def _gravar_estado(estado: dict):
+    # Troca atômica: quem lê nunca pega o JSON pela metade
+    caminho = _caminho_estado(estado["id"])
+    temporario = f"{caminho}.{uuid.uuid4().hex}.tmp"
+    with open(temporario, "w", encoding="utf-8") as arquivo:
+        json.dump(estado, arquivo)
+    os.replace(temporario, caminho)
+
+
+def _ler_estado(exportacao_id: str) -> Optional[dict]:
+    if not _ID.fullmatch(exportacao_id):
+        return None
+    try:
+        with open(_caminho_estado(exportacao_id), encoding="utf-8") as arquivo:
+            return json.load(arquivo)
+    except (OSError, ValueError):
+        return None
+
+
+class _Estado:
+    # Estado de uma exportação em andamento, regravado em disco a cada mudança de status
+    # e, no progresso, no máximo a cada INTERVALO_GRAVACAO
+    def __init__(self, estado: dict):
+        self.estado = estado
+        self.gravado_em = 0.0
+
+    def atualizar(self, forcar: bool = True, **campos):
+        self.estado.update(campos)
+        agora = time.time()
+        if forcar or agora - self.gravado_em >= INTERVALO_GRAVACAO:
+            self.estado["atualizado_em"] = agora
+            _gravar_estado(self.estado)
+            self.gravado_em = agora
+
+
+def _nome_no_zip(dados: dict) -> str:
+    return f"Recibo_DJWASH_{dados['id']:04d}.pdf"
+
+
+def exportar(estado: _Estado, inicio: date, fim: date):
+    """Renderiza os recibos do período no pool de processos e grava um ZIP em disco.
+
+    Recibos já em cache (mesma versão de conteúdo) são copiados sem renderizar; os novos
+    também entram no cache de recibos. Cada PDF vai para o ZIP assim que fica pronto.
+    """
+    exportacao_id = estado.estado["id"]
+    destino = os.path.join(PASTA_EXPORTACOES, f"{exportacao_id}.zip")
+    temporario = f"{destino}.tmp"
+    try:
+        db = SessionLeitura()
+        try:
+            ids = ids_do_periodo(db, inicio, fim)
+        finally:
+            db.close()
+        estado.atualizar(status="processando", total=len(ids))
+
+        feitos = 0
+        pendentes = {}
+        with zipfile.ZipFile(temporario, "w", zipfile.ZIP_STORED) as arquivo_zip:
+            def concluir(futuros):
+                nonlocal feitos
+                for futuro in futuros:
+                    dados, cache = pendentes.pop(futuro)
+                    conteudo = futuro.result()
+                    recibos.gravar_cache(cache, conteudo)
+                    arquivo_zip.writestr(_nome_no_zip(dados), conteudo)
+                    feitos += 1
+                estado.atualizar(forcar=False, feitos=feitos)
+
+            for dados in _dados_em_lotes(ids):
+                cache = recibos.caminho_cache(dados["id"], recibos.versao(dados))
+                if os.path.exists(cache):
+                    arquivo_zip.write(cache, _nome_no_zip(dados))
+                    feitos += 1
+                    estado.atualizar(forcar=False, feitos=feitos)
+                    continue
+                if len(pendentes) >= EM_VOO:
+                    prontos, _ = wait(pendentes, return_when=FIRST_COMPLETED)
+                    concluir(prontos)
+                pendentes[executor_processos().submit(recibos.renderizar_recibo, dados)] = (dados, cache)
+            concluir(wait(pendentes).done)
+
+        os.replace(temporario, destino)
+        estado.atualizar(status="concluida", feitos=feitos, arquivo=destino, terminado_em=time.time())
+    except Exception as erro:
+        logger.exception("Falha na exportação %s", exportacao_id)
+        if os.path.exists(temporario):
+            os.remove(temporario)
+        estado.atualizar(status="erro", erro=str(erro), terminado_em=time.time())
+
+
+def _limpar_antigas():
+    limite = time.time() - VALIDADE_SEGUNDOS
+    for caminho in glob.glob(os.path.join(PASTA_EXPORTACOES, "*.json")):
+        estado = _ler_estado(os.path.basename(caminho)[:-len(".json")])
+        # Terminadas há mais tempo que a validade, ou abandonadas (sem terminado_em) há tanto quanto
+        if estado is None or (estado["terminado_em"] or estado["atualizado_em"]) >= limite:
+            continue
+        for arquivo in (estado["arquivo"], caminho):
+            if arquivo and os.path.exists(arquivo):
+                os.remove(arquivo)
+
+
+def iniciar(inicio: date, fim: date) -> str:
+    """Dispara a exportação em segundo plano e devolve o id para acompanhar o progresso."""
+    os.makedirs(PASTA_EXPORTACOES, exist_ok=True)
+    _limpar_antigas()
+    exportacao_id = uuid.uuid4().hex
+    estado = _Estado({
+        "id": exportacao_id, "data_inicio": inicio.isoformat(), "data_fim": fim.isoformat(),
+        "status": "na_fila", "total": None, "feitos": 0, "arquivo": None, "erro": None,
+        "criado_em": time.time(), "terminado_em": None,
+    })
+    estado.atualizar()
+    threading.Thread(
+        target=exportar, args=(estado, inicio, fim), name=f"djwash-exportacao-{exportacao_id[:8]}", daemon=True
+    ).start()
+    return exportacao_id
+
+
+def progresso(exportacao_id: str) -> Optional[dict]:
+    exportacao = _ler_estado(exportacao_id)
+    if exportacao is None:
+        return None
+    parada = time.time() - exportacao["atualizado_em"] > ABANDONO_SEGUNDOS
+    if exportacao["status"] in ("na_fila", "processando") and parada:
+        exportacao.update(status="erro", erro="Exportação interrompida (o servidor foi reiniciado)",
+                          terminado_em=exportacao["atualizado_em"])
+    total = exportacao["total"]
+    exportacao["percentual"] = round(100 * exportacao["feitos"] / total, 1) if total else (
+        100.0 if exportacao["status"] == "concluida" else 0.0
+    )
+    exportacao["segundos"] = round((exportacao["terminado_em"] or time.time()) - exportacao["criado_em"], 1)
+    return exportacao
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.exportacao AAAA-MM-DD AAAA-MM-DD
+    from app import migracoes
+    from app.database import engine
+
+    migracoes.aplicar(engine)
+    inicio, fim = date.fromisoformat(sys.argv[1]), date.fromisoformat(sys.argv[2])
+    exportacao_id = iniciar(inicio, fim)
+    while (estado := progresso(exportacao_id))["status"] in ("na_fila", "processando"):
+        print(f"\r{estado['feitos']}/{estado['total'] or '?'} recibos", end="", flush=True)
+        time.sleep(0.5)
+    print(f"\r{estado['feitos']}/{estado['total']} recibos em {estado['segundos']}s -> {estado['arquivo'] or estado['erro']}")
@@ -0,0 +1,199 @@
+import sys
+from collections import defaultdict
+from datetime import date
+from typing import Dict, Iterable, List, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Query, Session
+
+from app import models
+
+Resumo = models.ResumoFinanceiroDiario
+
+# Colunas somadas no resumo, na ordem usada pelas tuplas de delta
+_COLUNAS = ("quantidade", "faturamento_centavos", "insumos_centavos", "mao_de_obra_centavos", "lucro_centavos",
+            "custos_fixos_centavos")
+
+_CAMPOS_LAVAGEM = (
+    models.Lavagem.data_inicio,
+    models.Lavagem.data_fim,
+    models.Lavagem.valor_total,
+    models.Lavagem.custo_insumos,
+    models.Lavagem.custo_mao_de_obra,
+    models.Lavagem.lucro_real,
+    models.Lavagem.custo_fixo_rateado,
+)
+
+
+def _centavos(valor) -> int:
+    return int(round((valor or 0.0) * 100))
+
+
+def _dia_e_delta(data_inicio, data_fim, valor_total, custo_insumos, custo_mao_de_obra, lucro_real,
+                 custo_fixo_rateado) -> Tuple[date, tuple]:
+    # O dia contábil é o da finalização (ou o da entrada, para registros antigos sem data_fim)
+    dia = (data_fim or data_inicio).date()
+    return dia, (
+        1,
+        _centavos(valor_total),
+        _centavos(custo_insumos),
+        _centavos(custo_mao_de_obra),
+        _centavos(lucro_real),
+        _centavos(custo_fixo_rateado),
+    )
+
+
+def _aplicar(db: Session, dia: date, delta: tuple, sinal: int = 1):
+    # Upsert atômico: soma o delta na linha do dia (ou cria a linha)
+    valores = {col: sinal * v for col, v in zip(_COLUNAS, delta)}
+    stmt = insert(Resumo).values(dia=dia, **valores)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Resumo.dia],
+        set_={col: getattr(Resumo, col) + getattr(stmt.excluded, col) for col in _COLUNAS}
+    )
+    db.execute(stmt)
+
+
+def registrar_lavagem(db: Session, lavagem: models.Lavagem):
+    """Soma uma lavagem concluída no resumo do seu dia (mesma transação do chamador)."""
+    if lavagem.status != "concluida":
+        return
+    dia, delta = _dia_e_delta(*(getattr(lavagem, c.key) for c in _CAMPOS_LAVAGEM))
+    _aplicar(db, dia, delta)
+
+
+def descontar_lavagem(db: Session, lavagem: models.Lavagem):
+    if lavagem.status != "concluida":
+        return
+    dia, delta = _dia_e_delta(*(getattr(lavagem, c.key) for c in _CAMPOS_LAVAGEM))
+    _aplicar(db, dia, delta, sinal=-1)
+
+
+def descontar_lavagens(db: Session, query: Query):
+    """Desconta do resumo todas as lavagens concluídas de `query` (antes de apagá-las).
+
+    Só as colunas financeiras são lidas; os deltas são agrupados por dia.
+    """
+    por_dia = _agrupar(query.filter(models.Lavagem.status == "concluida").with_entities(*_CAMPOS_LAVAGEM))
+    for dia, delta in por_dia.items():
+        _aplicar(db, dia, delta, sinal=-1)
+
+
+def registrar_lavagens(db: Session, query: Query):
+    """Soma no resumo todas as lavagens concluídas de `query` (depois de alterá-las em lote)."""
+    por_dia = _agrupar(query.filter(models.Lavagem.status == "concluida").with_entities(*_CAMPOS_LAVAGEM))
+    for dia, delta in por_dia.items():
+        _aplicar(db, dia, delta)
+
+
+def registrar_lote(db: Session, linhas: Iterable[tuple]):
+    """Soma no resumo lavagens concluídas inseridas em lote (importação), um upsert por dia.
+
+    Cada linha traz os valores na ordem de _CAMPOS_LAVAGEM.
+    """
+    for dia, delta in _agrupar(linhas).items():
+        _aplicar(db, dia, delta)
+
+
+def _agrupar(linhas) -> Dict[date, tuple]:
+    por_dia = defaultdict(lambda: [0] * len(_COLUNAS))
+    for linha in linhas:
+        dia, delta = _dia_e_delta(*linha)
+        acumulado = por_dia[dia]
+        for i, v in enumerate(delta):
+            acumulado[i] += v
+    return {dia: tuple(v) for dia, v in por_dia.items()}
+
+
+def _recalcular(db: Session) -> Dict[date, tuple]:
+    query = db.query(*_CAMPOS_LAVAGEM).filter(models.Lavagem.status == "concluida")
+    return _agrupar(query.yield_per(1000))
+
+
+def reconstruir(db: Session) -> int:
+    """Recalcula o resumo inteiro a partir das lavagens. Retorna quantos dias foram gravados."""
+    por_dia = _recalcular(db)
+    db.query(Resumo).delete()
+    db.bulk_insert_mappings(Resumo, [
+        dict(dia=dia, **dict(zip(_COLUNAS, delta))) for dia, delta in por_dia.items()
+    ])
+    db.commit()
+    return len(por_dia)
+
+
+def garantir_resumo(db: Session):
+    # Bancos antigos (anteriores ao resumo) são preenchidos na primeira subida
+    if db.query(Resumo.dia).first() is None and db.query(models.Lavagem.id).filter(
+        models.Lavagem.status == "concluida"
+    ).first() is not None:
+        reconstruir(db)
+
+
+def conferir(db: Session) -> List[date]:
+    """Dias em que o resumo diverge das lavagens (lista vazia = consistente)."""
+    esperado = _recalcular(db)
+    gravado = {
+        r.dia: tuple(getattr(r, c) for c in _COLUNAS)
+        for r in db.query(Resumo).all()
+        if any(getattr(r, c) for c in _COLUNAS)
+    }
+    dias = set(esperado) | set(gravado)
+    return sorted(d for d in dias if esperado.get(d) != gravado.get(d))
+
+
+def _para_reais(quantidade, faturamento, insumos, mao_de_obra, lucro, custos_fixos) -> dict:
+    quantidade = quantidade or 0
+    faturamento = (faturamento or 0) / 100
+    return {
+        "quantidade": quantidade,
+        "faturamento": faturamento,
+        "custo_insumos": (insumos or 0) / 100,
+        "custo_mao_de_obra": (mao_de_obra or 0) / 100,
+        "custos_fixos": (custos_fixos or 0) / 100,
+        "lucro_real": (lucro or 0) / 100,
+        "ticket_medio": faturamento / quantidade if quantidade > 0 else 0.0,
+    }
+
+
+def _somas():
+    return [func.sum(getattr(Resumo, c)) for c in _COLUNAS]
+
+
+def totais(db: Session) -> dict:
+    return _para_reais(*db.query(*_somas()).one())
+
+
+def serie_diaria(db: Session, ultimos_dias: int = 7) -> List[dict]:
+    # Últimos N dias com movimento, em ordem cronológica
+    linhas = db.query(Resumo).filter(Resumo.quantidade > 0).order_by(Resumo.dia.desc()).limit(ultimos_dias).all()
+    return [
+        dict(dia=r.dia, **_para_reais(*(getattr(r, c) for c in _COLUNAS)))
+        for r in reversed(linhas)
+    ]
+
+
+def serie_mensal(db: Session) -> List[dict]:
+    mes = func.strftime("%Y-%m", Resumo.dia)
+    linhas = db.query(mes, *_somas()).group_by(mes).having(
+        func.sum(Resumo.quantidade) > 0
+    ).order_by(mes).all()
+    return [dict(mes=linha[0], **_para_reais(*linha[1:])) for linha in linhas]
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.financeiro [reconstruir|conferir]
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    comando = sys.argv[1] if len(sys.argv) > 1 else "reconstruir"
+    db = SessionLocal()
+    try:
+        if comando == "conferir":
+            divergentes = conferir(db)
+            print("Resumo consistente." if not divergentes else f"Dias divergentes: {divergentes}")
+            sys.exit(1 if divergentes else 0)
+        print(f"Resumo reconstruído: {reconstruir(db)} dia(s).")
+    finally:
+        db.close()
@@ -0,0 +1,193 @@
+import hashlib
+import json
+import os
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app import miniaturas, models
+
+Foto = models.FotoArmazenada
+Anexo = models.AnexoLavagem
+
+# Tipos de anexo: "avaria" (fotos do checklist, acumulam), "antes" e "depois" (entrega, uma de cada)
+TIPOS = ("avaria", "antes", "depois")
+
+# Arquivos sem referência só são apagados depois deste tempo sem uso (upload em andamento
+# pode ter acabado de reaproveitar o arquivo e ainda não gravou a referência)
+CARENCIA_SEGUNDOS = 60
+
+
+def _arquivo(caminho: str) -> str:
+    return os.path.join("app", caminho.lstrip("/"))
+
+
+def _dimensoes(caminho: str) -> Tuple[Optional[int], Optional[int]]:
+    # Só lê o cabeçalho da imagem
+    try:
+        with Image.open(_arquivo(caminho)) as imagem:
+            return imagem.size
+    except (OSError, ValueError):
+        return None, None
+
+
+def _linha_anexo(lavagem_id: int, tipo: str, caminho: str) -> dict:
+    largura, altura = _dimensoes(caminho)
+    return {"lavagem_id": lavagem_id, "tipo": tipo, "caminho": caminho, "tamanho": _tamanho(caminho),
+            "largura": largura, "altura": altura, "criado_em": datetime.now()}
+
+
+def anexar(db: Session, lavagem_id: int, tipo: str, caminhos: Iterable[Optional[str]], substituir: bool = False):
+    """Grava fotos da lavagem e as referências, na transação do chamador.
+
+    Com substituir=True as fotos já anexadas desse tipo saem (antes/depois da entrega
+    reenviados); sem ele as novas se somam às existentes (fotos do checklist).
+    """
+    caminhos = [c.lstrip("/") for c in caminhos if c]
+    if not caminhos:
+        return
+    antigos = []
+    if substituir:
+        filtros = (Anexo.lavagem_id == lavagem_id, Anexo.tipo == tipo)
+        antigos = [c for (c,) in db.query(Anexo.caminho).filter(*filtros)]
+        db.query(Anexo).filter(*filtros).delete(synchronize_session=False)
+    db.execute(insert(Anexo), [_linha_anexo(lavagem_id, tipo, c) for c in caminhos])
+    atualizar_referencias(db, antigos, caminhos)
+
+
+def anexos(db: Session, lavagem_id: int, tipos: Sequence[str] = TIPOS) -> Dict[str, List[str]]:
+    """Caminhos das fotos da lavagem por tipo, na ordem em que foram anexadas."""
+    por_tipo = {tipo: [] for tipo in tipos}
+    for tipo, caminho in db.query(Anexo.tipo, Anexo.caminho).filter(
+        Anexo.lavagem_id == lavagem_id, Anexo.tipo.in_(tipos)
+    ).order_by(Anexo.id):
+        por_tipo[tipo].append(caminho)
+    return por_tipo
+
+
+def atualizar_referencias(db: Session, antes: Iterable[str], depois: Iterable[str]):
+    """Aplica a diferença de referências (depois - antes) na mesma transação do chamador."""
+    delta = Counter(depois)
+    delta.subtract(Counter(antes))
+    for caminho, n in delta.items():
+        if n == 0:
+            continue
+        stmt = insert(Foto).values(
+            caminho=caminho, referencias=n, tamanho=_tamanho(caminho), sha256=_sha256_do_nome(caminho)
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Foto.caminho], set_={"referencias": Foto.referencias + n}
+        )
+        db.execute(stmt)
+
+
+def liberar_lavagens(db: Session, query):
+    """Desconta as referências das fotos das lavagens de `query` (chamar antes de apagá-las;
+    os anexos saem junto, pela cascata)."""
+    ids = query.with_entities(models.Lavagem.id).subquery()
+    caminhos = [c for (c,) in db.query(Anexo.caminho).filter(Anexo.lavagem_id.in_(select(ids.c.id)))]
+    atualizar_referencias(db, caminhos, [])
+
+
+def _sha256_do_nome(caminho: str) -> Optional[str]:
+    # Fotos novas já são gravadas como <sha256>.<ext>
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return nome if len(nome) == 64 and all(c in "0123456789abcdef" for c in nome) else None
+
+
+def _tamanho(caminho: str) -> int:
+    arquivo = _arquivo(caminho)
+    return os.path.getsize(arquivo) if os.path.exists(arquivo) else 0
+
+
+def coletar_lixo(db: Session, carencia: int = CARENCIA_SEGUNDOS) -> int:
+    """Apaga do disco (e da tabela) as fotos sem nenhuma referência. Retorna quantas."""
+    limite = time.time() - carencia
+    removidas = 0
+    for foto in db.query(Foto).filter(Foto.referencias <= 0).all():
+        arquivo = _arquivo(foto.caminho)
+        if os.path.exists(arquivo):
+            if os.path.getmtime(arquivo) > limite:
+                continue
+            os.remove(arquivo)
+        miniaturas.remover_variantes(foto.caminho)
+        db.delete(foto)
+        removidas += 1
+    db.commit()
+    return removidas
+
+
+def _sha256(arquivo: str) -> str:
+    h = hashlib.sha256()
+    with open(arquivo, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def deduplicar(db: Session) -> int:
+    """Converte fotos antigas (nomes com timestamp) para o nome por conteúdo.
+
+    Cópias idênticas na mesma pasta passam a apontar para um único arquivo.
+    Retorna quantos bytes foram liberados.
+    """
+    renomear = {}
+    for foto in db.query(Foto).filter(Foto.sha256.is_(None)).all():
+        arquivo = _arquivo(foto.caminho)
+        if not os.path.exists(arquivo):
+            continue
+        sha256 = _sha256(arquivo)
+        pasta, nome = os.path.split(foto.caminho)
+        renomear[foto.caminho] = f"{pasta}/{sha256}{os.path.splitext(nome)[1].lower()}"
+
+    liberado = 0
+    for anexo in db.query(Anexo).filter(Anexo.caminho.in_(list(renomear))).all():
+        atualizar_referencias(db, [anexo.caminho], [renomear[anexo.caminho]])
+        anexo.caminho = renomear[anexo.caminho]
+    # Exclusões arquivadas também seguram fotos (lista "anexos" do JSON): restaurar uma delas
+    # depois precisa achar o arquivo no nome novo
+    if renomear:
+        for arquivo in db.query(models.ExclusaoArquivada).all():
+            dados = json.loads(arquivo.dados)
+            movidos = [a for a in dados.get("anexos", []) if a["caminho"] in renomear]
+            if not movidos:
+                continue
+            for anexo in movidos:
+                atualizar_referencias(db, [anexo["caminho"]], [renomear[anexo["caminho"]]])
+                anexo["caminho"] = renomear[anexo["caminho"]]
+            arquivo.dados = json.dumps(dados, ensure_ascii=False)
+
+    for antigo, novo in renomear.items():
+        if os.path.exists(_arquivo(novo)):
+            liberado += _tamanho(antigo)
+            os.remove(_arquivo(antigo))
+        else:
+            os.replace(_arquivo(antigo), _arquivo(novo))
+        db.query(Foto).filter(Foto.caminho == novo).update({"tamanho": _tamanho(novo)})
+    db.commit()
+    coletar_lixo(db, carencia=0)
+    return liberado
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.fotos [coletar|deduplicar]
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    comando = sys.argv[1] if len(sys.argv) > 1 else "coletar"
+    db = SessionLocal()
+    try:
+        if comando == "deduplicar":
+            print(f"Fotos deduplicadas: {deduplicar(db) / 1024:.0f} KB liberados.")
+        else:
+            print(f"Fotos sem referência removidas: {coletar_lixo(db)}")
+    finally:
+        db.close()
@@ -0,0 +1,101 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+from jinja2 import Environment, FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+logger = logging.getLogger(__name__)
+
+# Templates compilados (bytecode) ficam em disco: um worker novo não recompila nada
+PASTA_BYTECODE = os.getenv("DJWASH_CACHE_TEMPLATES", "app/cache/templates")
+# Fragmentos renderizados guardados na memória de cada processo (0 desliga o cache)
+MAX_FRAGMENTOS = int(os.getenv("DJWASH_CACHE_FRAGMENTOS", "5000"))
+
+
+def _congelar(valor) -> Hashable:
+    # Listas vindas do template ({{ c.veiculos|map(...)|list }}) viram tuplas para entrar na chave
+    if isinstance(valor, (list, tuple)):
+        return tuple(_congelar(v) for v in valor)
+    return valor
+
+
+class _Lru:
+    def __init__(self, maximo: int):
+        self.maximo = maximo
+        self._itens: "OrderedDict[Hashable, str]" = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave) -> Optional[str]:
+        with self._trava:
+            valor = self._itens.get(chave)
+            if valor is not None:
+                self._itens.move_to_end(chave)
+            return valor
+
+    def guardar(self, chave, valor: str):
+        with self._trava:
+            self._itens[chave] = valor
+            self._itens.move_to_end(chave)
+            while len(self._itens) > self.maximo:
+                self._itens.popitem(last=False)
+
+    def limpar(self):
+        with self._trava:
+            self._itens.clear()
+
+    def __len__(self):
+        return len(self._itens)
+
+
+fragmentos = _Lru(MAX_FRAGMENTOS)
+
+
+class CacheFragmentos(Extension):
+    """Tag `{% cache "nome", id, atualizado_em, ... %}...{% endcache %}`.
+
+    O trecho é renderizado uma vez por chave. A chave leva o id da entidade e o carimbo
+    de atualização (ou a versão do catálogo): quando o registro muda, a chave muda junto e
+    o fragmento antigo simplesmente deixa de ser usado, sem invalidação manual.
+    O trecho só pode depender do que está na chave.
+    """
+    tags = {"cache"}
+
+    def parse(self, parser):
+        linha = next(parser.stream).lineno
+        partes = [parser.parse_expression()]
+        while parser.stream.skip_if("comma"):
+            partes.append(parser.parse_expression())
+        corpo = parser.parse_statements(("name:endcache",), drop_needle=True)
+        chamada = self.call_method("_renderizar", [nodes.List(partes)])
+        return nodes.CallBlock(chamada, [], [], corpo).set_lineno(linha)
+
+    def _renderizar(self, partes, caller):
+        if not MAX_FRAGMENTOS:
+            return caller()
+        chave = _congelar(partes)
+        html = fragmentos.obter(chave)
+        if html is None:
+            html = caller()  # Markup (autoescape) é guardado como está
+            fragmentos.guardar(chave, html)
+        return html
+
+
+def configurar(env: Environment):
+    os.makedirs(PASTA_BYTECODE, exist_ok=True)
+    env.bytecode_cache = FileSystemBytecodeCache(PASTA_BYTECODE)
+    env.add_extension(CacheFragmentos)
+
+
+def precompilar(env: Environment) -> int:
+    """Compila todos os templates na subida do worker (primeira visita de cada página sem atraso)."""
+    compilados = 0
+    for nome in env.list_templates(extensions=["html"]):
+        try:
+            env.get_template(nome)
+            compilados += 1
+        except Exception:
+            logger.exception("Falha ao compilar o template %s", nome)
+    return compilados
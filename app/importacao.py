@@ -0,0 +1,273 @@
+import csv
+import io
+import itertools
+import sys
+import time
+from datetime import datetime
+from typing import IO, Dict, Iterator, List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Session
+
+from app import agenda, busca, financeiro, models
+
+# Importação em massa de clientes, veículos e lavagens antigas a partir de um CSV
+# (cadastro de outra filial). Uma linha = cliente + veículo e, se tiver data_inicio,
+# uma lavagem. Colunas reconhecidas (cabeçalho sem acento/maiúsculas também vale):
+#   nome, telefone, marca, modelo, placa, categoria,
+#   servico (nome ou id), data_inicio, data_fim, status,
+#   valor_total, custo_insumos, custo_mao_de_obra, lucro_real
+#
+# O arquivo é lido em lotes: cada lote é uma transação com INSERTs em lote (executemany).
+# Na memória ficam só o lote atual e os mapas telefone -> cliente e placa -> veículo
+# (crescem com o número de clientes/veículos, não com o de lavagens).
+LOTE = 5000
+# Erros guardados com detalhe no relatório (o total é sempre contado)
+MAX_ERROS = 1000
+CATEGORIAS = ("hatch", "sedan", "suv", "pickup")
+STATUS = ("concluida", "em_andamento")
+FORMATOS_DATA = ("%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M", "%d/%m/%Y")
+
+
+class LinhaInvalida(ValueError):
+    pass
+
+
+# --- LEITURA E VALIDAÇÃO ---
+def abrir_texto(binario: IO[bytes]) -> IO[str]:
+    """Texto do CSV: UTF-8 (com ou sem BOM) ou, se não decodificar, Windows-1252 (Excel)."""
+    amostra = binario.read(64 * 1024)
+    binario.seek(0)
+    try:
+        amostra.decode("utf-8")
+        codificacao = "utf-8-sig"
+    except UnicodeDecodeError as erro:
+        # Amostra cortada no meio de um caractere multibyte ainda é UTF-8
+        codificacao = "utf-8-sig" if erro.start >= len(amostra) - 3 else "cp1252"
+    return io.TextIOWrapper(binario, encoding=codificacao, newline="")
+
+
+def _linhas(texto: IO[str]) -> Iterator[Tuple[int, dict]]:
+    primeira = texto.readline()
+    delimitador = ";" if primeira.count(";") > primeira.count(",") else ","
+    cabecalho = [busca.dobrar(c).strip().replace(" ", "_") for c in next(csv.reader([primeira], delimiter=delimitador))]
+    # Linha 1 é o cabeçalho; a numeração segue a do arquivo (como o usuário vê na planilha)
+    for numero, valores in enumerate(csv.reader(texto, delimiter=delimitador), start=2):
+        if any(v.strip() for v in valores):
+            yield numero, dict(zip(cabecalho, (v.strip() for v in valores)))
+
+
+def _numero(valor: Optional[str], campo: str) -> Optional[float]:
+    if not valor:
+        return None
+    valor = valor.replace("R$", "").strip()
+    if "," in valor:  # 1.234,56
+        valor = valor.replace(".", "").replace(",", ".")
+    try:
+        return float(valor)
+    except ValueError:
+        raise LinhaInvalida(f"{campo}: número inválido '{valor}'")
+
+
+def _data(valor: Optional[str], campo: str) -> Optional[datetime]:
+    if not valor:
+        return None
+    try:
+        return datetime.fromisoformat(valor)
+    except ValueError:
+        pass
+    for formato in FORMATOS_DATA:
+        try:
+            return datetime.strptime(valor, formato)
+        except ValueError:
+            continue
+    raise LinhaInvalida(f"{campo}: data inválida '{valor}'")
+
+
+def _validar(linha: dict, servicos: Dict[str, int]) -> dict:
+    placa = busca.normalizar_placa(linha.get("placa"))
+    if not placa:
+        raise LinhaInvalida("placa obrigatória")
+    telefones = busca.variantes_telefone(linha.get("telefone"))
+    if not telefones:
+        raise LinhaInvalida("telefone obrigatório")
+    categoria = (linha.get("categoria") or "hatch").lower()
+    if categoria not in CATEGORIAS:
+        raise LinhaInvalida(f"categoria inválida '{linha['categoria']}'")
+
+    dados = {"placa": placa, "telefones": telefones, "categoria": categoria, "lavagem": None}
+    inicio = _data(linha.get("data_inicio"), "data_inicio")
+    if inicio is None:
+        return dados
+
+    fim = _data(linha.get("data_fim"), "data_fim")
+    if fim and fim < inicio:
+        raise LinhaInvalida("data_fim antes de data_inicio")
+    servico = linha.get("servico")
+    servico_id = servicos.get(busca.dobrar(servico).strip()) if servico else None
+    if servico and servico_id is None:
+        raise LinhaInvalida(f"serviço desconhecido '{servico}'")
+    valor = _numero(linha.get("valor_total"), "valor_total") or 0.0
+    insumos = _numero(linha.get("custo_insumos"), "custo_insumos") or 0.0
+    mao_de_obra = _numero(linha.get("custo_mao_de_obra"), "custo_mao_de_obra") or 0.0
+    lucro = _numero(linha.get("lucro_real"), "lucro_real")
+    status = (linha.get("status") or ("concluida" if fim else "em_andamento")).lower()
+    if status not in STATUS:
+        raise LinhaInvalida(f"status inválido '{linha['status']}'")
+    minutos = int((fim - inicio).total_seconds() // 60) if fim else 0
+    dados["lavagem"] = {
+        "servico_id": servico_id,
+        "data_inicio": inicio,
+        "data_fim": fim,
+        "status": status,
+        "valor_total": valor,
+        "custo_insumos": insumos,
+        "custo_mao_de_obra": mao_de_obra,
+        "lucro_real": lucro if lucro is not None else valor - insumos - mao_de_obra,
+        "minutos_totais": minutos,
+        "tempo_total": f"{minutos // 60:02d}:{minutos % 60:02d}" if fim else None,
+    }
+    return dados
+
+
+# --- GRAVAÇÃO ---
+def _mapas(db: Session) -> Tuple[Dict[str, int], Dict[str, int], Dict[str, int]]:
+    # Telefone/placa normalizados dos registros existentes -> id (deduplicação contra o banco)
+    clientes = {}
+    for cliente_id, telefone in db.query(models.Cliente.id, models.Cliente.telefone).yield_per(5000):
+        # Todas as variantes, como nas placas: com e sem DDD (e sem o 55) caem no mesmo cliente
+        for chave in busca.variantes_telefone(telefone):
+            clientes.setdefault(chave, cliente_id)
+    veiculos = {}
+    for veiculo_id, placa in db.query(models.Veiculo.id, models.Veiculo.placa).yield_per(5000):
+        for chave in busca.variantes_placa(placa):
+            veiculos.setdefault(chave, veiculo_id)
+    servicos = {}
+    for servico_id, nome in db.query(models.ServicoCatalogo.id, models.ServicoCatalogo.nome):
+        servicos[str(servico_id)] = servico_id
+        servicos[busca.dobrar(nome).strip()] = servico_id
+    return clientes, veiculos, servicos
+
+
+def _gravar_lote(db: Session, lote: List[Tuple[int, dict]], clientes: Dict[str, int], veiculos: Dict[str, int],
+                 servicos: Dict[str, int], relatorio: dict):
+    agora = datetime.now()
+    # Ids definidos aqui: o MAX é lido na mesma transação dos INSERTs (outro escritor no meio faz o lote falhar)
+    proximo_cliente = (db.query(func.max(models.Cliente.id)).scalar() or 0) + 1
+    proximo_veiculo = (db.query(func.max(models.Veiculo.id)).scalar() or 0) + 1
+    novos_clientes, novos_veiculos, lavagens, erros = [], [], [], []
+
+    for numero, linha in lote:
+        try:
+            dados = _validar(linha, servicos)
+            # A variante mais completa primeiro: o número com DDD acha o cliente certo antes do sem DDD
+            cliente_id = next((clientes[c] for c in dados["telefones"] if c in clientes), None)
+            veiculo_id = veiculos.get(dados["placa"])
+            if cliente_id is None and veiculo_id is None and not linha.get("nome"):
+                raise LinhaInvalida("nome obrigatório para cliente novo")
+        except LinhaInvalida as erro:
+            erros.append({"linha": numero, "erro": str(erro)})
+            continue
+
+        if cliente_id is None and veiculo_id is None:
+            cliente_id, proximo_cliente = proximo_cliente, proximo_cliente + 1
+            for chave in dados["telefones"]:
+                clientes.setdefault(chave, cliente_id)
+            novos_clientes.append({"id": cliente_id, "nome": linha["nome"], "telefone": linha["telefone"],
+                                   "atualizado_em": agora})
+        if veiculo_id is None:
+            veiculo_id, proximo_veiculo = proximo_veiculo, proximo_veiculo + 1
+            for chave in busca.variantes_placa(dados["placa"]):
+                veiculos[chave] = veiculo_id
+            novos_veiculos.append({"id": veiculo_id, "marca": linha.get("marca"), "modelo": linha.get("modelo"),
+                                   "placa": dados["placa"], "categoria": dados["categoria"],
+                                   "cliente_id": cliente_id, "atualizado_em": agora})
+        if dados["lavagem"]:
+            lavagens.append({"veiculo_id": veiculo_id, **dados["lavagem"]})
+
+    # Reimportar o mesmo arquivo não duplica lavagens: (veículo, data_inicio) já gravados são pulados
+    existentes = set()
+    if lavagens:
+        existentes = {tuple(l) for l in db.query(models.Lavagem.veiculo_id, models.Lavagem.data_inicio).filter(
+            models.Lavagem.veiculo_id.in_({l["veiculo_id"] for l in lavagens}),
+            models.Lavagem.data_inicio.between(min(l["data_inicio"] for l in lavagens),
+                                               max(l["data_inicio"] for l in lavagens))
+        )}
+    novas_lavagens = []
+    for lavagem in lavagens:
+        chave = (lavagem["veiculo_id"], lavagem["data_inicio"])
+        if chave not in existentes:
+            existentes.add(chave)
+            novas_lavagens.append({**lavagem, "atualizado_em": agora})
+
+    if novos_clientes:
+        db.execute(insert(models.Cliente), novos_clientes)
+    if novos_veiculos:
+        db.execute(insert(models.Veiculo), novos_veiculos)
+    if novas_lavagens:
+        db.execute(insert(models.Lavagem), novas_lavagens)
+        financeiro.registrar_lote(db, (
+            (l["data_inicio"], l["data_fim"], l["valor_total"], l["custo_insumos"], l["custo_mao_de_obra"],
+             l["lucro_real"], 0.0) for l in novas_lavagens if l["status"] == "concluida"
+        ))
+    busca.indexar_clientes(db, {c["id"] for c in novos_clientes} | {v["cliente_id"] for v in novos_veiculos})
+    db.commit()
+
+    relatorio["clientes_novos"] += len(novos_clientes)
+    relatorio["veiculos_novos"] += len(novos_veiculos)
+    relatorio["lavagens_novas"] += len(novas_lavagens)
+    relatorio["lavagens_repetidas"] += len(lavagens) - len(novas_lavagens)
+    _registrar_erros(relatorio, erros)
+
+
+def _registrar_erros(relatorio: dict, erros: List[dict]):
+    relatorio["total_erros"] += len(erros)
+    relatorio["erros"].extend(erros[:MAX_ERROS - len(relatorio["erros"])])
+
+
+def importar(db: Session, texto: IO[str], lote: int = LOTE) -> dict:
+    """Importa o CSV em lotes e devolve o relatório (contagens e erros por linha).
+
+    Lotes já gravados continuam gravados se um lote posterior falhar; as linhas do lote
+    que falhou entram como erro e a importação segue.
+    """
+    inicio = time.perf_counter()
+    relatorio = {"linhas": 0, "clientes_novos": 0, "veiculos_novos": 0, "lavagens_novas": 0,
+                 "lavagens_repetidas": 0, "total_erros": 0, "erros": []}
+    clientes, veiculos, servicos = _mapas(db)
+    linhas = _linhas(texto)
+    while True:
+        atual = list(itertools.islice(linhas, lote))
+        if not atual:
+            break
+        relatorio["linhas"] += len(atual)
+        try:
+            _gravar_lote(db, atual, clientes, veiculos, servicos, relatorio)
+        except Exception as erro:
+            db.rollback()
+            _registrar_erros(relatorio, [{"linha": n, "erro": f"lote não gravado: {erro}"} for n, _ in atual])
+            clientes, veiculos, servicos = _mapas(db)  # Ids atribuídos no lote perdido não existem
+
+    if relatorio["lavagens_novas"]:
+        agenda.estimar_do_historico(db.connection())  # Durações importadas entram nas previsões
+        db.commit()
+    relatorio["segundos"] = round(time.perf_counter() - inicio, 2)
+    return relatorio
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.importacao arquivo.csv
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    db = SessionLocal()
+    try:
+        with open(sys.argv[1], "rb") as arquivo:
+            resultado = importar(db, abrir_texto(arquivo))
+    finally:
+        db.close()
+    for erro in resultado.pop("erros"):
+        print(f"linha {erro['linha']}: {erro['erro']}")
+    print(" | ".join(f"{chave}: {valor}" for chave, valor in resultado.items()))
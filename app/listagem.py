@@ -0,0 +1,155 @@
+import json
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional
+
+from fastapi import HTTPException
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+from app.database import SessionLeitura
+
+L, V, C = models.Lavagem, models.Veiculo, models.Cliente
+
+# Camada comum das listagens JSON (app/routes/listagens.py):
+#   - cursor por chave (id decrescente): a página seguinte é "id < cursor", sem OFFSET
+#   - `fields=` vira o SELECT: só as colunas pedidas saem do banco (sem carregar o ORM)
+#   - filtros de período (desde/ate, por dia, inclusive) e de status
+#   - modo NDJSON: percorre o resultado em lotes por cursor, uma linha JSON por registro
+LIMITE_PADRAO = 50
+LIMITE_MAXIMO = 500
+LOTE_NDJSON = 1000
+
+
+def _colunas(modelo) -> Dict[str, object]:
+    return {coluna.name: getattr(modelo, coluna.key) for coluna in modelo.__table__.columns}
+
+
+# Campo -> coluna. Campos de outras tabelas só fazem o JOIN quando pedidos.
+RECURSOS = {
+    "lavagens": {
+        "modelo": L,
+        "campos": {
+            **_colunas(L),
+            "placa": V.placa,
+            "veiculo": V.modelo,
+            "categoria": V.categoria,
+            "cliente_id": V.cliente_id,
+            "cliente": C.nome,
+            "telefone": C.telefone,
+        },
+        "padrao": ["id", "veiculo_id", "servico_id", "status", "data_inicio", "data_fim", "tempo_total",
+                   "valor_total", "custo_insumos", "custo_mao_de_obra", "lucro_real"],
+        "data": L.data_inicio,
+        "status": L.status,
+    },
+    "clientes": {
+        "modelo": C,
+        "campos": _colunas(C),
+        "padrao": ["id", "nome", "telefone", "atualizado_em"],
+        "data": C.atualizado_em,  # "alterados desde" para integrações que sincronizam
+        "status": None,
+    },
+}
+
+
+def _campos(recurso: dict, fields: Optional[str]) -> List[str]:
+    if not fields:
+        return list(recurso["padrao"])
+    pedidos = list(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+    invalidos = [f for f in pedidos if f not in recurso["campos"]]
+    if invalidos:
+        raise HTTPException(status_code=400, detail={
+            "erro": f"Campos inválidos: {', '.join(invalidos)}",
+            "disponiveis": sorted(recurso["campos"]),
+        })
+    return pedidos
+
+
+def consulta(nome: str, campos: List[str], cursor: Optional[int], desde: Optional[date], ate: Optional[date],
+             status: Optional[str], cliente_id: Optional[int]):
+    recurso = RECURSOS[nome]
+    modelo = recurso["modelo"]
+    colunas = [recurso["campos"][c].label(c) for c in campos]
+    if "id" not in campos:
+        colunas.append(modelo.id.label("id"))  # Necessário para o cursor
+
+    stmt = select(*colunas).select_from(modelo)
+    if modelo is L:
+        tabelas = {getattr(recurso["campos"][c], "class_", None) for c in campos}
+        if cliente_id is not None or V in tabelas or C in tabelas:
+            stmt = stmt.outerjoin(V, V.id == L.veiculo_id)
+        if C in tabelas:
+            stmt = stmt.outerjoin(C, C.id == V.cliente_id)
+        if cliente_id is not None:
+            stmt = stmt.where(V.cliente_id == cliente_id)
+
+    if desde or ate:
+        if recurso["data"] is None:
+            raise HTTPException(status_code=400, detail=f"'{nome}' não tem filtro de período")
+        if desde:
+            stmt = stmt.where(recurso["data"] >= datetime.combine(desde, datetime.min.time()))
+        if ate:
+            stmt = stmt.where(recurso["data"] < datetime.combine(ate + timedelta(days=1), datetime.min.time()))
+    if status:
+        if recurso["status"] is None:
+            raise HTTPException(status_code=400, detail=f"'{nome}' não tem filtro de status")
+        stmt = stmt.where(recurso["status"] == status)
+    if cursor is not None:
+        stmt = stmt.where(modelo.id < cursor)
+    return stmt.order_by(modelo.id.desc())
+
+
+def _registro(linha, campos: List[str]) -> dict:
+    dados = linha._mapping
+    return {c: dados[c] for c in campos}
+
+
+def listar(db: Session, nome: str, fields: Optional[str] = None, limite: int = LIMITE_PADRAO,
+           cursor: Optional[int] = None, desde: Optional[date] = None, ate: Optional[date] = None,
+           status: Optional[str] = None, cliente_id: Optional[int] = None) -> dict:
+    """Uma página da listagem: {"itens": [...], "proximo_cursor": id ou None}."""
+    campos = _campos(RECURSOS[nome], fields)
+    limite = max(1, min(limite, LIMITE_MAXIMO))
+    # Busca um a mais para saber se existe próxima página
+    linhas = db.execute(consulta(nome, campos, cursor, desde, ate, status, cliente_id).limit(limite + 1)).all()
+    tem_mais = len(linhas) > limite
+    linhas = linhas[:limite]
+    return {
+        "itens": [_registro(l, campos) for l in linhas],
+        "proximo_cursor": linhas[-1].id if tem_mais else None,
+    }
+
+
+def _json(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo não serializável: {type(valor).__name__}")
+
+
+def preparar_ndjson(nome: str, fields: Optional[str] = None, cursor: Optional[int] = None,
+                   desde: Optional[date] = None, ate: Optional[date] = None, status: Optional[str] = None,
+                   cliente_id: Optional[int] = None) -> Iterator[str]:
+    """Valida os parâmetros na hora (erro 400 antes de começar a resposta) e devolve o gerador.
+
+    Cada lote usa a sua sessão de leitura: a resposta continua sendo enviada depois que a
+    sessão da requisição já foi fechada, e nada além de um lote fica na memória.
+    """
+    campos = _campos(RECURSOS[nome], fields)
+    consulta(nome, campos, cursor, desde, ate, status, cliente_id)
+
+    def linhas(cursor: Optional[int]) -> Iterator[str]:
+        while True:
+            db = SessionLeitura()
+            try:
+                stmt = consulta(nome, campos, cursor, desde, ate, status, cliente_id)
+                lote = db.execute(stmt.limit(LOTE_NDJSON)).all()
+            finally:
+                db.close()
+            for linha in lote:
+                yield json.dumps(_registro(linha, campos), default=_json, ensure_ascii=False) + "\n"
+            if len(lote) < LOTE_NDJSON:
+                return
+            cursor = lote[-1].id
+
+    return linhas(cursor)
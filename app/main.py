@@ -1,48 +1,106 @@
 # 1. Bibliotecas padrão do Python
 import os
-import io
-import shutil
-from datetime import datetime
+import threading
+from datetime import date, datetime, timedelta
 from typing import Optional, List
 
 # FastAPI e Respostas
 from fastapi import FastAPI, Request, Depends, Form, Response, HTTPException, UploadFile, File
-from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, FileResponse, StreamingResponse
 from fastapi.templating import Jinja2Templates
 from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 
 # Banco de Dados
-from sqlalchemy.orm import Session
-from app.database import engine, get_db
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from app.database import engine, get_db, get_db_leitura, SessionLocal, SessionLeitura
 from app import models
+from app import dashboard as feed
+from app import retencao
+from app import financeiro
+from app import migracoes
+
+# PDF e trabalho pesado fora do event loop
+from app import recibos
+from app import executores
+from app import uploads
+from app import fotos
+from app import miniaturas
+from app import exportacao
+from app import catalogo
+from app import custeio
+from app import estoque
+from app import agenda
+from app import eventos
+from app import fragmentos
+from app import busca
+from app import importacao
+from app import exclusao
+from app import analise
+from app import rateio
+from app.routes import listagens
+
+# Cria as tabelas novas e aplica as migrações pendentes (índices etc.)
+migracoes.aplicar(engine)
 
-# ReportLab (Geração de PDF)
-from reportlab.pdfgen import canvas
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.colors import HexColor
+app = FastAPI()
 
-# Cria as tabelas no banco se não existirem
-models.Base.metadata.create_all(bind=engine)
+# Recusa uploads gigantes antes de o formulário ser lido
+app.add_middleware(uploads.LimiteUploadMiddleware)
 
-app = FastAPI()
+
+@app.on_event("startup")
+def preparar_resumo_financeiro():
+    db = SessionLocal()
+    try:
+        financeiro.garantir_resumo(db)
+    finally:
+        db.close()
+
+
+@app.on_event("startup")
+def aquecer_analise():
+    # Somas mensais da análise de rentabilidade em segundo plano (não atrasa o startup)
+    threading.Thread(target=analise.aquecer, args=(SessionLeitura,), name="djwash-analise", daemon=True).start()
+
+
+@app.on_event("startup")
+def precompilar_templates():
+    fragmentos.precompilar(templates.env)
+
+
+@app.on_event("shutdown")
+def encerrar_executores():
+    executores.encerrar()
 
 # Configuração de Pastas
 templates = Jinja2Templates(directory="app/templates")
+# {{ caminho|variante('thumb') }} -> menor derivada adequada (ou o original, se ainda não gerada)
+templates.env.filters["variante"] = miniaturas.melhor_variante
+# Bytecode dos templates em disco e tag {% cache %} para trechos estáveis (cards, linhas de tabela)
+fragmentos.configurar(templates.env)
 
 # Garante que a pasta de uploads existe
 if not os.path.exists("app/static/uploads"):
     os.makedirs("app/static/uploads")
 
 app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Listagens JSON paginadas (lavagens, clientes, histórico do cliente) — app/routes/listagens.py
+app.include_router(listagens.router)
+
+# Quantidade de lavagens listadas na tabela do /historico
+LIMITE_HISTORICO = 100
 
 
 
 # --- ROTA DO DASHBOARD (HOME) ---
 @app.get("/", response_class=HTMLResponse)
-async def dashboard(request: Request, db: Session = Depends(get_db)):
-    # Busca lavagens em aberto e concluídas
-    lavagens = db.query(models.Lavagem).order_by(models.Lavagem.id.desc()).all()
+def dashboard(request: Request, db: Session = Depends(get_db_leitura)):
+    # Em andamento sempre aparecem; concluídas vêm numa janela paginada por cursor
+    ativas = feed.buscar_lavagens_ativas(db)
+    concluidas, proximo_cursor = feed.buscar_lavagens_concluidas(db)
+    lavagens = ativas + concluidas
 
     # Busca produtos para o formulário antigo (se ainda usar)
     produtos_disponiveis = db.query(models.Produto).all()
@@ -54,12 +112,79 @@ async def dashboard(request: Request, db: Session = Depends(get_db)):
         "request": request,
         "lavagens": lavagens,
         "produtos_disponiveis": produtos_disponiveis,
-        "clientes_recentes": clientes_recentes  # <-- Importante para a barra superior
+        "clientes_recentes": clientes_recentes,  # <-- Importante para a barra superior
+        "proximo_cursor": proximo_cursor,
+        "previsoes": agenda.prever(db, ativas)  # Box e horário previsto de entrega
     })
 
 
+# --- FILA AO VIVO (BOXES E PREVISÃO DE ENTREGA) ---
+@app.get("/fila")
+def fila_ao_vivo(servico_id: Optional[int] = None, categoria: Optional[str] = None,
+                 db: Session = Depends(get_db_leitura)):
+    # Com servico_id (e categoria), inclui o horário de retirada para um carro que chegasse agora
+    return agenda.fila(db, servico_id=servico_id, categoria=categoria)
+
+
+# --- ATUALIZAÇÕES AO VIVO (SSE) ---
+@app.get("/eventos")
+async def eventos_ao_vivo(request: Request):
+    # O dashboard troca só o card que mudou, sem recarregar a lista inteira
+    return StreamingResponse(
+        eventos.assinar(request.headers.get("last-event-id"), request.is_disconnected),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+def _publicar_card(db: Session, tipo: str, lavagem_id: int):
+    # O card é renderizado uma vez aqui e o mesmo HTML vai para todos os tablets conectados
+    ativas = feed.buscar_lavagens_ativas(db)
+    lavagem = next((l for l in ativas if l.id == lavagem_id), None) or feed.buscar_lavagem(db, lavagem_id)
+    if lavagem is None:
+        return
+    previsoes = agenda.prever(db, ativas)
+    html = templates.env.get_template("_card_lavagem.html").render(lavagem=lavagem, previsoes=previsoes)
+    novos = [(tipo, {"id": lavagem_id, "status": lavagem.status, "html": html})]
+    if tipo != "checklist_salvo":
+        novos.append(_evento_previsoes(db, previsoes))
+    eventos.publicar_varios(db, novos)
+
+
+def _evento_previsoes(db: Session, previsoes: Optional[dict] = None) -> tuple:
+    # Fila mudou (lavagem entrou, saiu ou terminou): box e horário previsto de todos os cards abertos
+    if previsoes is None:
+        previsoes = agenda.prever(db, feed.buscar_lavagens_ativas(db))
+    return "previsoes", {
+        lavagem_id: {"box": p["box"], "previsao_fim": p["previsao_fim"].strftime("%H:%M")}
+        for lavagem_id, p in previsoes.items()
+    }
+
+
+def _publicar_lote(db: Session):
+    # Mudança em lote (importação, exclusão restaurada): um aviso só, e os tablets recarregam a lista
+    eventos.publicar(db, "recarregar", {})
+
+
+# --- FEED DE SERVIÇOS ANTIGOS (PAGINAÇÃO POR CURSOR) ---
+@app.get("/lavagens/antigas", response_class=HTMLResponse)
+def lavagens_antigas(
+    request: Request,
+    antes_de: Optional[int] = None,
+    limite: int = feed.LIMITE_CONCLUIDAS,
+    db: Session = Depends(get_db_leitura)
+):
+    lavagens, proximo_cursor = feed.buscar_lavagens_concluidas(db, antes_de=antes_de, limite=limite)
+
+    # Devolve só os cards; o cursor da próxima página vai no cabeçalho
+    return templates.TemplateResponse("_pagina_lavagens.html", {
+        "request": request,
+        "lavagens": lavagens
+    }, headers={"X-Proximo-Cursor": str(proximo_cursor or "")})
+
+
 @app.post("/lavagens/registrar")
-async def registrar_nova_lavagem(
+def registrar_nova_lavagem(
     modo_cliente: str = Form(...),
     veiculo_id: Optional[int] = Form(None),
     nome: Optional[str] = Form(None),
@@ -77,31 +202,26 @@ async def registrar_nova_lavagem(
     if modo_cliente == "existente":
         v_id = veiculo_id
     else:
-        cliente = db.query(models.Cliente).filter(models.Cliente.telefone == telefone).first()
+        # Telefone e placa são comparados normalizados (formatação, DDD, placa antiga x Mercosul)
+        cliente = busca.cliente_por_telefone(db, telefone)
         if not cliente:
             cliente = models.Cliente(nome=nome, telefone=telefone)
             db.add(cliente)
             db.flush()
 
-        veiculo = db.query(models.Veiculo).filter(models.Veiculo.placa == placa.upper()).first()
+        veiculo = busca.veiculo_por_placa(db, placa)
         if not veiculo:
-            veiculo = models.Veiculo(marca=marca, modelo=modelo, placa=placa.upper(), categoria=categoria, cliente_id=cliente.id)
+            veiculo = models.Veiculo(marca=marca, modelo=modelo, placa=busca.normalizar_placa(placa), categoria=categoria, cliente_id=cliente.id)
             db.add(veiculo)
             db.flush()
+        busca.indexar_clientes(db, [cliente.id])
         v_id = veiculo.id
 
-    # --- 2. PRECIFICAÇÃO ---
-    servico_base = db.query(models.ServicoCatalogo).filter(models.ServicoCatalogo.id == servico_id).first()
-    veiculo_obj = db.query(models.Veiculo).filter(models.Veiculo.id == v_id).first()
-    cat = veiculo_obj.categoria.lower() if veiculo_obj.categoria else "hatch"
-
-    precos = {
-        "hatch": servico_base.preco_hatch,
-        "sedan": servico_base.preco_sedan,
-        "suv": servico_base.preco_suv,
-        "pickup": servico_base.preco_pickup
-    }
-    valor_base = precos.get(cat, servico_base.preco_hatch)
+    # --- 2. PRECIFICAÇÃO (preços por categoria vêm do catálogo em memória) ---
+    categoria_veiculo = db.query(models.Veiculo.categoria).filter(models.Veiculo.id == v_id).scalar()
+    valor_base = catalogo.preco_servico(catalogo.obter(db), servico_id, categoria_veiculo)
+    if valor_base is None:
+        raise HTTPException(status_code=404, detail="Serviço não encontrado")
 
     # --- 3. CRIAÇÃO DA LAVAGEM ---
     nova_lavagem = models.Lavagem(
@@ -111,16 +231,18 @@ async def registrar_nova_lavagem(
         tipo_sujeira=f"Adicional: R$ {tipo_sujeira}",
         checklist_avarias=obs_entrada,
         status="em_andamento",
-        data_inicio=datetime.now() # <--- CORREÇÃO: Horário local
+        data_inicio=datetime.now(), # <--- CORREÇÃO: Horário local
+        box=agenda.proximo_box(db)[0]  # Box que libera primeiro
     )
     db.add(nova_lavagem)
     db.commit()
+    _publicar_card(db, "lavagem_criada", nova_lavagem.id)
     return RedirectResponse(url="/", status_code=303)
 
 
 
 @app.get("/lavagem/{lavagem_id}/checklist", response_class=HTMLResponse)
-async def exibir_form_checklist(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
+def exibir_form_checklist(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
     lavagem = db.query(models.Lavagem).get(lavagem_id)
     if not lavagem:
         raise HTTPException(status_code=404, detail="Lavagem não encontrada")
@@ -129,33 +251,41 @@ async def exibir_form_checklist(lavagem_id: int, request: Request, db: Session =
 
 # --- ADICIONE ESTA ROTA PARA SALVAR O VALOR DA HORA ---
 @app.post("/gestao/configurar_hora")
-async def configurar_hora(valor_hora: float = Form(...), db: Session = Depends(get_db)):
+def configurar_hora(valor_hora: float = Form(...), db: Session = Depends(get_db)):
     config = db.query(models.Configuracao).first()
     if not config:
         config = models.Configuracao(valor_hora=valor_hora)
         db.add(config)
     else:
         config.valor_hora = valor_hora
+    catalogo.invalidar(db)
     db.commit()
     return RedirectResponse(url="/gestao", status_code=303)
 
-@app.get("/lavagem/{id}/finalizar")
-async def tela_finalizar(id: int, request: Request, db: Session = Depends(get_db)):
-    lavagem = db.query(models.Lavagem).get(id)
+
+@app.post("/gestao/configurar_rateio")
+def configurar_rateio(criterio_rateio: str = Form(...), db: Session = Depends(get_db)):
+    if criterio_rateio not in rateio.CRITERIOS:
+        raise HTTPException(status_code=400, detail="Critério de rateio inválido")
     config = db.query(models.Configuracao).first()
-    valor_hora = config.valor_hora if config else 0.0
+    if not config:
+        config = models.Configuracao(valor_hora=0.0, criterio_rateio=criterio_rateio)
+        db.add(config)
+    else:
+        config.criterio_rateio = criterio_rateio
+    catalogo.invalidar(db)
+    db.commit()
+    return RedirectResponse(url="/gestao", status_code=303)
 
-    # 1. Cálculo de Tempo Real (Usando datetime.now() para bater com a entrada)
-    tempo_decorrido = datetime.now() - lavagem.data_inicio
-    minutos = max(tempo_decorrido.total_seconds() / 60, 0)
-    custo_tempo = minutos * (valor_hora / 60)
+@app.get("/lavagem/{id}/finalizar")
+def tela_finalizar(id: int, request: Request, db: Session = Depends(get_db)):
+    lavagem = db.query(models.Lavagem).get(id)
+    cat = catalogo.obter(db)
 
-    # 2. Custo de Insumos
-    custo_produtos = 0.0
-    if lavagem.servico:
-        for p in lavagem.servico.produtos_fixos:
-            if p.ml_total and p.ml_total > 0:
-                custo_produtos += (p.preco_compra / p.ml_total) * p.ml_por_uso
+    # 1 e 2. Tempo real (datetime.now() para bater com a entrada) e insumos fixos do serviço
+    custos = custeio.calcular(
+        cat, lavagem.data_inicio, datetime.now(), custeio.produtos_do_servico(cat, lavagem.servico_id)
+    )
 
     # 3. CORREÇÃO: Sugestão é o que foi gravado na entrada (40, 45, 50...)
     # Não somamos o custo_tempo no preço do cliente!
@@ -165,8 +295,8 @@ async def tela_finalizar(id: int, request: Request, db: Session = Depends(get_db
         "request": request,
         "lavagem": lavagem,
         "sugestao": round(sugestao, 2),
-        "custo_tempo": round(custo_tempo, 2),
-        "custo_produtos": round(custo_produtos, 2)
+        "custo_tempo": round(custos["custo_mao_de_obra"], 2),
+        "custo_produtos": round(custos["custo_insumos"], 2)
     })
 
 
@@ -180,78 +310,82 @@ async def finalizar_lavagem(
         foto_depois: Optional[UploadFile] = File(None),
         db: Session = Depends(get_db)
 ):
+    if not await run_in_threadpool(_lavagem_existe, db, lavagem_id):
+        raise HTTPException(status_code=404, detail="Lavagem não encontrada")
+
+    # 3. SALVAMENTO DE FOTOS (ENTRADA E SAÍDA)
+    # Pasta separada (entregas); as duas fotos são gravadas em paralelo e por conteúdo
+    foto_entrada, foto_saida = await uploads.salvar_fotos([(foto_antes, "entregas"), (foto_depois, "entregas")])
+
+    await run_in_threadpool(
+        _finalizar_no_banco, db, lavagem_id, valor_final_cobrado, produtos_ids, foto_entrada, foto_saida
+    )
+    # Miniaturas, versões web/impressão e o PDF do recibo são gerados em segundo plano
+    miniaturas.agendar([foto_entrada, foto_saida])
+    recibos.agendar(lavagem_id)
+    # Redireciona para o relatório de entrega (Antes e Depois)
+    return RedirectResponse(url=f"/lavagem/{lavagem_id}/recibo_final", status_code=303)
+
+
+def _lavagem_existe(db: Session, lavagem_id: int) -> bool:
+    return db.query(models.Lavagem.id).filter(models.Lavagem.id == lavagem_id).first() is not None
+
+
+def _finalizar_no_banco(db: Session, lavagem_id: int, valor_final_cobrado: float,
+                        produtos_ids: Optional[List[int]], foto_entrada: Optional[str], foto_saida: Optional[str]):
     lavagem = db.query(models.Lavagem).filter(models.Lavagem.id == lavagem_id).first()
-    config = db.query(models.Configuracao).first()
-    valor_hora = config.valor_hora if config else 0.0
 
-    # 1. CÁLCULO DE TEMPO (Sincronizado)
+    # Se o serviço já estava concluído (reenvio do formulário), retira os valores antigos do resumo
+    financeiro.descontar_lavagem(db, lavagem)
+    rateio.descontar(db, lavagem)
+
+    # 1 e 2. TEMPO, PRODUTOS E LUCRO (mesmo cálculo da tela de finalização)
     lavagem.data_fim = datetime.now()
-    duracao = lavagem.data_fim - lavagem.data_inicio
-    segundos_totais = max(duracao.total_seconds(), 0)
-    custo_mao_de_obra = (segundos_totais / 3600) * valor_hora
-
-    # 2. CÁLCULO DE PRODUTOS
-    custo_total_produtos = 0.0
-    nomes_produtos = []
-    if produtos_ids:
-        for p_id in produtos_ids:
-            produto = db.query(models.Produto).get(p_id)
-            if produto and produto.ml_total > 0:
-                custo_dose = (produto.preco_compra / produto.ml_total) * produto.ml_por_uso
-                custo_total_produtos += custo_dose
-                nomes_produtos.append(produto.nome)
+    custos = custeio.calcular(
+        catalogo.obter(db), lavagem.data_inicio, lavagem.data_fim, produtos_ids, valor_final_cobrado
+    )
 
-    # 3. SALVAMENTO DE FOTOS (ENTRADA E SAÍDA)
-    # Criamos pastas separadas para organizar melhor o servidor
-    UPLOAD_DIR = "app/static/uploads/entregas"
-    os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-    # Processamos as fotos (Antes e Depois)
-    for tipo, arquivo in [("entrada", foto_antes), ("saida", foto_depois)]:
-        if arquivo and arquivo.filename:
-            extensao = arquivo.filename.split(".")[-1]
-            timestamp = int(datetime.utcnow().timestamp())
-            nome_arquivo = f"{tipo}_{lavagem_id}_{timestamp}.{extensao}"
-            caminho_completo = os.path.join(UPLOAD_DIR, nome_arquivo)
-
-            with open(caminho_completo, "wb") as buffer:
-                shutil.copyfileobj(arquivo.file, buffer)
-
-            # Ajuste de nomes para bater com o banco de dados e templates
-                # CORREÇÃO AQUI: Alinhando com os nomes das colunas do Models.py
-                if tipo == "entrada":
-                    lavagem.foto_entrada_url = f"static/uploads/entregas/{nome_arquivo}"
-                else:
-                    lavagem.foto_saida_url = f"static/uploads/entregas/{nome_arquivo}"
+    # Fotos da entrega: substituem as anteriores do mesmo tipo (reenvio do formulário)
+    fotos.anexar(db, lavagem.id, "antes", [foto_entrada], substituir=True)
+    fotos.anexar(db, lavagem.id, "depois", [foto_saida], substituir=True)
+
+    # Média de duração do serviço (antes de mudar o status: o reenvio não conta duas vezes)
+    agenda.registrar_duracao(db, lavagem, custos["segundos"])
 
     # 4. ATUALIZAÇÃO DOS DADOS FINANCEIROS
     lavagem.status = "concluida"
-    lavagem.produtos_usados = ", ".join(nomes_produtos) if nomes_produtos else "Insumos padrão DJ WASH"
-    lavagem.custo_insumos = round(custo_total_produtos, 2)
-    lavagem.custo_mao_de_obra = round(custo_mao_de_obra, 2)
+    lavagem.produtos_usados = custos["produtos_usados"]
+    lavagem.custo_insumos = round(custos["custo_insumos"], 2)
+    lavagem.custo_mao_de_obra = round(custos["custo_mao_de_obra"], 2)
     lavagem.valor_total = valor_final_cobrado
+    # Parte dos custos fixos do mês (totais corridos; acertada no fechamento do mês)
+    lavagem.custo_fixo_rateado = rateio.ratear(db, lavagem.data_fim, custos["minutos"], valor_final_cobrado)
+    lavagem.lucro_real = round(custos["lucro_real"] - lavagem.custo_fixo_rateado, 2)
+    lavagem.tempo_total = custos["tempo_total"]  # HH:MM para o recibo
+    lavagem.minutos_totais = custos["minutos"]
 
-    # Cálculo do Lucro Real (Faturamento - Insumos - Mão de Obra)
-    lavagem.lucro_real = round(valor_final_cobrado - (custo_total_produtos + custo_mao_de_obra), 2)
-
-    # Formatação do tempo total para o recibo (HH:MM)
-    minutos_totais = int(segundos_totais / 60)
-    lavagem.tempo_total = f"{minutos_totais // 60:02d}:{minutos_totais % 60:02d}"
+    # Atualiza o resumo financeiro do dia e o estoque na mesma transação
+    financeiro.registrar_lavagem(db, lavagem)
+    estoque.consumir_lavagem(db, lavagem.id, custos["produtos"])
+    estoque.registrar_itens(db, lavagem.id, lavagem.data_fim, custos["produtos"])
 
     db.commit()
-    # Redireciona para o relatório de entrega (Antes e Depois)
-    return RedirectResponse(url=f"/lavagem/{lavagem_id}/recibo_final", status_code=303)
+    fotos.coletar_lixo(db)
+    _publicar_card(db, "lavagem_finalizada", lavagem_id)
 
 
 @app.get("/lavagem/{lavagem_id}/comprovante_entrada", response_class=HTMLResponse)
-async def comprovante_entrada(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
+def comprovante_entrada(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
     lavagem = db.query(models.Lavagem).filter(models.Lavagem.id == lavagem_id).first()
     if not lavagem:
         return "Lavagem não encontrada"
 
+    fotos_checklist = fotos.anexos(db, lavagem_id, ("avaria",))["avaria"]
     return templates.TemplateResponse("comprovante_entrada.html", {
         "request": request,
-        "l": lavagem
+        "l": lavagem,
+        "fotos_checklist": fotos_checklist,
+        "derivadas": miniaturas.registradas(db, fotos_checklist)
     })
 
 
@@ -263,297 +397,185 @@ async def salvar_checklist_modal(
         fotos_checklist: List[UploadFile] = File([]),  # Recebe lista de fotos
         db: Session = Depends(get_db)
 ):
-    lavagem = db.query(models.Lavagem).get(lavagem_id)
-    lavagem.checklist_combustivel = combustivel
-
-    # Processamento de Múltiplas Fotos
-    caminhos_fotos = []
-    if fotos_checklist:
-        UPLOAD_DIR = "app/static/uploads/checklists"
-        os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-        for foto in fotos_checklist:
-            if foto.filename:
-                ext = foto.filename.split(".")[-1]
-                nome_arquivo = f"avaria_{lavagem_id}_{int(datetime.utcnow().timestamp())}_{os.urandom(4).hex()}.{ext}"
-                caminho = os.path.join(UPLOAD_DIR, nome_arquivo)
+    if not await run_in_threadpool(_lavagem_existe, db, lavagem_id):
+        raise HTTPException(status_code=404, detail="Lavagem não encontrada")
 
-                with open(caminho, "wb") as buffer:
-                    shutil.copyfileobj(foto.file, buffer)
+    # Processamento de Múltiplas Fotos (gravadas em paralelo; repetidas reaproveitam o arquivo)
+    caminhos_fotos = await uploads.salvar_fotos([(foto, "checklists") for foto in fotos_checklist])
 
-                caminhos_fotos.append(f"static/uploads/checklists/{nome_arquivo}")
+    await run_in_threadpool(
+        _salvar_checklist_no_banco, db, lavagem_id, combustivel, avarias, [c for c in caminhos_fotos if c]
+    )
+    miniaturas.agendar(caminhos_fotos)
+    return RedirectResponse(url="/", status_code=303)
 
-    # Salvando os caminhos no banco (usando um campo de texto separado por vírgula)
-    if caminhos_fotos:
-        lavagem.foto_entrada_url = ",".join(caminhos_fotos)
 
+def _salvar_checklist_no_banco(db: Session, lavagem_id: int, combustivel: Optional[str],
+                               avarias: Optional[str], caminhos_fotos: List[str]):
+    lavagem = db.query(models.Lavagem).get(lavagem_id)
+    lavagem.checklist_combustivel = combustivel
     lavagem.checklist_avarias = avarias
+
+    # Fotos de avaria se somam às já enviadas (uma linha por foto em anexos_lavagem)
+    fotos.anexar(db, lavagem_id, "avaria", caminhos_fotos)
     db.commit()
-    return RedirectResponse(url="/", status_code=303)
+    fotos.coletar_lixo(db)
+    _publicar_card(db, "checklist_salvo", lavagem_id)
 
 @app.get("/lavagem/{lavagem_id}/recibo_final", response_class=HTMLResponse)
-async def visualizar_relatorio_final(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
+def visualizar_relatorio_final(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
     lavagem = db.query(models.Lavagem).get(lavagem_id)
     if not lavagem:
         raise HTTPException(status_code=404, detail="Lavagem não encontrada")
 
+    entrega = fotos.anexos(db, lavagem_id, ("antes", "depois"))
     return templates.TemplateResponse("recibo_final.html", {
         "request": request,
-        "l": lavagem
+        "l": lavagem,
+        "foto_antes": next(iter(entrega["antes"]), None),
+        "foto_depois": next(iter(entrega["depois"]), None),
+        "derivadas": miniaturas.registradas(db, entrega["antes"][:1] + entrega["depois"][:1])
     })
 
 
 @app.get("/lavagens/{lavagem_id}/dados-finalizacao")
-async def dados_finalizacao(lavagem_id: int, db: Session = Depends(get_db)):
+def dados_finalizacao(lavagem_id: int, db: Session = Depends(get_db)):
     lavagem = db.query(models.Lavagem).get(lavagem_id)
     if not lavagem:
         raise HTTPException(status_code=404, detail="Lavagem não encontrada")
 
-    # 1. Cálculo de Tempo (Sincronizado com o horário local)
-    agora = datetime.now()
-    delta = agora - lavagem.data_inicio
-    # max(..., 0) evita que o tempo fique negativo caso haja pequena variação de segundos
-    minutos_totais = max(int(delta.total_seconds() / 60), 0)
-
-    # 2. Busca Valor da Hora para cálculo interno de custo
-    config = db.query(models.Configuracao).first()
-    valor_hora = config.valor_hora if config else 0.0
-    custo_mao_de_obra = (minutos_totais / 60) * valor_hora
+    # 1 e 2. Tempo (sincronizado com o horário local) e custo de mão de obra, mesmo cálculo da gravação
+    cat = catalogo.obter(db)
+    custos = custeio.calcular(cat, lavagem.data_inicio, datetime.now())
 
-    # 3. Lista de Produtos
-    todos_produtos = db.query(models.Produto).all()
+    # 3. Lista de Produtos (custo por dose já calculado no catálogo)
     lista_produtos_json = []
-    for p in todos_produtos:
-        dose = (p.preco_compra / p.ml_total * p.ml_por_uso) if p.ml_total > 0 else 0
+    for p in cat["produtos"].values():
         lista_produtos_json.append({
-            "id": p.id,
-            "nome": p.nome,
-            "custo_por_dose": dose
+            "id": p["id"],
+            "nome": p["nome"],
+            "custo_por_dose": p["custo_dose"]
         })
 
-        valor_base = float(lavagem.valor_total or 0.0)
-        valor_sugerido = valor_base + custo_mao_de_obra
+    valor_base = float(lavagem.valor_total or 0.0)
+    valor_sugerido = valor_base + custos["custo_mao_de_obra"]
 
-        return {
-            "minutos": minutos_totais,
-            "valor_base": round(valor_base, 2),  # O JS estava travando aqui porque faltava essa linha
-            "custo_mao_de_obra": round(custo_mao_de_obra, 2),
-            "sugerido": round(valor_sugerido, 2),
-            "todos_produtos": lista_produtos_json
-        }
+    return {
+        "minutos": custos["minutos"],
+        "valor_base": round(valor_base, 2),  # O JS estava travando aqui porque faltava essa linha
+        "custo_mao_de_obra": round(custos["custo_mao_de_obra"], 2),
+        "custo_fixo_estimado": rateio.estimar(db, datetime.now(), custos["minutos"], valor_sugerido),
+        "sugerido": round(valor_sugerido, 2),
+        "todos_produtos": lista_produtos_json
+    }
 
 @app.get("/clientes/{cliente_id}/historico")
-async def historico_especifico_cliente(cliente_id: int, db: Session = Depends(get_db)):
-    # Agora o nome do argumento 'cliente_id' coincide com o da rota {cliente_id}
-    historico = db.query(models.Lavagem).join(models.Veiculo).filter(
-        models.Veiculo.cliente_id == cliente_id,
-        models.Lavagem.status == "concluida"
-    ).order_by(models.Lavagem.data_fim.desc()).all()
-
-    return historico
+def historico_especifico_cliente(cliente_id: int, db: Session = Depends(get_db_leitura)):
+    # Contrato antigo: lista completa das concluídas, da entrega mais recente para a mais antiga
+    # (a versão paginada é GET /clientes/{cliente_id}/lavagens/, em app/routes/listagens.py)
+    return feed.query_historico_do_cliente(db, cliente_id).all()
 
 
 @app.get("/lavagem/{lavagem_id}/detalhes", response_class=HTMLResponse)
-async def detalhes_lavagem(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
+def detalhes_lavagem(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
     lavagem = db.query(models.Lavagem).get(lavagem_id)
     if not lavagem:
         raise HTTPException(status_code=404, detail="Lavagem não encontrada")
 
-    # Separar fotos de avarias (Vistoria) das fotos de entrega (Antes/Depois)
-    fotos_avarias = []
-    foto_antes_entrega = None
-
-    if lavagem.foto_entrada_url:
-        lista_fotos = [f.strip() for f in lavagem.foto_entrada_url.split(",")]
-        # Fotos que estão na pasta checklists são avarias
-        fotos_avarias = [f for f in lista_fotos if "checklists" in f]
-        # A foto de "Antes" tirada na finalização está na pasta entregas
-        foto_antes_entrega = next((f for f in lista_fotos if "entregas" in f), None)
+    # Fotos de avarias (vistoria) e de entrega (antes/depois), já separadas por tipo
+    anexos = fotos.anexos(db, lavagem_id)
 
     return templates.TemplateResponse("detalhes_lavagem.html", {
         "request": request,
         "l": lavagem,
-        "fotos_avarias": fotos_avarias,
-        "foto_antes": foto_antes_entrega
+        "fotos_avarias": anexos["avaria"],
+        "foto_antes": next(iter(anexos["antes"]), None),
+        "foto_depois": next(iter(anexos["depois"]), None),
+        "derivadas": miniaturas.registradas(db, anexos["avaria"] + anexos["antes"][:1] + anexos["depois"][:1])
     })
 
 
 @app.get("/historico", response_class=HTMLResponse)
-async def historico_financeiro(request: Request, db: Session = Depends(get_db)):
-    lavagens = db.query(models.Lavagem).filter(models.Lavagem.status == "concluida").all()
-
-    total_faturado = sum(l.valor_total for l in lavagens if l.valor_total) or 0.0
-    total_produtos = sum(l.custo_insumos for l in lavagens if l.custo_insumos) or 0.0
-    total_mao_obra = sum(l.custo_mao_de_obra for l in lavagens if l.custo_mao_de_obra) or 0.0
-
-    # Cálculos de Inteligência
-    qtd_servicos = len(lavagens)
-    ticket_medio = total_faturado / qtd_servicos if qtd_servicos > 0 else 0.0
+def historico_financeiro(request: Request, db: Session = Depends(get_db_leitura)):
+    # Totais e gráficos vêm do resumo diário (O(dias), não O(lavagens))
+    resumo = financeiro.totais(db)
+    serie = financeiro.serie_diaria(db, ultimos_dias=7)
 
-    # Dados para o Gráfico (Exemplo simples: faturamento por serviço)
-    labels_grafico = [l.data_fim.strftime('%d/%m') for l in lavagens[-7:]]
-    valores_grafico = [float(l.valor_total or 0) for l in lavagens[-7:]]
+    # Tabela: apenas as lavagens mais recentes, já com veículo carregado
+    lavagens = feed.query_historico(db, LIMITE_HISTORICO).all()
 
     return templates.TemplateResponse("historico.html", {
         "request": request,
-        "lavagens": lavagens[::-1],  # Inverte para mostrar as mais recentes primeiro
-        "total_faturado": total_faturado,
-        "total_produtos": total_produtos,
-        "total_mao_obra": total_mao_obra,
-        "ticket_medio": ticket_medio,
-        "labels_grafico": labels_grafico,
-        "valores_grafico": valores_grafico
+        "lavagens": lavagens,  # Mais recentes primeiro
+        "total_faturado": resumo["faturamento"],
+        "total_produtos": resumo["custo_insumos"],
+        "total_mao_obra": resumo["custo_mao_de_obra"],
+        "total_custos_fixos": resumo["custos_fixos"],
+        "ticket_medio": resumo["ticket_medio"],
+        "meses_rateio": rateio.meses(db),
+        "labels_grafico": [d["dia"].strftime('%d/%m') for d in serie],
+        "valores_grafico": [d["faturamento"] for d in serie],
+        "custos_grafico": [round(d["custo_insumos"] + d["custo_mao_de_obra"] + d["custos_fixos"], 2) for d in serie],
+        "lucros_grafico": [d["lucro_real"] for d in serie]
     })
 # --- ROTA DE GERAÇÃO DE RECIBO PREMIUM DJ WASH ---
 @app.get("/lavagens/{lavagem_id}/recibo")
-async def gerar_recibo(lavagem_id: int, db: Session = Depends(get_db)):
-    lavagem = db.query(models.Lavagem).filter(models.Lavagem.id == lavagem_id).first()
+def gerar_recibo(lavagem_id: int, request: Request, db: Session = Depends(get_db_leitura)):
+    lavagem = db.query(models.Lavagem).options(
+        joinedload(models.Lavagem.veiculo).joinedload(models.Veiculo.cliente),
+        joinedload(models.Lavagem.servico)
+    ).filter(models.Lavagem.id == lavagem_id).first()
     if not lavagem:
         return {"erro": "Lavagem não encontrada"}
 
-    buffer = io.BytesIO()
-    pdf = canvas.Canvas(buffer, pagesize=A4)
-    largura, altura = A4
-
-    # Paleta de Cores DJ WASH
-    cor_roxo_dark = HexColor("#1A052D")  # Fundo Profundo
-    cor_roxo_vibrante = HexColor("#6A1B9A")  # Destaques
-    cor_gold = HexColor("#D4AF37")  # Dourado Premium
-    cor_texto = HexColor("#333333")
-
-    # --- 1. DESIGN DO CABEÇALHO (BANNER) ---
-    pdf.setFillColor(cor_roxo_dark)
-    pdf.rect(0, altura - 120, largura, 120, fill=1, stroke=0)
-
-    # Detalhe em dourado no topo
-    pdf.setFillColor(cor_gold)
-    pdf.rect(0, altura - 5, largura, 5, fill=1, stroke=0)
-
-    pdf.setFillColor(colors.white)
-    pdf.setFont("Helvetica-Bold", 28)
-    pdf.drawString(50, altura - 60, "DJ WASH")
-
-    pdf.setFont("Helvetica", 10)
-    pdf.drawString(50, altura - 80, "ESTÉTICA AUTOMOTIVA")
-
-    # ID do Recibo no canto superior
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawRightString(largura - 50, altura - 60, f"RECIBO Nº {lavagem.id:04d}")
-    pdf.setFont("Helvetica", 9)
-    pdf.drawRightString(largura - 50, altura - 80, f"Emissão: {datetime.now().strftime('%d/%m/%Y %H:%M')}")
-
-    # --- 2. INFORMAÇÕES DO CLIENTE E VEÍCULO ---
-    y = altura - 160
-    pdf.setFillColor(cor_roxo_vibrante)
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "INFORMAÇÕES DO CLIENTE")
-
-    pdf.setStrokeColor(cor_roxo_vibrante)
-    pdf.setLineWidth(1)
-    pdf.line(50, y - 5, largura - 50, y - 5)
-
-    pdf.setFillColor(cor_texto)
-    pdf.setFont("Helvetica-Bold", 10)
-    y -= 25
-    pdf.drawString(50, y, "CLIENTE:")
-    pdf.drawString(300, y, "VEÍCULO:")
-
-    pdf.setFont("Helvetica", 10)
-    pdf.drawString(105, y, f"{lavagem.veiculo.cliente.nome}")
-    pdf.drawString(355, y, f"{lavagem.veiculo.modelo} ({lavagem.veiculo.marca})")
-
-    y -= 15
-    pdf.setFont("Helvetica-Bold", 10)
-    pdf.drawString(50, y, "TELEFONE:")
-    pdf.drawString(300, y, "PLACA:")
-
-    pdf.setFont("Helvetica", 10)
-    pdf.drawString(115, y, f"{lavagem.veiculo.cliente.telefone}")
-    pdf.drawString(350, y, f"{lavagem.veiculo.placa}")
-
-    # --- 3. DETALHAMENTO DO SERVIÇO E PRODUTOS ---
-    y -= 40
-    pdf.setFillColor(cor_roxo_vibrante)
-    pdf.setFont("Helvetica-Bold", 12)
-    pdf.drawString(50, y, "DETALHES DO SERVIÇO REALIZADO")
-    pdf.line(50, y - 5, largura - 50, y - 5)
-
-    y -= 25
-    pdf.setFillColor(cor_texto)
-    pdf.setFont("Helvetica-Bold", 10)
-    pdf.drawString(50, y, "SERVIÇO:")
-
-    pdf.setFont("Helvetica", 10)
-    nome_servico = "Lavagem Geral / Detalhada"
-    if hasattr(lavagem, 'servico_id') and lavagem.servico_id:
-        servico_db = db.query(models.ServicoCatalogo).filter(models.ServicoCatalogo.id == lavagem.servico_id).first()
-        if servico_db: nome_servico = servico_db.nome
-    pdf.drawString(105, y, f"{nome_servico}")
-
-    y -= 20
-    pdf.setFont("Helvetica-Bold", 10)
-    pdf.drawString(50, y, "PRODUTOS UTILIZADOS:")
-
-    y -= 15
-    pdf.setFont("Helvetica-Oblique", 9)
-    # Quebra de texto automática para produtos longos
-    produtos_texto = lavagem.produtos_usados if lavagem.produtos_usados else "Insumos profissionais biodegradáveis (Padrão DJ WASH)"
-    pdf.drawString(60, y, f"- {produtos_texto}")
-
-    # --- 4. QUADRO FINANCEIRO (TAXAS E TOTAL) ---
-    y -= 50
-    # Caixa de fundo para o total
-    pdf.setFillColor(HexColor("#F9F9F9"))
-    pdf.roundRect(50, y - 80, largura - 100, 90, 5, fill=1, stroke=1)
-
-    pdf.setFillColor(cor_texto)
-    pdf.setFont("Helvetica-Bold", 11)
-    pdf.drawString(70, y - 15, "RESUMO FINANCEIRO")
-
-    pdf.setFont("Helvetica", 10)
-    pdf.drawString(70, y - 35, "Valor Base do Serviço:")
-    pdf.drawRightString(largura - 70, y - 35, f"R$ {lavagem.valor_total:.2f}")
-
-    # Aqui listamos as taxas (se você tiver campos de taxas extras no futuro, aparecem aqui)
-    pdf.drawString(70, y - 50, "Taxas Adicionais / Descontos:")
-    pdf.drawRightString(largura - 70, y - 50, "R$ 0,00")
-
-    pdf.setStrokeColor(colors.lightgrey)
-    pdf.line(70, y - 58, largura - 70, y - 58)
-
-    # Valor Total Destacado
-    pdf.setFillColor(cor_roxo_dark)
-    pdf.setFont("Helvetica-Bold", 14)
-    pdf.drawString(70, y - 75, "VALOR TOTAL PAGO")
-
-    pdf.setFillColor(cor_gold)
-    pdf.setFont("Helvetica-Bold", 16)
-    pdf.drawRightString(largura - 70, y - 75, f"R$ {lavagem.valor_total:.2f}")
-
-    # --- 5. RODAPÉ ---
-    y_final = 100
-    pdf.setFillColor(cor_roxo_vibrante)
-    pdf.setFont("Helvetica-Bold", 11)
-    pdf.drawCentredString(largura / 2, y_final, "Obrigado por confiar na DJ WASH!")
-
-    pdf.setFont("Helvetica", 9)
-    pdf.setFillColor(colors.grey)
-    pdf.drawCentredString(largura / 2, y_final - 15,
-                          "O QR Code para pagamento e a chave PIX foram enviados via mensagem.")
-    pdf.drawCentredString(largura / 2, y_final - 28, "Siga-nos no Instagram: @_djwash_")
-
-    pdf.showPage()
-    pdf.save()
-    buffer.seek(0)
-
-    return Response(
-        content=buffer.read(),
-        media_type="application/pdf",
-        headers={"Content-Disposition": f"inline; filename=Recibo_DJWASH_{lavagem.id}.pdf"}
+    # O PDF vem do cache (versão = hash do conteúdo); o cliente que reabre o link recebe 304
+    dados = recibos.dados_recibo(lavagem)
+    versao = recibos.versao(dados)
+    cabecalhos = {
+        "ETag": f'"{versao}"',
+        "Cache-Control": "private, no-cache",
+        "Content-Disposition": f"inline; filename=Recibo_DJWASH_{lavagem.id}.pdf"
+    }
+    if recibos.etag_confere(request.headers.get("if-none-match"), versao):
+        return Response(status_code=304, headers=cabecalhos)
+
+    # Se ainda não está em cache, o desenho do PDF (CPU) roda no executor limitado de PDFs
+    conteudo, _ = recibos.obter_recibo(dados)
+    return Response(content=conteudo, media_type="application/pdf", headers=cabecalhos)
+
+
+# --- EXPORTAÇÃO DE RECIBOS EM LOTE (FECHAMENTO DO MÊS) ---
+@app.post("/recibos/exportar")
+def exportar_recibos(data_inicio: date = Form(...), data_fim: date = Form(...)):
+    if data_fim < data_inicio:
+        raise HTTPException(status_code=400, detail="Data final antes da inicial")
+    return {"exportacao": exportacao.iniciar(data_inicio, data_fim)}
+
+
+@app.get("/recibos/exportar/{exportacao_id}")
+def progresso_exportacao(exportacao_id: str):
+    estado = exportacao.progresso(exportacao_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada")
+    return estado
+
+
+@app.get("/recibos/exportar/{exportacao_id}/arquivo")
+def baixar_exportacao(exportacao_id: str):
+    estado = exportacao.progresso(exportacao_id)
+    if estado is None:
+        raise HTTPException(status_code=404, detail="Exportação não encontrada")
+    if estado["status"] != "concluida":
+        raise HTTPException(status_code=409, detail="Exportação ainda não terminou")
+    return FileResponse(
+        estado["arquivo"], media_type="application/zip",
+        filename=f"Recibos_DJWASH_{estado['data_inicio']}_a_{estado['data_fim']}.zip"
     )
+
+
 # --- ROTAS DE GESTÃO E CONFIGURAÇÃO ---
 @app.get("/gestao", response_class=HTMLResponse)
-async def pagina_gestao(request: Request, db: Session = Depends(get_db)):
+def pagina_gestao(request: Request, db: Session = Depends(get_db)):
     produtos = db.query(models.Produto).all()
     servicos = db.query(models.ServicoCatalogo).all()
     custos_fixos = db.query(models.CustoFixo).all()
@@ -563,26 +585,97 @@ async def pagina_gestao(request: Request, db: Session = Depends(get_db)):
         "produtos": produtos,
         "servicos": servicos,
         "custos": custos_fixos,
-        "config": config
+        "config": config,
+        "estoque": {s["produto_id"]: s for s in estoque.situacao(db)},
+        "versao_catalogo": catalogo.versao_atual(db)  # Chave do cache das tabelas do catálogo
     })
 
 
 @app.post("/gestao/produto")
-async def salvar_produto(nome: str = Form(...), preco: float = Form(...), ml_total: int = Form(...),
+def salvar_produto(nome: str = Form(...), preco: float = Form(...), ml_total: int = Form(...),
                          ml_uso: int = Form(...), db: Session = Depends(get_db)):
     novo = models.Produto(nome=nome, preco_compra=preco, ml_total=ml_total, ml_por_uso=ml_uso)
     db.add(novo)
+    db.flush()
+    # O cadastro já conta como a compra do primeiro frasco
+    estoque.movimentar(db, [{"produto_id": novo.id, "tipo": "compra", "quantidade_ml": ml_total}])
+    catalogo.invalidar(db)
     db.commit()
     return RedirectResponse(url="/gestao", status_code=303)
 
 
+# --- ESTOQUE DE INSUMOS ---
+@app.post("/gestao/estoque")
+def movimentar_estoque(produto_id: int = Form(...), tipo: str = Form(...), quantidade_ml: int = Form(...),
+                       minimo_ml: Optional[str] = Form(None), db: Session = Depends(get_db)):
+    if not db.query(models.Produto.id).filter(models.Produto.id == produto_id).first():
+        raise HTTPException(status_code=404, detail="Produto não encontrado")
+    minimo_ml = (minimo_ml or "").strip()  # Campo opcional do formulário (vazio = não altera)
+    if minimo_ml and not minimo_ml.isdecimal():
+        raise HTTPException(status_code=400, detail="Estoque mínimo deve ser um número inteiro de ml")
+    if tipo == "compra":
+        delta = quantidade_ml
+    elif tipo == "ajuste":
+        # Ajuste = contagem física: grava a diferença para o saldo atual
+        saldo = db.query(models.EstoqueAtual.saldo_ml).filter(models.EstoqueAtual.produto_id == produto_id).scalar()
+        delta = quantidade_ml - (saldo or 0)
+    else:
+        raise HTTPException(status_code=400, detail="Tipo de movimento inválido")
+
+    if delta:
+        estoque.movimentar(db, [{"produto_id": produto_id, "tipo": tipo, "quantidade_ml": delta}])
+    if minimo_ml:
+        estoque.definir_minimo(db, produto_id, int(minimo_ml))
+    db.commit()
+    return RedirectResponse(url="/gestao", status_code=303)
+
+
+@app.get("/gestao/estoque")
+def situacao_estoque(apenas_baixo: bool = False, db: Session = Depends(get_db_leitura)):
+    return estoque.estoque_baixo(db) if apenas_baixo else estoque.situacao(db)
+
+
+@app.get("/gestao/estoque/consumo")
+def consumo_insumos(desde: Optional[date] = None, ate: Optional[date] = None, produto_id: Optional[int] = None,
+                    db: Session = Depends(get_db_leitura)):
+    # Doses, ml e custo por produto por mês (ate = dia inclusive)
+    return estoque.consumo_mensal(
+        db,
+        desde=datetime.combine(desde, datetime.min.time()) if desde else None,
+        ate=datetime.combine(ate + timedelta(days=1), datetime.min.time()) if ate else None,
+        produto_id=produto_id
+    )
+
+
+@app.get("/gestao/rateio")
+def listar_rateio(db: Session = Depends(get_db_leitura)):
+    return rateio.meses(db, limite=24)
+
+
+@app.post("/gestao/rateio/fechar")
+def fechar_rateio(mes: str = Form(..., pattern=r"^\d{4}-\d{2}$"), db: Session = Depends(get_db)):
+    # Fechamento/conciliação do mês: rateio recalculado em lote com a base real
+    try:
+        rateio.fechar_mes(db, mes)
+    except ValueError as erro:
+        raise HTTPException(status_code=400, detail=str(erro))
+    db.commit()
+    return RedirectResponse(url="/historico", status_code=303)
+
+
+@app.get("/gestao/analise")
+def analise_rentabilidade(desde: Optional[date] = None, ate: Optional[date] = None,
+                          db: Session = Depends(get_db_leitura)):
+    # Lucro por serviço x categoria e movimento por hora de entrada (ate = dia inclusive)
+    return analise.rentabilidade(db, desde, ate)
+
+
 @app.get("/cliente/{cliente_id}/historico", response_class=HTMLResponse)
-async def historico_cliente(request: Request, cliente_id: int, db: Session = Depends(get_db)):
+def historico_cliente(request: Request, cliente_id: int, db: Session = Depends(get_db_leitura)):
     cliente = db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
 
     # Busca todas as lavagens dos veículos deste cliente
-    lavagens = db.query(models.Lavagem).join(models.Veiculo).filter(models.Veiculo.cliente_id == cliente_id).order_by(
-        models.Lavagem.data_inicio.desc()).all()
+    lavagens = feed.query_lavagens_do_cliente(db, cliente_id).all()
     total_pago = sum(l.valor_total or 0 for l in lavagens)
 
     return templates.TemplateResponse("perfil_cliente.html", {
@@ -594,7 +687,7 @@ async def historico_cliente(request: Request, cliente_id: int, db: Session = Dep
 
 
 @app.post("/gestao/servico")
-async def salvar_servico_catalogo(
+def salvar_servico_catalogo(
         nome: str = Form(...),
         hatch: float = Form(0.0),
         sedan: float = Form(0.0),
@@ -618,48 +711,69 @@ async def salvar_servico_catalogo(
         servico.produtos_fixos = produtos_selecionados
 
     db.add(servico)
+    catalogo.invalidar(db)
     db.commit()
     return RedirectResponse(url="/gestao", status_code=303)
 
 
 @app.post("/gestao/custofixo")
-async def salvar_custo_fixo(item: str = Form(...), valor: float = Form(...), db: Session = Depends(get_db)):
+def salvar_custo_fixo(item: str = Form(...), valor: float = Form(...), db: Session = Depends(get_db)):
     nova_despesa = models.CustoFixo(item=item, valor=valor)
     db.add(nova_despesa)
+    catalogo.invalidar(db)  # Total a ratear nas próximas finalizações
     db.commit()
     return RedirectResponse(url="/gestao", status_code=303)
 
 @app.get("/clientes_gestao", response_class=HTMLResponse) # Adicione o response_class
-async def gerenciar_clientes(request: Request, db: Session = Depends(get_db)): # Adicione o request aqui
-    clientes = db.query(models.Cliente).all()
-    hoje = datetime.utcnow()
-
-    # Adicionamos a lógica de "Dias desde a última lavagem" para cada cliente
-    for cliente in clientes:
-        ultima_lavagem = None
-        for veiculo in cliente.veiculos:
-            lavagem = db.query(models.Lavagem).filter(
-                models.Lavagem.veiculo_id == veiculo.id,
-                models.Lavagem.status == 'concluida'
-            ).order_by(models.Lavagem.data_inicio.desc()).first()
-
-            if lavagem:
-                if not ultima_lavagem or lavagem.data_inicio > ultima_lavagem:
-                    ultima_lavagem = lavagem.data_inicio
-
-        cliente.ultima_visita = ultima_lavagem
-        if ultima_lavagem:
-            cliente.dias_ausente = (hoje - ultima_lavagem).days
-        else:
-            cliente.dias_ausente = None
+def gerenciar_clientes(
+    request: Request,
+    dias_min: Optional[int] = None,
+    dias_max: Optional[int] = None,
+    ordenar: str = "dias_desc",
+    pagina: int = 1,
+    db: Session = Depends(get_db_leitura)
+):
+    # "Dias desde a última lavagem" vem de uma única consulta agregada
+    clientes, total = retencao.buscar_retencao(
+        db, dias_min=dias_min, dias_max=dias_max, ordenar=ordenar, pagina=pagina
+    )
 
     return templates.TemplateResponse("clientes.html", {
         "request": request,  # Mude de {} para request
-        "clientes": clientes
+        "clientes": clientes,
+        "total": total,
+        "pagina": max(pagina, 1),
+        "tem_proxima": max(pagina, 1) * retencao.POR_PAGINA_PADRAO < total,
+        "dias_min": dias_min,
+        "ordenar": ordenar
     })
 
+
+# --- API DE RETENÇÃO (CAMPANHAS DE WHATSAPP) ---
+@app.get("/clientes_gestao/retencao")
+def api_retencao(
+    dias_min: Optional[int] = None,
+    dias_max: Optional[int] = None,
+    ordenar: str = "dias_desc",
+    pagina: int = 1,
+    por_pagina: int = retencao.POR_PAGINA_PADRAO,
+    db: Session = Depends(get_db_leitura)
+):
+    if ordenar not in retencao.ORDENACOES:
+        raise HTTPException(status_code=400, detail="Ordenação inválida")
+
+    clientes, total = retencao.buscar_retencao(
+        db, dias_min=dias_min, dias_max=dias_max, ordenar=ordenar,
+        pagina=pagina, por_pagina=por_pagina, carregar_veiculos=False
+    )
+    return {
+        "total": total,
+        "pagina": pagina,
+        "clientes": [retencao.cliente_para_dict(c) for c in clientes]
+    }
+
 @app.post("/clientes_gestao/cadastrar")
-async def cadastrar_cliente_veiculo(
+def cadastrar_cliente_veiculo(
         nome: str = Form(...),
         telefone: str = Form(...),
         modelo: str = Form(...),
@@ -669,7 +783,7 @@ async def cadastrar_cliente_veiculo(
         db: Session = Depends(get_db)
 ):
     # 1. Cria ou busca o cliente pelo telefone
-    cliente = db.query(models.Cliente).filter(models.Cliente.telefone == telefone).first()
+    cliente = busca.cliente_por_telefone(db, telefone)
     if not cliente:
         cliente = models.Cliente(nome=nome, telefone=telefone)
         db.add(cliente)
@@ -679,97 +793,154 @@ async def cadastrar_cliente_veiculo(
     novo_veiculo = models.Veiculo(
         marca=marca,
         modelo=modelo,
-        placa=placa.upper(),
+        placa=busca.normalizar_placa(placa),
         categoria=categoria,
         cliente_id=cliente.id
     )
     db.add(novo_veiculo)
+    db.flush()
+    busca.indexar_clientes(db, [cliente.id])
     db.commit()
 
     return RedirectResponse(url="/clientes_gestao", status_code=303)
 
 
+@app.post("/importacao/csv")
+def importar_csv(arquivo: UploadFile = File(...), db: Session = Depends(get_db)):
+    # Cadastro de outra filial: clientes, veículos e lavagens antigas de uma vez (ver app/importacao.py)
+    relatorio = importacao.importar(db, importacao.abrir_texto(arquivo.file))
+    if relatorio["lavagens_novas"]:
+        _publicar_lote(db)
+    return relatorio
+
+
 @app.get("/novo")
-async def nova_lavagem_page(db: Session = Depends(get_db)):
-    # Buscamos todos os veículos (que já vêm com os donos/clientes vinculados)
-    veiculos = db.query(models.Veiculo).all()
+def nova_lavagem_page(db: Session = Depends(get_db)):
+    # Os veículos não vão mais na página: o formulário busca por placa/telefone/nome em /busca/veiculos
     # Buscamos os serviços do catálogo para você escolher o preço certo
     servicos = db.query(models.ServicoCatalogo).all()
 
     return templates.TemplateResponse("cadastro.html", {
         "request": {},
-        "veiculos": veiculos,
         "servicos": servicos
     })
 
+
+@app.get("/busca/veiculos")
+def buscar_veiculos(q: str = "", limite: int = busca.LIMITE_PADRAO, db: Session = Depends(get_db_leitura)):
+    # Type-ahead do check-in: placa (antiga ou Mercosul), telefone (só dígitos) ou começo do nome
+    return busca.buscar(db, q, limite)
+
 from fastapi import HTTPException
 
 
-# Rota para excluir Cliente
-@app.delete("/clientes/{cliente_id}")
-async def excluir_cliente(cliente_id: int, db: Session = Depends(get_db)):
-    cliente = db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
-    if not cliente:
-        raise HTTPException(status_code=404, detail="Cliente não encontrado")
+def _apos_excluir_lavagens(db: Session, lavagem_ids: List[int]):
+    # Depois do commit: arquivos de foto sem referência, recibos em cache e cards abertos no dashboard
+    fotos.coletar_lixo(db)
+    # Uma varredura do cache e um evento só, mesmo para um cliente com milhares de lavagens
+    recibos.invalidar(*lavagem_ids)
+    if lavagem_ids:
+        eventos.publicar_varios(db, [("lavagens_excluidas", {"ids": lavagem_ids}), _evento_previsoes(db)])
 
-    # Apaga veículos e lavagens associadas antes de apagar o cliente
-    for v in cliente.veiculos:
-        db.query(models.Lavagem).filter(models.Lavagem.veiculo_id == v.id).delete()
-        db.delete(v)
 
-    db.delete(cliente)
+# Rota para excluir Cliente (com veículos e lavagens; arquivar=true guarda tudo para restaurar)
+@app.delete("/clientes/{cliente_id}")
+def excluir_cliente(cliente_id: int, arquivar: bool = False, db: Session = Depends(get_db)):
+    if db.query(models.Cliente.id).filter(models.Cliente.id == cliente_id).first() is None:
+        raise HTTPException(status_code=404, detail="Cliente não encontrado")
+    resultado = exclusao.excluir_clientes(db, [cliente_id], arquivar=arquivar)
     db.commit()
-    return {"status": "sucesso"}
+    _apos_excluir_lavagens(db, resultado["lavagens"])
+    return {"status": "sucesso", "arquivo_id": resultado["arquivo_id"]}
 
 
-# Rota para excluir Veículo
+# Rota para excluir Veículo (com as lavagens dele)
 @app.delete("/veiculos/{veiculo_id}")
-async def excluir_veiculo(veiculo_id: int, db: Session = Depends(get_db)):
-    veiculo = db.query(models.Veiculo).filter(models.Veiculo.id == veiculo_id).first()
-    if not veiculo:
+def excluir_veiculo(veiculo_id: int, arquivar: bool = False, db: Session = Depends(get_db)):
+    if db.query(models.Veiculo.id).filter(models.Veiculo.id == veiculo_id).first() is None:
         raise HTTPException(status_code=404, detail="Veículo não encontrado")
-    db.delete(veiculo)
+    resultado = exclusao.excluir_veiculos(db, [veiculo_id], arquivar=arquivar)
+    db.commit()
+    _apos_excluir_lavagens(db, resultado["lavagens"])
+    return {"status": "sucesso", "mensagem": "Veículo excluído", "arquivo_id": resultado["arquivo_id"]}
+
+
+# Exclusões arquivadas: listar, restaurar e descartar de vez
+@app.get("/exclusoes")
+def listar_exclusoes(db: Session = Depends(get_db_leitura)):
+    return exclusao.listar_arquivadas(db)
+
+
+@app.post("/exclusoes/{arquivo_id}/restaurar")
+def restaurar_exclusao(arquivo_id: int, db: Session = Depends(get_db)):
+    try:
+        resultado = exclusao.restaurar(db, arquivo_id)
+    except (IntegrityError, ValueError) as erro:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=f"Não foi possível restaurar: {getattr(erro, 'orig', erro)}")
+    if resultado is None:
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
+    db.commit()
+    if resultado["lavagens"]:
+        _publicar_lote(db)
+    return {"status": "sucesso", **resultado}
+
+
+@app.delete("/exclusoes/{arquivo_id}")
+def descartar_exclusao(arquivo_id: int, db: Session = Depends(get_db)):
+    if not exclusao.descartar(db, arquivo_id):
+        raise HTTPException(status_code=404, detail="Arquivo não encontrado")
     db.commit()
-    return {"status": "sucesso", "mensagem": "Veículo excluído"}
+    fotos.coletar_lixo(db)
+    return {"status": "sucesso"}
 
 
 # Rota para excluir Lavagem
 @app.delete("/lavagens/{lavagem_id}")
-async def excluir_lavagem(lavagem_id: int, db: Session = Depends(get_db)):
+def excluir_lavagem(lavagem_id: int, db: Session = Depends(get_db)):
     lavagem = db.query(models.Lavagem).filter(models.Lavagem.id == lavagem_id).first()
     if not lavagem:
         raise HTTPException(status_code=404, detail="Lavagem não encontrada")
+    financeiro.descontar_lavagem(db, lavagem)
+    rateio.descontar(db, lavagem)
+    fotos.liberar_lavagens(db, db.query(models.Lavagem).filter(models.Lavagem.id == lavagem_id))
     db.delete(lavagem)
     db.commit()
+    fotos.coletar_lixo(db)
+    recibos.invalidar(lavagem_id)
+    eventos.publicar_varios(db, [("lavagens_excluidas", {"ids": [lavagem_id]}), _evento_previsoes(db)])
     return {"status": "sucesso", "mensagem": "Lavagem excluída"}
 
 # Rota para excluir um Serviço do Catálogo
 @app.delete("/servicos/{id}")
-async def excluir_servico(id: int, db: Session = Depends(get_db)):
+def excluir_servico(id: int, db: Session = Depends(get_db)):
     item = db.query(models.ServicoCatalogo).filter(models.ServicoCatalogo.id == id).first()
     if not item:
         raise HTTPException(status_code=404, detail="Serviço não encontrado")
-    db.delete(item)
+    exclusao.excluir_servico(db, id)
+    catalogo.invalidar(db)
     db.commit()
     return {"status": "sucesso"}
 
 # Rota para excluir um Produto/Insumo
 @app.delete("/produtos/{id}")
-async def excluir_produto(id: int, db: Session = Depends(get_db)):
+def excluir_produto(id: int, db: Session = Depends(get_db)):
     item = db.query(models.Produto).filter(models.Produto.id == id).first()
     if not item:
         raise HTTPException(status_code=404, detail="Produto não encontrado")
     db.delete(item)
+    catalogo.invalidar(db)
     db.commit()
     return {"status": "sucesso"}
 
 # Rota para excluir um Custo Fixo
 @app.delete("/custosfixos/{id}")
-async def excluir_custo_fixo(id: int, db: Session = Depends(get_db)):
+def excluir_custo_fixo(id: int, db: Session = Depends(get_db)):
     item = db.query(models.CustoFixo).filter(models.CustoFixo.id == id).first()
     if not item:
         raise HTTPException(status_code=404, detail="Custo não encontrado")
     db.delete(item)
+    catalogo.invalidar(db)
     db.commit()
     return {"status": "sucesso"}
 
@@ -0,0 +1,535 @@
+import json
+import os
+import re
+import sys
+import unicodedata
+from collections import Counter
+from datetime import datetime
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from PIL import Image
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from app import models
+
+# Cada migração é (versão, descrição, passos). Um passo é um SQL ou uma função
+# que recebe a conexão. As versões só crescem: nunca edite uma já publicada.
+# Os passos não usam o código vivo dos módulos nem o DDL dos modelos atuais: o SQL (e a lógica,
+# quando é uma função) fica congelado aqui, como era na versão em que a migração foi publicada.
+# Tabelas novas continuam vindo do create_all, que roda antes das migrações.
+Passo = Union[str, Callable[[Connection], None]]
+
+def _adicionar_coluna(tabela: str, coluna: str, tipo: str) -> Callable[[Connection], None]:
+    # ALTER TABLE idempotente: bancos novos já recebem a coluna pelo create_all
+    def passo(conn: Connection):
+        existentes = {linha[1] for linha in conn.exec_driver_sql(f"PRAGMA table_info({tabela})")}
+        if coluna not in existentes:
+            conn.exec_driver_sql(f"ALTER TABLE {tabela} ADD COLUMN {coluna} {tipo}")
+    return passo
+
+
+def _colunas(conn: Connection, tabela: str) -> Dict[str, str]:
+    return {linha[1]: linha[2] for linha in conn.exec_driver_sql(f"PRAGMA table_info({tabela})")}
+
+
+def _reconstruir_tabela(tabela: str, ddl: str, indices: Sequence[str] = ()) -> Callable[[Connection], None]:
+    # O SQLite não altera restrições de uma tabela existente: cria a tabela com o DDL da migração
+    # com outro nome, copia as linhas, troca as tabelas e recria os índices.
+    # Colunas que o DDL não tem são mantidas: uma migração posterior cuida delas.
+    # Tabela que já tem ON DELETE (banco criado depois, direto pelo create_all) fica como está
+    def passo(conn: Connection):
+        atual = conn.exec_driver_sql(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabela,)
+        ).scalar()
+        if atual is None or "ON DELETE" in atual.upper():
+            return
+        existentes = _colunas(conn, tabela)
+        conn.exec_driver_sql(ddl.replace(f"CREATE TABLE {tabela} (", f"CREATE TABLE _nova_{tabela} (", 1))
+        novas = _colunas(conn, f"_nova_{tabela}")
+        for coluna, tipo in existentes.items():
+            if coluna not in novas:
+                conn.exec_driver_sql(f"ALTER TABLE _nova_{tabela} ADD COLUMN {coluna} {tipo}")
+        colunas = ", ".join(existentes)
+        conn.exec_driver_sql(f"INSERT INTO _nova_{tabela} ({colunas}) SELECT {colunas} FROM {tabela}")
+        conn.exec_driver_sql(f"DROP TABLE {tabela}")
+        conn.exec_driver_sql(f"ALTER TABLE _nova_{tabela} RENAME TO {tabela}")
+        for indice in indices:
+            conn.exec_driver_sql(indice)
+    return passo
+
+
+# --- PASSOS CONGELADOS ---
+# Fotos: arquivos em app/<caminho>, gravados como <sha256>.<ext> desde a versão 2
+def _arquivo(caminho: str) -> str:
+    return os.path.join("app", caminho.lstrip("/"))
+
+
+def _tamanho(caminho: str) -> int:
+    arquivo = _arquivo(caminho)
+    return os.path.getsize(arquivo) if os.path.exists(arquivo) else 0
+
+
+def _sha256_do_nome(caminho: str) -> Optional[str]:
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return nome if len(nome) == 64 and all(c in "0123456789abcdef" for c in nome) else None
+
+
+def _gravar_referencias(conn: Connection, contagem: Counter, somar: bool):
+    # somar=False: a contagem substitui a gravada; True: soma (negativa = desconta)
+    atualizar = "referencias + excluded.referencias" if somar else "excluded.referencias"
+    for caminho, n in contagem.items():
+        if n:
+            conn.exec_driver_sql(
+                "INSERT INTO fotos_armazenadas (caminho, sha256, tamanho, referencias) VALUES (?, ?, ?, ?) "
+                f"ON CONFLICT (caminho) DO UPDATE SET referencias = {atualizar}",
+                (caminho, _sha256_do_nome(caminho), _tamanho(caminho), n)
+            )
+
+
+# Colunas da lavagem que guardavam fotos até a versão 9 (várias por coluna, separadas por vírgula)
+_COLUNAS_FOTO_V2 = ("foto_entrada_url", "foto_saida_url", "foto_antes", "foto_depois")
+
+
+def _fotos_das_colunas(conn: Connection, onde: str = "1") -> Counter:
+    colunas = [c for c in _COLUNAS_FOTO_V2 if c in _colunas(conn, "lavagens")]
+    contagem = Counter()
+    if colunas:
+        for linha in conn.exec_driver_sql(f"SELECT {', '.join(colunas)} FROM lavagens WHERE {onde}"):
+            for valor in linha:
+                contagem.update(c.strip().lstrip("/") for c in (valor or "").split(",") if c.strip())
+    return contagem
+
+
+def _v2_contar_referencias(conn: Connection):
+    # Contagem inicial a partir das colunas de foto das lavagens existentes
+    contagem = _fotos_das_colunas(conn)
+    conn.exec_driver_sql("DELETE FROM fotos_armazenadas")
+    _gravar_referencias(conn, contagem, somar=False)
+
+
+def _v5_estimar_do_historico(conn: Connection):
+    # Média inicial de duração (serviço x categoria) das lavagens concluídas, de 5 min a 12 h
+    duracao = "(julianday(l.data_fim) - julianday(l.data_inicio)) * 86400"
+    conn.exec_driver_sql("DELETE FROM estimativas_duracao")
+    conn.exec_driver_sql(
+        "INSERT INTO estimativas_duracao (servico_id, categoria, amostras, media_segundos) "
+        f"SELECT l.servico_id, LOWER(COALESCE(NULLIF(TRIM(v.categoria), ''), 'hatch')), COUNT(*), AVG({duracao}) "
+        "FROM lavagens l JOIN veiculos v ON v.id = l.veiculo_id "
+        "WHERE l.status = 'concluida' AND l.servico_id IS NOT NULL AND l.data_fim IS NOT NULL "
+        f"AND {duracao} BETWEEN 300 AND 43200 "
+        "GROUP BY 1, 2"
+    )
+
+
+def _v7_dobrar(texto: Optional[str]) -> str:
+    decomposto = unicodedata.normalize("NFKD", texto or "")
+    return "".join(c for c in decomposto if not unicodedata.combining(c)).lower()
+
+
+def _v7_placas(placa: Optional[str]) -> List[str]:
+    # Formatos antigo e Mercosul (o 5º caractere: 0 -> A ... 9 -> J)
+    placa = re.sub(r"[^A-Z0-9]", "", _v7_dobrar(placa).upper())
+    if re.fullmatch(r"[A-Z]{3}\d{4}", placa):
+        return [placa, placa[:4] + "ABCDEFGHIJ"[int(placa[4])] + placa[5:]]
+    if re.fullmatch(r"[A-Z]{3}\d[A-J]\d{2}", placa):
+        return [placa, placa[:4] + str("ABCDEFGHIJ".index(placa[4])) + placa[5:]]
+    return [placa] if placa else []
+
+
+def _v7_telefones(telefone: Optional[str]) -> List[str]:
+    # Só dígitos, com e sem DDD (e sem o 55 do país)
+    numero = re.sub(r"\D", "", telefone or "")
+    if len(numero) in (12, 13) and numero.startswith("55"):
+        numero = numero[2:]
+    if len(numero) in (10, 11):
+        return [numero, numero[2:]]
+    return [numero] if numero else []
+
+
+def _v7_indexar_busca(conn: Connection):
+    # Índice FTS5 do check-in: uma linha por veículo (rowid = id) e uma por cliente sem veículo (-id)
+    conn.exec_driver_sql(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS busca_veiculos USING fts5("
+        "placa, telefone, nome, modelo, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3 4')"
+    )
+    conn.exec_driver_sql("DELETE FROM busca_veiculos")
+    linhas = [
+        (rowid, " ".join(_v7_placas(placa)), " ".join(_v7_telefones(telefone)), _v7_dobrar(nome),
+         _v7_dobrar(f"{marca or ''} {modelo or ''}").strip())
+        for rowid, placa, marca, modelo, nome, telefone in conn.exec_driver_sql(
+            "SELECT v.id, v.placa, v.marca, v.modelo, c.nome, c.telefone "
+            "FROM veiculos v LEFT JOIN clientes c ON c.id = v.cliente_id "
+            "UNION ALL "
+            "SELECT -c.id, NULL, NULL, NULL, c.nome, c.telefone FROM clientes c "
+            "WHERE NOT EXISTS (SELECT 1 FROM veiculos v WHERE v.cliente_id = c.id)"
+        ).fetchall()
+    ]
+    if linhas:
+        conn.exec_driver_sql(
+            "INSERT INTO busca_veiculos (rowid, placa, telefone, nome, modelo) VALUES (?, ?, ?, ?, ?)", linhas
+        )
+
+
+_LAVAGENS_ORFAS = "(veiculo_id IS NULL OR veiculo_id NOT IN (SELECT id FROM veiculos))"
+
+
+def _v8_remover_orfaos(conn: Connection):
+    # Veículos de clientes apagados saem (e do índice de busca); lavagens sem veículo saem,
+    # descontadas do resumo (se já existe; senão garantir_resumo monta depois) e das fotos
+    veiculos = [(i,) for (i,) in conn.exec_driver_sql(
+        "SELECT id FROM veiculos WHERE cliente_id IS NOT NULL AND cliente_id NOT IN (SELECT id FROM clientes)"
+    )]
+    if veiculos:
+        conn.exec_driver_sql("DELETE FROM busca_veiculos WHERE rowid = ?", veiculos)
+        conn.exec_driver_sql("DELETE FROM veiculos WHERE id = ?", veiculos)
+
+    if conn.exec_driver_sql("SELECT 1 FROM resumo_financeiro_diario LIMIT 1").first() is not None:
+        por_dia = {}
+        for dia, *valores in conn.exec_driver_sql(
+            "SELECT date(COALESCE(data_fim, data_inicio)), valor_total, custo_insumos, custo_mao_de_obra, "
+            f"lucro_real FROM lavagens WHERE status = 'concluida' AND {_LAVAGENS_ORFAS}"
+        ):
+            soma = por_dia.setdefault(dia, [0] * 5)
+            soma[0] -= 1
+            for i, valor in enumerate(valores, start=1):
+                soma[i] -= int(round((valor or 0.0) * 100))
+        for dia, soma in por_dia.items():
+            conn.exec_driver_sql(
+                "INSERT INTO resumo_financeiro_diario (dia, quantidade, faturamento_centavos, insumos_centavos, "
+                "mao_de_obra_centavos, lucro_centavos) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (dia) DO UPDATE SET "
+                "quantidade = quantidade + excluded.quantidade, "
+                "faturamento_centavos = faturamento_centavos + excluded.faturamento_centavos, "
+                "insumos_centavos = insumos_centavos + excluded.insumos_centavos, "
+                "mao_de_obra_centavos = mao_de_obra_centavos + excluded.mao_de_obra_centavos, "
+                "lucro_centavos = lucro_centavos + excluded.lucro_centavos",
+                (dia, *soma)
+            )
+    _gravar_referencias(conn, Counter({c: -n for c, n in _fotos_das_colunas(conn, _LAVAGENS_ORFAS).items()}),
+                        somar=True)
+    conn.exec_driver_sql(f"DELETE FROM lavagens WHERE {_LAVAGENS_ORFAS}")
+
+
+_V8_VEICULOS = (
+    "CREATE TABLE veiculos (id INTEGER NOT NULL, marca VARCHAR, modelo VARCHAR, placa VARCHAR, categoria VARCHAR, "
+    "cliente_id INTEGER, atualizado_em DATETIME, PRIMARY KEY (id), UNIQUE (placa), "
+    "FOREIGN KEY(cliente_id) REFERENCES clientes (id) ON DELETE CASCADE)"
+)
+_V8_LAVAGENS = (
+    "CREATE TABLE lavagens (id INTEGER NOT NULL, veiculo_id INTEGER, servico_id INTEGER, data_inicio DATETIME, "
+    "data_fim DATETIME, tempo_total VARCHAR, minutos_totais INTEGER, foto_saida_url VARCHAR, foto_antes VARCHAR, "
+    "foto_depois VARCHAR, valor_total FLOAT, custo_insumos FLOAT, custo_mao_de_obra FLOAT, lucro_real FLOAT, "
+    "checklist_avarias VARCHAR, checklist_combustivel VARCHAR, checklist_objetos VARCHAR, checklist_pneus VARCHAR, "
+    "foto_entrada_url VARCHAR, status VARCHAR, box INTEGER, tipo_sujeira VARCHAR, checklist TEXT, "
+    "produtos_usados TEXT, atualizado_em DATETIME, PRIMARY KEY (id), "
+    "FOREIGN KEY(veiculo_id) REFERENCES veiculos (id) ON DELETE CASCADE, "
+    "FOREIGN KEY(servico_id) REFERENCES servicos_catalogo (id) ON DELETE SET NULL)"
+)
+
+
+def _v9_anexos_antigos(colunas: Dict[str, Optional[str]]) -> List[Tuple[str, str]]:
+    # (tipo, caminho) das colunas de foto; a de "antes" da entrega ficava em foto_entrada_url,
+    # junto com as do checklist (pastas diferentes)
+    resultado = []
+    for coluna in _COLUNAS_FOTO_V2:
+        for caminho in (colunas.get(coluna) or "").split(","):
+            caminho = caminho.strip().lstrip("/")
+            if not caminho:
+                continue
+            if coluna == "foto_entrada_url":
+                tipo = "avaria" if "checklists" in caminho else "antes"
+            else:
+                tipo = "depois" if coluna in ("foto_saida_url", "foto_depois") else "antes"
+            resultado.append((tipo, caminho))
+    return resultado
+
+
+def _v9_dimensoes(caminho: str) -> Tuple[Optional[int], Optional[int]]:
+    try:
+        with Image.open(_arquivo(caminho)) as imagem:
+            return imagem.size
+    except (OSError, ValueError):
+        return None, None
+
+
+def _v9_migrar_colunas_de_foto(conn: Connection):
+    # Uma linha em anexos_lavagem por foto das colunas antigas, que saem da tabela lavagens
+    colunas = [c for c in _COLUNAS_FOTO_V2 if c in _colunas(conn, "lavagens")]
+    if not colunas:
+        return
+    agora = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
+    linhas = []
+    consulta = f"SELECT id, {', '.join(colunas)} FROM lavagens WHERE " + " OR ".join(f"{c} IS NOT NULL" for c in colunas)
+    for lavagem_id, *valores in conn.exec_driver_sql(consulta).fetchall():
+        for tipo, caminho in _v9_anexos_antigos(dict(zip(colunas, valores))):
+            linhas.append((lavagem_id, tipo, caminho, _tamanho(caminho), *_v9_dimensoes(caminho), agora))
+    if linhas:
+        conn.exec_driver_sql(
+            "INSERT INTO anexos_lavagem (lavagem_id, tipo, caminho, tamanho, largura, altura, criado_em) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", linhas
+        )
+    for coluna in colunas:
+        conn.exec_driver_sql(f"ALTER TABLE lavagens DROP COLUMN {coluna}")
+
+
+def _v9_converter_arquivos(conn: Connection):
+    # Exclusões arquivadas antes de anexos_lavagem: as fotos saem das colunas de cada lavagem
+    # guardada e vão para a lista "anexos", como nas novas
+    for arquivo_id, dados in conn.exec_driver_sql("SELECT id, dados FROM exclusoes_arquivadas").fetchall():
+        dados = json.loads(dados)
+        if "anexos" in dados:
+            continue
+        dados["anexos"] = []
+        for linha in dados["lavagens"]:
+            for tipo, caminho in _v9_anexos_antigos(linha):
+                dados["anexos"].append({"lavagem_id": linha["id"], "tipo": tipo, "caminho": caminho,
+                                        "criado_em": linha.get("data_inicio") or datetime.now().isoformat()})
+            for coluna in _COLUNAS_FOTO_V2:
+                linha.pop(coluna, None)
+        conn.exec_driver_sql("UPDATE exclusoes_arquivadas SET dados = ? WHERE id = ?",
+                             (json.dumps(dados, ensure_ascii=False), arquivo_id))
+
+
+def _v9_contar_referencias(conn: Connection):
+    # Recontagem a partir dos anexos e das exclusões arquivadas (que seguram as fotos até
+    # serem descartadas); as derivadas já geradas são mantidas
+    contagem = Counter(c for (c,) in conn.exec_driver_sql("SELECT caminho FROM anexos_lavagem"))
+    for (dados,) in conn.exec_driver_sql("SELECT dados FROM exclusoes_arquivadas"):
+        contagem.update(a["caminho"] for a in json.loads(dados).get("anexos", []))
+    conn.exec_driver_sql("UPDATE fotos_armazenadas SET referencias = 0")
+    _gravar_referencias(conn, contagem, somar=False)
+
+
+def _v10_separar_nomes(texto: str, conhecidos: set) -> List[str]:
+    # Nomes podem ter vírgula: junta pedaços vizinhos quando formam um produto conhecido
+    pedacos = [p.strip() for p in texto.split(",")]
+    nomes, i = [], 0
+    while i < len(pedacos):
+        fim = next((j for j in range(len(pedacos), i + 1, -1) if ", ".join(pedacos[i:j]) in conhecidos), i + 1)
+        nomes.append(", ".join(pedacos[i:fim]))
+        i = fim
+    return [n for n in nomes if n]
+
+
+def _v10_itens_do_historico(conn: Connection):
+    # Itens das lavagens concluídas a partir do texto produtos_usados, com o custo da dose do
+    # catálogo (o da época não foi guardado); nomes fora do catálogo entram sem produto e sem custo
+    produtos = {}
+    for produto_id, nome, preco, ml_total, ml_por_uso in conn.exec_driver_sql(
+        "SELECT id, nome, preco_compra, ml_total, ml_por_uso FROM produtos"
+    ):
+        custo = (preco or 0.0) / ml_total * (ml_por_uso or 0) if ml_total and ml_total > 0 else 0.0
+        produtos.setdefault(nome, (produto_id, custo, ml_por_uso or 0))
+    linhas = []
+    for lavagem_id, texto, quando in conn.exec_driver_sql(
+        "SELECT id, produtos_usados, COALESCE(data_fim, data_inicio) FROM lavagens "
+        "WHERE status = 'concluida' AND produtos_usados IS NOT NULL AND produtos_usados != 'Insumos padrão DJ WASH' "
+        "AND id NOT IN (SELECT lavagem_id FROM lavagem_produtos)"
+    ).fetchall():
+        for nome, n in Counter(_v10_separar_nomes(texto, set(produtos))).items():
+            produto_id, custo, ml_por_uso = produtos.get(nome, (None, 0.0, 0))
+            linhas.append((lavagem_id, produto_id, nome, n, ml_por_uso * n, custo, quando))
+    if linhas:
+        conn.exec_driver_sql(
+            "INSERT INTO lavagem_produtos (lavagem_id, produto_id, nome, doses, ml, custo_dose, data) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", linhas
+        )
+
+
+def _v12_remontar_resumo(conn: Connection):
+    # Resumo diário refeito com as colunas da versão 11 (inclui custos_fixos_centavos), com o
+    # mesmo arredondamento por lavagem do app.financeiro. SQL próprio: não muda com o modelo
+    por_dia = {}
+    for dia, *valores in conn.exec_driver_sql(
+        "SELECT date(COALESCE(data_fim, data_inicio)), valor_total, custo_insumos, custo_mao_de_obra, "
+        "lucro_real, custo_fixo_rateado FROM lavagens WHERE status = 'concluida'"
+    ):
+        soma = por_dia.setdefault(dia, [0] * 6)
+        soma[0] += 1
+        for i, valor in enumerate(valores, start=1):
+            soma[i] += int(round((valor or 0.0) * 100))
+    conn.exec_driver_sql("DELETE FROM resumo_financeiro_diario")
+    if por_dia:
+        conn.exec_driver_sql(
+            "INSERT INTO resumo_financeiro_diario (dia, quantidade, faturamento_centavos, insumos_centavos, "
+            "mao_de_obra_centavos, lucro_centavos, custos_fixos_centavos) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(dia, *soma) for dia, soma in por_dia.items()]
+        )
+
+
+MIGRACOES: List[Tuple[int, str, List[Passo]]] = [
+    (1, "Índices das colunas de filtro mais usadas", [
+        "CREATE INDEX IF NOT EXISTS ix_lavagens_status_data_fim ON lavagens (status, data_fim)",
+        "CREATE INDEX IF NOT EXISTS ix_lavagens_veiculo_status_inicio ON lavagens (veiculo_id, status, data_inicio)",
+        "CREATE INDEX IF NOT EXISTS ix_clientes_telefone ON clientes (telefone)",
+        "CREATE INDEX IF NOT EXISTS ix_veiculos_cliente_id ON veiculos (cliente_id)",
+    ]),
+    (2, "Contagem de referências das fotos já existentes", [
+        _v2_contar_referencias,
+    ]),
+    (3, "Caminhos das fotos derivadas (thumb/web/print)", [
+        _adicionar_coluna("fotos_armazenadas", "caminho_thumb", "VARCHAR"),
+        _adicionar_coluna("fotos_armazenadas", "caminho_web", "VARCHAR"),
+        _adicionar_coluna("fotos_armazenadas", "caminho_print", "VARCHAR"),
+    ]),
+    (4, "Saldo inicial do estoque: um frasco (ml_total) de cada produto já cadastrado", [
+        "INSERT INTO movimentos_estoque (produto_id, tipo, quantidade_ml, observacao, criado_em) "
+        "SELECT id, 'ajuste', COALESCE(ml_total, 0), 'Saldo inicial', datetime('now', 'localtime') FROM produtos",
+        "INSERT OR IGNORE INTO estoque_atual (produto_id, saldo_ml, minimo_ml, atualizado_em) "
+        "SELECT produto_id, SUM(quantidade_ml), 0, datetime('now', 'localtime') FROM movimentos_estoque GROUP BY produto_id",
+    ]),
+    (5, "Box das lavagens e estimativas de duração a partir do histórico", [
+        _adicionar_coluna("lavagens", "box", "INTEGER"),
+        _v5_estimar_do_historico,
+    ]),
+    (6, "Carimbo de alteração de lavagens, clientes e veículos (cache de fragmentos)", [
+        _adicionar_coluna("lavagens", "atualizado_em", "DATETIME"),
+        _adicionar_coluna("clientes", "atualizado_em", "DATETIME"),
+        _adicionar_coluna("veiculos", "atualizado_em", "DATETIME"),
+        "UPDATE lavagens SET atualizado_em = datetime('now', 'localtime') WHERE atualizado_em IS NULL",
+        "UPDATE clientes SET atualizado_em = datetime('now', 'localtime') WHERE atualizado_em IS NULL",
+        "UPDATE veiculos SET atualizado_em = datetime('now', 'localtime') WHERE atualizado_em IS NULL",
+    ]),
+    (7, "Índice de busca do check-in (placa, telefone e nome normalizados, FTS5)", [
+        _v7_indexar_busca,
+    ]),
+    (8, "Chaves estrangeiras com ON DELETE (exclusão em cascata) e limpeza dos órfãos", [
+        _v8_remover_orfaos,
+        "UPDATE lavagens SET servico_id = NULL WHERE servico_id NOT IN (SELECT id FROM servicos_catalogo)",
+        "DELETE FROM servico_produtos WHERE servico_id NOT IN (SELECT id FROM servicos_catalogo) "
+        "OR produto_id NOT IN (SELECT id FROM produtos)",
+        "DELETE FROM estimativas_duracao WHERE servico_id NOT IN (SELECT id FROM servicos_catalogo)",
+        "DELETE FROM movimentos_estoque WHERE produto_id NOT IN (SELECT id FROM produtos)",
+        "DELETE FROM estoque_atual WHERE produto_id NOT IN (SELECT id FROM produtos)",
+        _reconstruir_tabela("servico_produtos", (
+            "CREATE TABLE servico_produtos (servico_id INTEGER NOT NULL, produto_id INTEGER NOT NULL, "
+            "PRIMARY KEY (servico_id, produto_id), "
+            "FOREIGN KEY(servico_id) REFERENCES servicos_catalogo (id) ON DELETE CASCADE, "
+            "FOREIGN KEY(produto_id) REFERENCES produtos (id) ON DELETE CASCADE)"
+        )),
+        _reconstruir_tabela("veiculos", _V8_VEICULOS, (
+            "CREATE INDEX IF NOT EXISTS ix_veiculos_cliente_id ON veiculos (cliente_id)",
+            "CREATE INDEX IF NOT EXISTS ix_veiculos_id ON veiculos (id)",
+        )),
+        _reconstruir_tabela("lavagens", _V8_LAVAGENS, (
+            "CREATE INDEX IF NOT EXISTS ix_lavagens_status_data_fim ON lavagens (status, data_fim)",
+            "CREATE INDEX IF NOT EXISTS ix_lavagens_id ON lavagens (id)",
+            "CREATE INDEX IF NOT EXISTS ix_lavagens_veiculo_status_inicio ON lavagens (veiculo_id, status, data_inicio)",
+        )),
+        _reconstruir_tabela("movimentos_estoque", (
+            "CREATE TABLE movimentos_estoque (id INTEGER NOT NULL, produto_id INTEGER NOT NULL, tipo VARCHAR NOT NULL, "
+            "quantidade_ml INTEGER NOT NULL, lavagem_id INTEGER, observacao VARCHAR, criado_em DATETIME NOT NULL, "
+            "PRIMARY KEY (id), FOREIGN KEY(produto_id) REFERENCES produtos (id) ON DELETE CASCADE)"
+        ), (
+            "CREATE INDEX IF NOT EXISTS ix_movimentos_estoque_lavagem_id ON movimentos_estoque (lavagem_id)",
+            "CREATE INDEX IF NOT EXISTS ix_movimentos_estoque_tipo_criado ON movimentos_estoque (tipo, criado_em)",
+            "CREATE INDEX IF NOT EXISTS ix_movimentos_estoque_id ON movimentos_estoque (id)",
+        )),
+        _reconstruir_tabela("estoque_atual", (
+            "CREATE TABLE estoque_atual (produto_id INTEGER NOT NULL, saldo_ml INTEGER NOT NULL, "
+            "minimo_ml INTEGER NOT NULL, atualizado_em DATETIME, PRIMARY KEY (produto_id), "
+            "FOREIGN KEY(produto_id) REFERENCES produtos (id) ON DELETE CASCADE)"
+        )),
+        _reconstruir_tabela("estimativas_duracao", (
+            "CREATE TABLE estimativas_duracao (servico_id INTEGER NOT NULL, categoria VARCHAR NOT NULL, "
+            "amostras INTEGER NOT NULL, media_segundos FLOAT NOT NULL, PRIMARY KEY (servico_id, categoria), "
+            "FOREIGN KEY(servico_id) REFERENCES servicos_catalogo (id) ON DELETE CASCADE)"
+        )),
+    ]),
+    (9, "Fotos das lavagens em anexos_lavagem (fim das colunas foto_* separadas por vírgula)", [
+        _v9_migrar_colunas_de_foto,
+        _v9_converter_arquivos,
+        _v9_contar_referencias,
+    ]),
+    (10, "Produtos usados por lavagem em lavagem_produtos (a partir do texto produtos_usados)", [
+        _v10_itens_do_historico,
+    ]),
+    (11, "Rateio dos custos fixos: critério, parte de cada lavagem e total no resumo diário", [
+        _adicionar_coluna("configuracoes", "criterio_rateio", "VARCHAR DEFAULT 'minutos'"),
+        _adicionar_coluna("lavagens", "custo_fixo_rateado", "FLOAT DEFAULT 0"),
+        _adicionar_coluna("resumo_financeiro_diario", "custos_fixos_centavos", "INTEGER NOT NULL DEFAULT 0"),
+        "UPDATE lavagens SET custo_fixo_rateado = 0 WHERE custo_fixo_rateado IS NULL",
+    ]),
+    (12, "Resumo financeiro diário remontado a partir das lavagens (com os custos fixos rateados)", [
+        _v12_remontar_resumo,
+    ]),
+]
+
+
+def _criar_tabela_versoes(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_migracoes ("
+        "versao INTEGER PRIMARY KEY, descricao VARCHAR, aplicada_em DATETIME)"
+    ))
+
+
+def versao_atual(conn: Connection) -> int:
+    _criar_tabela_versoes(conn)
+    return conn.execute(text("SELECT COALESCE(MAX(versao), 0) FROM schema_migracoes")).scalar()
+
+
+# A partir desta versão o banco não tem mais órfãos: cada migração é conferida antes do commit
+VERSAO_CHAVES = 8
+
+
+def _conferir_chaves(conn: Connection):
+    violacoes = conn.exec_driver_sql("PRAGMA foreign_key_check").fetchall()
+    if violacoes:
+        tabelas = sorted({linha[0] for linha in violacoes})
+        raise RuntimeError(f"{len(violacoes)} linha(s) apontando para registros inexistentes em: {', '.join(tabelas)}")
+
+
+def aplicar(engine: Engine) -> List[int]:
+    """Cria tabelas novas e aplica as migrações pendentes, cada uma na sua transação.
+
+    As migrações rodam com as chaves estrangeiras desligadas (reconstruir uma tabela pai
+    não pode disparar a cascata nas filhas); a integridade é conferida antes do commit.
+    """
+    models.Base.metadata.create_all(bind=engine)
+
+    aplicadas = []
+    with engine.connect() as conn:
+        # Fora de transação: dentro de uma o SQLite ignora o PRAGMA
+        conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+        conn.commit()
+        try:
+            for versao, descricao, passos in MIGRACOES:
+                with conn.begin():
+                    if versao <= versao_atual(conn):
+                        continue
+                    for passo in passos:
+                        if callable(passo):
+                            passo(conn)
+                        else:
+                            conn.execute(text(passo))
+                    if versao >= VERSAO_CHAVES:
+                        _conferir_chaves(conn)
+                    conn.execute(
+                        text("INSERT INTO schema_migracoes (versao, descricao, aplicada_em) VALUES (:v, :d, :a)"),
+                        {"v": versao, "d": descricao, "a": datetime.now()}
+                    )
+                aplicadas.append(versao)
+        finally:
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+            conn.commit()
+    return aplicadas
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.migracoes [aplicar|status|planos]
+    from app.database import engine
+
+    comando = sys.argv[1] if len(sys.argv) > 1 else "aplicar"
+    if comando == "status":
+        with engine.connect() as conn:
+            atual = versao_atual(conn)
+        pendentes = [v for v, _, _ in MIGRACOES if v > atual]
+        print(f"Versão do banco: {atual} | Pendentes: {pendentes or 'nenhuma'}")
+    elif comando == "planos":
+        from app.planos import verificar_planos
+
+        falhas = verificar_planos(engine)
+        sys.exit(1 if falhas else 0)
+    else:
+        aplicadas = aplicar(engine)
+        print(f"Migrações aplicadas: {aplicadas or 'nenhuma (banco atualizado)'}")
@@ -0,0 +1,137 @@
+import logging
+import os
+import uuid
+from typing import Dict, Iterable, Optional
+
+from PIL import Image, ImageOps
+from sqlalchemy.orm import Session
+
+from app import models
+from app.executores import executor_imagens
+
+logger = logging.getLogger(__name__)
+
+# Variante: (maior lado em px, qualidade JPEG)
+VARIANTES = {
+    "thumb": (320, 75),   # Galerias e cards
+    "web": (1280, 82),    # Relatório de entrega no celular
+    "print": (2000, 88),  # PDFs
+}
+PASTA_DERIVADAS = "static/uploads/derivadas"
+
+
+def _arquivo(caminho: str) -> str:
+    return os.path.join("app", caminho.lstrip("/"))
+
+
+def caminho_variante(caminho: str, variante: str) -> str:
+    # static/uploads/entregas/<nome>.jpg -> static/uploads/derivadas/entregas/<nome>_web.jpg
+    caminho = caminho.strip().lstrip("/")
+    subpasta = os.path.basename(os.path.dirname(caminho))
+    nome = os.path.splitext(os.path.basename(caminho))[0]
+    return f"{PASTA_DERIVADAS}/{subpasta}/{nome}_{variante}.jpg"
+
+
+def registradas(db: Session, caminhos: Iterable[Optional[str]]) -> Dict[str, Dict[str, Optional[str]]]:
+    """Derivadas gravadas em fotos_armazenadas, {caminho: {variante: caminho ou None}}, numa consulta."""
+    caminhos = {c.lstrip("/") for c in caminhos if c}
+    if not caminhos:
+        return {}
+    Foto = models.FotoArmazenada
+    return {
+        caminho: {"thumb": thumb, "web": web, "print": impressao}
+        for caminho, thumb, web, impressao in db.query(
+            Foto.caminho, Foto.caminho_thumb, Foto.caminho_web, Foto.caminho_print
+        ).filter(Foto.caminho.in_(caminhos))
+    }
+
+
+def melhor_variante(caminho: Optional[str], variante: str = "web",
+                    derivadas: Optional[Dict[str, Dict[str, Optional[str]]]] = None) -> Optional[str]:
+    """Caminho da derivada pedida se ela já existe; senão, o original (filtro `variante` do Jinja).
+
+    Com `derivadas` (de registradas()) vale o que está gravado no banco; o disco só é
+    consultado quando a coluna da variante ainda está vazia.
+    """
+    if not caminho:
+        return caminho
+    derivada = ((derivadas or {}).get(caminho.lstrip("/")) or {}).get(variante)
+    if derivada is None:
+        derivada = caminho_variante(caminho, variante)
+        if not os.path.exists(_arquivo(derivada)):
+            return caminho
+    return "/" + derivada if caminho.startswith("/") else derivada
+
+
+def gerar_variantes(caminho: str) -> Dict[str, str]:
+    """Gera (ou reaproveita) thumb/web/print de uma foto. Retorna {variante: caminho}."""
+    pendentes = {v: caminho_variante(caminho, v) for v in VARIANTES}
+    faltando = {v: c for v, c in pendentes.items() if not os.path.exists(_arquivo(c))}
+    if faltando:
+        with Image.open(_arquivo(caminho)) as original:
+            imagem = ImageOps.exif_transpose(original).convert("RGB")
+        for variante, destino in faltando.items():
+            lado, qualidade = VARIANTES[variante]
+            copia = imagem.copy()
+            copia.thumbnail((lado, lado), Image.LANCZOS)
+            arquivo = _arquivo(destino)
+            os.makedirs(os.path.dirname(arquivo), exist_ok=True)
+            temporario = f"{arquivo}.{uuid.uuid4().hex}.tmp"
+            copia.save(temporario, "JPEG", quality=qualidade, optimize=True, progressive=True)
+            os.replace(temporario, arquivo)
+    return pendentes
+
+
+def remover_variantes(caminho: str):
+    for variante in VARIANTES:
+        arquivo = _arquivo(caminho_variante(caminho, variante))
+        if os.path.exists(arquivo):
+            os.remove(arquivo)
+
+
+def _gerar_e_registrar(caminho: str):
+    from app.database import SessionLocal
+
+    try:
+        geradas = gerar_variantes(caminho)
+    except Exception:
+        logger.exception("Falha ao gerar derivadas de %s", caminho)
+        return
+
+    db = SessionLocal()
+    try:
+        db.query(models.FotoArmazenada).filter(models.FotoArmazenada.caminho == caminho).update({
+            "caminho_thumb": geradas["thumb"],
+            "caminho_web": geradas["web"],
+            "caminho_print": geradas["print"],
+        })
+        db.commit()
+    finally:
+        db.close()
+
+
+def agendar(caminhos: Iterable[Optional[str]]):
+    # Dispara a geração no pool de imagens e volta na hora (fora do caminho da requisição)
+    for caminho in set(c for c in caminhos if c):
+        executor_imagens.submit(_gerar_e_registrar, caminho)
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.miniaturas  -> gera derivadas das fotos que ainda não têm
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    db = SessionLocal()
+    try:
+        pendentes = [
+            f.caminho for f in db.query(models.FotoArmazenada).filter(
+                models.FotoArmazenada.caminho_thumb.is_(None), models.FotoArmazenada.referencias > 0
+            )
+            if os.path.exists(_arquivo(f.caminho))
+        ]
+    finally:
+        db.close()
+    for caminho in pendentes:
+        _gerar_e_registrar(caminho)
+    print(f"Derivadas geradas para {len(pendentes)} foto(s).")
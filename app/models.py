@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Text
+from sqlalchemy import Column, Integer, String, DateTime, Date, ForeignKey, Float, Text, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.database import Base
@@ -9,6 +9,7 @@ class Configuracao(Base):
     __tablename__ = "configuracoes"
     id = Column(Integer, primary_key=True, index=True)
     valor_hora = Column(Float, default=0.0)  # Variável do preço da hora
+    criterio_rateio = Column(String, default="minutos")  # Rateio dos custos fixos: "minutos" ou "quantidade"
 
 
 # 2. Cadastro de Insumos (Shampoos, Ceras, etc)
@@ -34,8 +35,8 @@ class ServicoCatalogo(Base):
 
 class ServicoProduto(Base):
     __tablename__ = "servico_produtos"
-    servico_id = Column(Integer, ForeignKey("servicos_catalogo.id"), primary_key=True)
-    produto_id = Column(Integer, ForeignKey("produtos.id"), primary_key=True)
+    servico_id = Column(Integer, ForeignKey("servicos_catalogo.id", ondelete="CASCADE"), primary_key=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id", ondelete="CASCADE"), primary_key=True)
 
 
 # 4. Custos Fixos (Aluguel, Água, etc)
@@ -51,8 +52,11 @@ class Cliente(Base):
     __tablename__ = "clientes"
     id = Column(Integer, primary_key=True, index=True)
     nome = Column(String, nullable=False)
-    telefone = Column(String, nullable=False)
-    veiculos = relationship("Veiculo", back_populates="cliente")
+    telefone = Column(String, nullable=False, index=True)
+    # Carimbo de alteração: entra na chave do cache de fragmentos dos templates (app.fragmentos)
+    atualizado_em = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+    # Exclusão em cascata feita pelo banco (ON DELETE CASCADE, app.exclusao): o ORM não carrega os filhos
+    veiculos = relationship("Veiculo", back_populates="cliente", passive_deletes=True)
 
 
 # 6. Veículos
@@ -63,45 +67,199 @@ class Veiculo(Base):
     modelo = Column(String)
     placa = Column(String, unique=True)
     categoria = Column(String)
-    cliente_id = Column(Integer, ForeignKey("clientes.id"))
+    cliente_id = Column(Integer, ForeignKey("clientes.id", ondelete="CASCADE"), index=True)
+    atualizado_em = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     cliente = relationship("Cliente", back_populates="veiculos")
-    lavagens = relationship("Lavagem", back_populates="veiculo")
+    lavagens = relationship("Lavagem", back_populates="veiculo", passive_deletes=True)
 
 
 # 7. Lavagens (Atualizada com campos de custo real)
 class Lavagem(Base):
     __tablename__ = "lavagens"
     id = Column(Integer, primary_key=True, index=True)
-    veiculo_id = Column(Integer, ForeignKey("veiculos.id"))
+    veiculo_id = Column(Integer, ForeignKey("veiculos.id", ondelete="CASCADE"))
 
-    servico_id = Column(Integer, ForeignKey("servicos_catalogo.id"), nullable=True)
+    servico_id = Column(Integer, ForeignKey("servicos_catalogo.id", ondelete="SET NULL"), nullable=True)
 
     data_inicio = Column(DateTime, default=datetime.utcnow)
     data_fim = Column(DateTime, nullable=True)
     tempo_total = Column(String, nullable=True)  # Ex: "01:30"
     minutos_totais = Column(Integer, default=0)  # Para cálculos matemáticos precisos
-    foto_saida_url = Column(String, nullable=True)
-    foto_antes = Column(String, nullable=True)
-    foto_depois = Column(String, nullable=True)
+    # Fotos (checklist, antes e depois): tabela anexos_lavagem, ver app.fotos
 
     # Financeiro Detalhado
     valor_total = Column(Float)  # Quanto o cliente pagou
     custo_insumos = Column(Float, default=0.0)  # Gasto com produtos
     custo_mao_de_obra = Column(Float, default=0.0)  # (Tempo x Valor da Hora)
-    lucro_real = Column(Float, default=0.0)  # Valor Total - (Insumos + Mão de Obra)
+    custo_fixo_rateado = Column(Float, default=0.0)  # Parte dos custos fixos do mês (app.rateio)
+    lucro_real = Column(Float, default=0.0)  # Valor Total - (Insumos + Mão de Obra + Custos Fixos)
     checklist_avarias = Column(String, nullable=True)  # Texto descrevendo riscos/mossas
     checklist_combustivel = Column(String, nullable=True)  # Ex: "1/4", "Reserva", "Cheio"
     checklist_objetos = Column(String, nullable=True)  # Itens de valor deixados
     checklist_pneus = Column(String, nullable=True)  # Estado dos pneus
-    foto_entrada_url = Column(String, nullable=True)  # Caminho da foto principal
 
 
     status = Column(String, default="em_andamento")
+    box = Column(Integer, nullable=True)  # Box de lavagem atribuído na entrada (app.agenda)
     tipo_sujeira = Column(String)
     checklist = Column(Text)
     produtos_usados = Column(Text)  # Alterado para Text para suportar listas longas
+    atualizado_em = Column(DateTime, default=datetime.now, onupdate=datetime.now)
 
     servico = relationship("ServicoCatalogo")
 
-    veiculo = relationship("Veiculo", back_populates="lavagens")
\ No newline at end of file
+    veiculo = relationship("Veiculo", back_populates="lavagens")
+
+    # Índices compostos (criados também pela migração 1 em bancos existentes)
+    __table_args__ = (
+        Index("ix_lavagens_status_data_fim", "status", "data_fim"),
+        Index("ix_lavagens_veiculo_status_inicio", "veiculo_id", "status", "data_inicio"),
+    )
+
+
+# 8. Resumo Financeiro Diário (mantido incrementalmente na finalização/exclusão)
+# Valores em centavos (inteiros) para os totais baterem exatamente com as lavagens
+class ResumoFinanceiroDiario(Base):
+    __tablename__ = "resumo_financeiro_diario"
+    dia = Column(Date, primary_key=True)
+    quantidade = Column(Integer, default=0, nullable=False)
+    faturamento_centavos = Column(Integer, default=0, nullable=False)
+    insumos_centavos = Column(Integer, default=0, nullable=False)
+    mao_de_obra_centavos = Column(Integer, default=0, nullable=False)
+    lucro_centavos = Column(Integer, default=0, nullable=False)
+    custos_fixos_centavos = Column(Integer, default=0, nullable=False)
+
+
+# 9. Fotos armazenadas por conteúdo (sha256), com contagem de referências das lavagens
+class FotoArmazenada(Base):
+    __tablename__ = "fotos_armazenadas"
+    caminho = Column(String, primary_key=True)  # Ex: static/uploads/entregas/<sha256>.jpg
+    sha256 = Column(String, index=True)
+    tamanho = Column(Integer, default=0)
+    referencias = Column(Integer, default=0, nullable=False, index=True)
+    # Derivadas geradas em segundo plano (app.miniaturas); None = ainda não gerada
+    caminho_thumb = Column(String, nullable=True)
+    caminho_web = Column(String, nullable=True)
+    caminho_print = Column(String, nullable=True)
+
+
+# 10. Versão do catálogo de preços/custos (configuração, serviços e produtos)
+# Incrementada a cada alteração; cada worker compara com a sua cópia em memória (app.catalogo)
+class VersaoCatalogo(Base):
+    __tablename__ = "catalogo_versao"
+    id = Column(Integer, primary_key=True)
+    versao = Column(Integer, default=0, nullable=False)
+
+
+# 11. Movimentos de estoque (livro só de inclusão: compra, consumo por lavagem, ajuste, estorno)
+# Quantidade em ml com sinal: entradas positivas, saídas negativas.
+# lavagem_id sem FK: o histórico do estoque continua válido depois que a lavagem é apagada
+class MovimentoEstoque(Base):
+    __tablename__ = "movimentos_estoque"
+    id = Column(Integer, primary_key=True, index=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String, nullable=False)
+    quantidade_ml = Column(Integer, nullable=False)
+    lavagem_id = Column(Integer, nullable=True, index=True)
+    observacao = Column(String, nullable=True)
+    criado_em = Column(DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        # Consumo recente (projeção de dias restantes): filtra por tipo e janela de datas
+        Index("ix_movimentos_estoque_tipo_criado", "tipo", "criado_em"),
+    )
+
+
+# 12. Estoque atual por produto (saldo materializado, atualizado junto com cada movimento)
+class EstoqueAtual(Base):
+    __tablename__ = "estoque_atual"
+    produto_id = Column(Integer, ForeignKey("produtos.id", ondelete="CASCADE"), primary_key=True)
+    saldo_ml = Column(Integer, default=0, nullable=False)
+    minimo_ml = Column(Integer, default=0, nullable=False)  # Alerta de estoque baixo
+    atualizado_em = Column(DateTime, default=datetime.now)
+
+
+# 13. Duração estimada por serviço x categoria do veículo (média móvel, atualizada na finalização)
+class EstimativaDuracao(Base):
+    __tablename__ = "estimativas_duracao"
+    servico_id = Column(Integer, ForeignKey("servicos_catalogo.id", ondelete="CASCADE"), primary_key=True)
+    categoria = Column(String, primary_key=True)
+    amostras = Column(Integer, default=0, nullable=False)
+    media_segundos = Column(Float, default=0.0, nullable=False)
+
+
+# 14. Exclusões arquivadas: cliente/veículo apagado com arquivar=True, guardado com veículos
+# e lavagens (JSON) para poder ser restaurado (app.exclusao)
+class ExclusaoArquivada(Base):
+    __tablename__ = "exclusoes_arquivadas"
+    id = Column(Integer, primary_key=True, index=True)
+    tipo = Column(String, nullable=False)  # "cliente" ou "veiculo"
+    descricao = Column(String)  # Nome do cliente ou placa, para a listagem
+    lavagens = Column(Integer, default=0, nullable=False)
+    dados = Column(Text, nullable=False)
+    excluido_em = Column(DateTime, default=datetime.now, nullable=False)
+
+
+# 15. Fotos das lavagens: uma linha por foto (substitui as colunas foto_* separadas por vírgula)
+class AnexoLavagem(Base):
+    __tablename__ = "anexos_lavagem"
+    id = Column(Integer, primary_key=True, index=True)
+    lavagem_id = Column(Integer, ForeignKey("lavagens.id", ondelete="CASCADE"), nullable=False)
+    tipo = Column(String, nullable=False)  # "avaria" (checklist), "antes" e "depois" (entrega)
+    caminho = Column(String, nullable=False)  # Ex: static/uploads/checklists/<sha256>.jpg
+    tamanho = Column(Integer, default=0)
+    largura = Column(Integer, nullable=True)
+    altura = Column(Integer, nullable=True)
+    criado_em = Column(DateTime, default=datetime.now, nullable=False)
+
+    __table_args__ = (
+        # Galeria, recibo e comprovante pedem as fotos de um tipo de uma lavagem
+        Index("ix_anexos_lavagem_lavagem_tipo", "lavagem_id", "tipo"),
+    )
+
+
+# 16. Produtos usados em cada lavagem (uma linha por produto, gravadas em lote na finalização)
+# Nome, ml e custo da dose são copiados do catálogo na hora: o histórico não muda com o preço
+class LavagemProduto(Base):
+    __tablename__ = "lavagem_produtos"
+    id = Column(Integer, primary_key=True, index=True)
+    lavagem_id = Column(Integer, ForeignKey("lavagens.id", ondelete="CASCADE"), nullable=False, index=True)
+    produto_id = Column(Integer, ForeignKey("produtos.id", ondelete="SET NULL"), nullable=True)
+    nome = Column(String)
+    doses = Column(Integer, default=1, nullable=False)
+    ml = Column(Integer, default=0, nullable=False)  # ml_por_uso x doses
+    custo_dose = Column(Float, default=0.0, nullable=False)
+    data = Column(DateTime, nullable=False)  # Finalização da lavagem (cópia de lavagens.data_fim)
+
+    __table_args__ = (
+        # Consumo por produto por mês: filtra um produto num período, ou todos num período
+        Index("ix_lavagem_produtos_produto_data", "produto_id", "data"),
+        Index("ix_lavagem_produtos_data_produto", "data", "produto_id"),
+    )
+
+
+# 17. Rateio dos custos fixos por mês (totais corridos, atualizados a cada finalização)
+# Valores em centavos; fechado_em preenchido quando o mês é fechado (rateio recalculado em lote)
+class RateioMensal(Base):
+    __tablename__ = "rateio_custos_fixos"
+    mes = Column(String, primary_key=True)  # "AAAA-MM"
+    criterio = Column(String, default="minutos", nullable=False)
+    custos_fixos_centavos = Column(Integer, default=0, nullable=False)  # Total do mês a ratear
+    quantidade = Column(Integer, default=0, nullable=False)
+    minutos = Column(Integer, default=0, nullable=False)
+    rateado_centavos = Column(Integer, default=0, nullable=False)  # Já lançado nas lavagens
+    fechado_em = Column(DateTime, nullable=True)
+
+
+# 18. Eventos ao vivo (SSE), compartilhados entre os workers do uvicorn
+# Cada worker acompanha a tabela e repassa os novos para os tablets conectados nele; o id é o
+# Last-Event-ID (AUTOINCREMENT: nunca reaproveitado, nem depois que os antigos são apagados)
+class EventoAoVivo(Base):
+    __tablename__ = "eventos_ao_vivo"
+    id = Column(Integer, primary_key=True)
+    tipo = Column(String, nullable=False)
+    dados = Column(Text, nullable=False)
+    criado_em = Column(DateTime, default=datetime.now)
+
+    __table_args__ = {"sqlite_autoincrement": True}
@@ -0,0 +1,73 @@
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from app import analise, busca, dashboard, estoque, exclusao, exportacao, listagem, retencao
+
+
+def consultas_quentes(db: Session) -> Dict[str, object]:
+    # Montadas pelas mesmas funções que as rotas chamam (só com valores de exemplo): mudou a
+    # consulta de uma tela, muda o plano conferido aqui
+    agora = datetime(2000, 1, 1)
+    hoje = agora.date()
+    telefones = busca.variantes_telefone("(11) 99999-9999")
+    return {
+        "dashboard: em andamento": dashboard.query_ativas(db),
+        "dashboard: concluídas (cursor)": dashboard.query_concluidas(db, 1000, dashboard.LIMITE_CONCLUIDAS),
+        "historico: concluídas recentes": dashboard.query_historico(db, 100),
+        "perfil do cliente": dashboard.query_lavagens_do_cliente(db, 1),
+        "historico do cliente": dashboard.query_historico_do_cliente(db, 1),
+        "api: lavagens do cliente": listagem.consulta("lavagens", listagem.RECURSOS["lavagens"]["padrao"],
+                                                       None, None, None, "concluida", 1),
+        "api: lavagens (cursor)": listagem.consulta("lavagens", listagem.RECURSOS["lavagens"]["padrao"],
+                                                    1000, None, None, None, None),
+        "retenção: última visita": retencao.query_retencao(db, agora, dias_min=30)[0],
+        "busca: type-ahead": busca.consulta_buscar(["abc"]),
+        "busca: cliente por telefone": busca.consulta_primeira_linha("telefone", telefones),
+        "busca: telefone sem índice de busca": busca.query_telefone_exato(db, "11999999999"),
+        "busca: veículo por placa": busca.consulta_primeira_linha("placa", ["abc1d23"]),
+        "busca: placa sem índice de busca": busca.query_placa_exata(db, "ABC1D23"),
+        "exclusão: veículos do cliente": exclusao.consulta_veiculos_dos_clientes([1]),
+        "exclusão: lavagens do veículo": exclusao.query_lavagens_dos_veiculos(db, [1]),
+        "exportação: período": exportacao.query_periodo(db, hoje, hoje),
+        "análise: período": analise.consulta_agrupada(hoje, hoje),
+        "estoque: consumo recente": estoque.query_consumo_recente(db, agora),
+        "estoque: movimentos da lavagem": estoque.query_consumo_da_lavagem(db, 1),
+    }
+
+
+def plano(db: Session, consulta) -> List[str]:
+    # Query do ORM, select() ou text() com os parâmetros já ligados
+    stmt = getattr(consulta, "statement", consulta)
+    sql = str(stmt.compile(db.get_bind(), compile_kwargs={"literal_binds": True}))
+    return [linha[-1] for linha in db.execute(text("EXPLAIN QUERY PLAN " + sql)).fetchall()]
+
+
+def _usa_indice(linhas: List[str]) -> bool:
+    # Toda leitura de tabela precisa ser SEARCH ou SCAN guiado por índice; a varredura de uma
+    # subquery já materializada (agregação feita antes, pelo índice) não conta
+    materializadas = {linha.split()[1] for linha in linhas if linha.startswith("MATERIALIZE")}
+    for linha in linhas:
+        if not linha.startswith(("SCAN", "SEARCH")) or linha.split()[1] in materializadas:
+            continue
+        if "INDEX" not in linha and "PRIMARY KEY" not in linha:
+            return False
+    return True
+
+
+def verificar_planos(engine: Engine) -> List[str]:
+    """Roda EXPLAIN QUERY PLAN nas consultas quentes; retorna os nomes que não usam índice."""
+    falhas = []
+    with Session(bind=engine) as db:
+        for nome, query in consultas_quentes(db).items():
+            linhas = plano(db, query)
+            ok = _usa_indice(linhas)
+            print(f"[{'OK' if ok else 'SEM ÍNDICE'}] {nome}")
+            for linha in linhas:
+                print(f"      {linha}")
+            if not ok:
+                falhas.append(nome)
+    return falhas
@@ -0,0 +1,248 @@
+import os
+import sys
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.orm import Query, Session
+
+from app import agenda, catalogo, financeiro, models
+
+L = models.Lavagem
+Rateio = models.RateioMensal
+CRITERIOS = ("minutos", "quantidade")
+
+# Rateio dos custos fixos do mês (aluguel, água, luz: o total de custos_fixos) entre as lavagens
+# concluídas no mês, pelo tempo de cada uma ("minutos") ou em partes iguais ("quantidade").
+# A parte de cada lavagem fica em lavagens.custo_fixo_rateado e sai do lucro_real.
+#
+# Na finalização (incremental): um upsert soma a lavagem nos totais corridos do mês
+# (rateio_custos_fixos) e a parte dela sai desses totais, sem reler as lavagens do mês. Como o
+# mês não acabou, a parte usa uma taxa estável: o total do mês dividido pela base (minutos ou
+# quantidade) do último mês fechado, ou pela capacidade mensal configurada enquanto não há mês
+# fechado; se o mês corrente já passou dessa base, vale a dele. Assim a primeira lavagem do mês
+# paga o mesmo que as outras. A parte nunca passa do valor cobrado nem do que resta do total.
+# No fechamento (em lote): a parte de cada lavagem é recalculada com a base real do mês num único
+# UPDATE e o resumo diário é corrigido. Os meses anteriores ainda abertos são fechados na primeira
+# finalização de um mês novo; fechar de novo um mês fechado serve de conciliação (lavagens
+# importadas, restauradas ou apagadas depois).
+
+
+# Base prevista de um mês sem mês fechado antes dele: boxes x 8 h x 26 dias (e 1 lavagem por hora)
+CAPACIDADE_MINUTOS = int(os.getenv("DJWASH_CAPACIDADE_MINUTOS_MES", str(agenda.BOXES * 8 * 60 * 26)))
+CAPACIDADE_LAVAGENS = int(os.getenv("DJWASH_CAPACIDADE_LAVAGENS_MES", str(agenda.BOXES * 8 * 26)))
+
+
+def _centavos(valor) -> int:
+    return int(round((valor or 0.0) * 100))
+
+
+def _mes(quando: datetime) -> str:
+    return quando.strftime("%Y-%m")
+
+
+def _limites(mes: str):
+    ano, numero = int(mes[:4]), int(mes[5:])
+    return datetime(ano, numero, 1), datetime(ano + numero // 12, numero % 12 + 1, 1)
+
+
+def _base_prevista(db: Session, mes: str, criterio: str) -> int:
+    """Minutos (ou lavagens) esperados no mês: os do último mês fechado, ou a capacidade."""
+    quantidade, minutos = db.execute(
+        select(Rateio.quantidade, Rateio.minutos).where(Rateio.fechado_em.isnot(None), Rateio.mes < mes)
+        .order_by(Rateio.mes.desc()).limit(1)
+    ).first() or (0, 0)
+    if criterio == "minutos":
+        return minutos or CAPACIDADE_MINUTOS
+    return quantidade or CAPACIDADE_LAVAGENS
+
+
+def _parte(total: int, criterio: str, prevista: int, quantidade: int, minutos_mes: int, rateado: int,
+           minutos: int, valor) -> int:
+    """Parte de uma lavagem em centavos; os totais do mês já incluem a lavagem."""
+    if criterio == "minutos":
+        base, da_lavagem = max(prevista, minutos_mes), minutos or 0
+    else:
+        base, da_lavagem = max(prevista, quantidade), 1
+    parte = round(total * da_lavagem / base) if base else 0
+    return max(min(parte, total - rateado, _centavos(valor)), 0)
+
+
+# --- FINALIZAÇÃO (INCREMENTAL) ---
+def ratear(db: Session, quando: datetime, minutos: int, valor: float) -> float:
+    """Soma a lavagem finalizada em `quando` nos totais do mês e devolve a parte dela nos custos
+    fixos, em reais, limitada ao `valor` cobrado (mesma transação do chamador)."""
+    cat = catalogo.obter(db)
+    mes = _mes(quando)
+    if db.query(Rateio.mes).filter(Rateio.mes == mes).first() is None:
+        fechar_pendentes(db, antes_de=mes)
+
+    total = _centavos(cat["custos_fixos"])
+    stmt = insert(Rateio).values(mes=mes, criterio=cat["criterio_rateio"], custos_fixos_centavos=total,
+                                 quantidade=1, minutos=minutos, rateado_centavos=0)
+    db.execute(stmt.on_conflict_do_update(index_elements=[Rateio.mes], set_={
+        "criterio": stmt.excluded.criterio,
+        "custos_fixos_centavos": stmt.excluded.custos_fixos_centavos,
+        "quantidade": Rateio.quantidade + 1,
+        "minutos": Rateio.minutos + stmt.excluded.minutos,
+    }))
+    # Já com a escrita acima na transação: nenhum outro worker altera a linha até o commit
+    criterio, quantidade, minutos_mes, rateado = db.execute(
+        select(Rateio.criterio, Rateio.quantidade, Rateio.minutos, Rateio.rateado_centavos).where(Rateio.mes == mes)
+    ).one()
+    parte = _parte(total, criterio, _base_prevista(db, mes, criterio), quantidade, minutos_mes, rateado,
+                   minutos, valor)
+    db.execute(update(Rateio).where(Rateio.mes == mes).values(rateado_centavos=Rateio.rateado_centavos + parte))
+    return parte / 100
+
+
+def estimar(db: Session, quando: datetime, minutos: int, valor: float) -> float:
+    """Parte que uma lavagem finalizada agora receberia, sem gravar nada (tela de finalização)."""
+    cat = catalogo.obter(db)
+    mes, criterio = _mes(quando), cat["criterio_rateio"]
+    linha = db.execute(
+        select(Rateio.quantidade, Rateio.minutos, Rateio.rateado_centavos).where(Rateio.mes == mes)
+    ).first()
+    quantidade, minutos_mes, rateado = linha or (0, 0, 0)
+    return _parte(_centavos(cat["custos_fixos"]), criterio, _base_prevista(db, mes, criterio), quantidade + 1,
+                  minutos_mes + minutos, rateado, minutos, valor) / 100
+
+
+def _somar(db: Session, mes: str, quantidade: int, minutos, rateado, sinal: int = 1):
+    db.execute(update(Rateio).where(Rateio.mes == mes).values(
+        quantidade=func.max(Rateio.quantidade + sinal * quantidade, 0),
+        minutos=func.max(Rateio.minutos + sinal * (minutos or 0), 0),
+        rateado_centavos=func.max(Rateio.rateado_centavos + sinal * _centavos(rateado), 0),
+    ))
+
+
+def _somar_por_mes(db: Session, query: Query, sinal: int):
+    mes = func.strftime("%Y-%m", func.coalesce(L.data_fim, L.data_inicio))
+    por_mes = query.filter(L.status == "concluida").with_entities(
+        mes, func.count(), func.sum(L.minutos_totais), func.sum(L.custo_fixo_rateado)
+    ).group_by(mes)
+    for linha in por_mes.all():
+        _somar(db, *linha, sinal=sinal)
+
+
+def descontar(db: Session, lavagem: models.Lavagem):
+    """Retira dos totais do mês uma lavagem concluída (antes de refinalizá-la ou apagá-la)."""
+    if lavagem.status != "concluida":
+        return
+    _somar(db, _mes(lavagem.data_fim or lavagem.data_inicio), 1, lavagem.minutos_totais,
+           lavagem.custo_fixo_rateado, sinal=-1)
+
+
+def descontar_lavagens(db: Session, query: Query):
+    """Retira dos totais as lavagens concluídas de `query` (antes de apagá-las), um UPDATE por mês."""
+    _somar_por_mes(db, query, -1)
+
+
+def registrar_lavagens(db: Session, query: Query):
+    """Devolve aos totais as lavagens concluídas de `query` (restauração de arquivadas)."""
+    _somar_por_mes(db, query, 1)
+
+
+# --- FECHAMENTO (EM LOTE) ---
+def fechar_mes(db: Session, mes: str) -> dict:
+    """Recalcula o rateio do mês com a base real, num único UPDATE, e marca o mês como fechado
+    (mesma transação do chamador). Refechar mantém o total e o critério do primeiro fechamento."""
+    inicio, fim = _limites(mes)
+    if fim > datetime.now():
+        raise ValueError(f"O mês {mes} ainda não terminou")
+
+    linha = db.query(Rateio).filter(Rateio.mes == mes).first()
+    if linha is not None and linha.fechado_em is not None:
+        total, criterio = linha.custos_fixos_centavos, linha.criterio
+    else:
+        cat = catalogo.obter(db)
+        total, criterio = _centavos(cat["custos_fixos"]), cat["criterio_rateio"]
+
+    dia = func.coalesce(L.data_fim, L.data_inicio)
+    query = db.query(L).filter(L.status == "concluida", dia >= inicio, dia < fim)
+    quantidade, minutos = query.with_entities(func.count(), func.coalesce(func.sum(L.minutos_totais), 0)).one()
+    if quantidade:
+        if criterio == "minutos" and minutos > 0:
+            parte = func.round(func.coalesce(L.minutos_totais, 0) * (total / 100 / minutos), 2)
+        else:
+            parte = round(total / 100 / quantidade, 2)
+        # O resumo diário sai com a parte antiga e volta com a nova
+        financeiro.descontar_lavagens(db, query)
+        query.update({
+            L.lucro_real: func.round(func.coalesce(L.lucro_real, 0) + func.coalesce(L.custo_fixo_rateado, 0) - parte, 2),
+            L.custo_fixo_rateado: parte,
+        }, synchronize_session=False)
+        financeiro.registrar_lavagens(db, query)
+    rateado = _centavos(query.with_entities(func.sum(L.custo_fixo_rateado)).scalar())
+
+    valores = dict(criterio=criterio, custos_fixos_centavos=total, quantidade=quantidade, minutos=minutos,
+                   rateado_centavos=rateado, fechado_em=datetime.now())
+    stmt = insert(Rateio).values(mes=mes, **valores)
+    db.execute(stmt.on_conflict_do_update(index_elements=[Rateio.mes], set_=valores))
+    return _para_reais(mes, **valores)
+
+
+def fechar_pendentes(db: Session, antes_de: Optional[str] = None) -> List[str]:
+    """Fecha os meses abertos anteriores a `antes_de` (padrão: o mês atual)."""
+    antes_de = antes_de or _mes(datetime.now())
+    meses = [mes for (mes,) in db.query(Rateio.mes).filter(
+        Rateio.fechado_em.is_(None), Rateio.mes < antes_de
+    ).order_by(Rateio.mes)]
+    for mes in meses:
+        fechar_mes(db, mes)
+    return meses
+
+
+# --- CONSULTA ---
+def _para_reais(mes, criterio, custos_fixos_centavos, quantidade, minutos, rateado_centavos, fechado_em) -> dict:
+    return {
+        "mes": mes,
+        "criterio": criterio,
+        "custos_fixos": custos_fixos_centavos / 100,
+        "rateado": rateado_centavos / 100,
+        "quantidade": quantidade,
+        "minutos": minutos,
+        "fechado_em": fechado_em,
+        "pode_fechar": _limites(mes)[1] <= datetime.now(),
+    }
+
+
+def meses(db: Session, limite: int = 12) -> List[dict]:
+    """Últimos meses com rateio, do mais recente para o mais antigo."""
+    linhas = db.query(Rateio).order_by(Rateio.mes.desc()).limit(limite).all()
+    return [
+        _para_reais(r.mes, r.criterio, r.custos_fixos_centavos, r.quantidade, r.minutos, r.rateado_centavos,
+                    r.fechado_em)
+        for r in linhas
+    ]
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.rateio [meses|fechar AAAA-MM|pendentes]
+    from app import migracoes
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    comando = sys.argv[1] if len(sys.argv) > 1 else "meses"
+    db = SessionLocal()
+    try:
+        if comando == "fechar" and len(sys.argv) > 2:
+            try:
+                r = fechar_mes(db, sys.argv[2])
+            except ValueError as erro:
+                print(erro)
+                sys.exit(1)
+            db.commit()
+            print(f"{r['mes']}: R$ {r['rateado']:.2f} de R$ {r['custos_fixos']:.2f} em {r['quantidade']} lavagem(ns)")
+        elif comando == "pendentes":
+            fechados = fechar_pendentes(db)
+            db.commit()
+            print(f"Meses fechados: {', '.join(fechados)}" if fechados else "Nenhum mês pendente.")
+        else:
+            for r in meses(db, limite=24):
+                situacao = f"fechado em {r['fechado_em']:%d/%m/%Y}" if r["fechado_em"] else "aberto"
+                print(f"{r['mes']}  {r['criterio']:<10} {r['quantidade']:>6} lavagem(ns)  "
+                      f"R$ {r['rateado']:>10.2f} de R$ {r['custos_fixos']:>10.2f}  {situacao}")
+    finally:
+        db.close()
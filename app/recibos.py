@@ -0,0 +1,275 @@
+import glob
+import hashlib
+import io
+import json
+import logging
+import os
+import uuid
+from datetime import datetime
+from typing import Optional, Tuple
+
+from reportlab.pdfgen import canvas
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.colors import HexColor
+
+from app import models
+from app.executores import executor_pdf, renderizar_pdf
+
+logger = logging.getLogger(__name__)
+
+# PDFs prontos ficam fora do static (não são servidos direto pelo StaticFiles)
+PASTA_CACHE = os.getenv("DJWASH_CACHE_RECIBOS", "app/cache/recibos")
+
+
+def dados_recibo(lavagem: models.Lavagem) -> dict:
+    """Extrai do banco só o que o PDF precisa (dict simples, pode ir para outra thread/processo)."""
+    veiculo = lavagem.veiculo
+    return {
+        "id": lavagem.id,
+        "emissao": datetime.now().strftime('%d/%m/%Y %H:%M'),
+        "cliente_nome": veiculo.cliente.nome,
+        "cliente_telefone": veiculo.cliente.telefone,
+        "veiculo_modelo": veiculo.modelo,
+        "veiculo_marca": veiculo.marca,
+        "veiculo_placa": veiculo.placa,
+        "nome_servico": lavagem.servico.nome if lavagem.servico else "Lavagem Geral / Detalhada",
+        "produtos_usados": lavagem.produtos_usados,
+        "valor_total": lavagem.valor_total or 0.0,
+    }
+
+
+# --- RECIBO PREMIUM DJ WASH ---
+def renderizar_recibo(dados: dict) -> bytes:
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    largura, altura = A4
+
+    # Paleta de Cores DJ WASH
+    cor_roxo_dark = HexColor("#1A052D")  # Fundo Profundo
+    cor_roxo_vibrante = HexColor("#6A1B9A")  # Destaques
+    cor_gold = HexColor("#D4AF37")  # Dourado Premium
+    cor_texto = HexColor("#333333")
+
+    # --- 1. DESIGN DO CABEÇALHO (BANNER) ---
+    pdf.setFillColor(cor_roxo_dark)
+    pdf.rect(0, altura - 120, largura, 120, fill=1, stroke=0)
+
+    # Detalhe em dourado no topo
+    pdf.setFillColor(cor_gold)
+    pdf.rect(0, altura - 5, largura, 5, fill=1, stroke=0)
+
+    pdf.setFillColor(colors.white)
+    pdf.setFont("Helvetica-Bold", 28)
+    pdf.drawString(50, altura - 60, "DJ WASH")
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(50, altura - 80, "ESTÉTICA AUTOMOTIVA")
+
+    # ID do Recibo no canto superior
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawRightString(largura - 50, altura - 60, f"RECIBO Nº {dados['id']:04d}")
+    pdf.setFont("Helvetica", 9)
+    pdf.drawRightString(largura - 50, altura - 80, f"Emissão: {dados['emissao']}")
+
+    # --- 2. INFORMAÇÕES DO CLIENTE E VEÍCULO ---
+    y = altura - 160
+    pdf.setFillColor(cor_roxo_vibrante)
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(50, y, "INFORMAÇÕES DO CLIENTE")
+
+    pdf.setStrokeColor(cor_roxo_vibrante)
+    pdf.setLineWidth(1)
+    pdf.line(50, y - 5, largura - 50, y - 5)
+
+    pdf.setFillColor(cor_texto)
+    pdf.setFont("Helvetica-Bold", 10)
+    y -= 25
+    pdf.drawString(50, y, "CLIENTE:")
+    pdf.drawString(300, y, "VEÍCULO:")
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(105, y, f"{dados['cliente_nome']}")
+    pdf.drawString(355, y, f"{dados['veiculo_modelo']} ({dados['veiculo_marca']})")
+
+    y -= 15
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(50, y, "TELEFONE:")
+    pdf.drawString(300, y, "PLACA:")
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(115, y, f"{dados['cliente_telefone']}")
+    pdf.drawString(350, y, f"{dados['veiculo_placa']}")
+
+    # --- 3. DETALHAMENTO DO SERVIÇO E PRODUTOS ---
+    y -= 40
+    pdf.setFillColor(cor_roxo_vibrante)
+    pdf.setFont("Helvetica-Bold", 12)
+    pdf.drawString(50, y, "DETALHES DO SERVIÇO REALIZADO")
+    pdf.line(50, y - 5, largura - 50, y - 5)
+
+    y -= 25
+    pdf.setFillColor(cor_texto)
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(50, y, "SERVIÇO:")
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(105, y, f"{dados['nome_servico']}")
+
+    y -= 20
+    pdf.setFont("Helvetica-Bold", 10)
+    pdf.drawString(50, y, "PRODUTOS UTILIZADOS:")
+
+    y -= 15
+    pdf.setFont("Helvetica-Oblique", 9)
+    # Quebra de texto automática para produtos longos
+    produtos_texto = dados['produtos_usados'] or "Insumos profissionais biodegradáveis (Padrão DJ WASH)"
+    pdf.drawString(60, y, f"- {produtos_texto}")
+
+    # --- 4. QUADRO FINANCEIRO (TAXAS E TOTAL) ---
+    y -= 50
+    # Caixa de fundo para o total
+    pdf.setFillColor(HexColor("#F9F9F9"))
+    pdf.roundRect(50, y - 80, largura - 100, 90, 5, fill=1, stroke=1)
+
+    pdf.setFillColor(cor_texto)
+    pdf.setFont("Helvetica-Bold", 11)
+    pdf.drawString(70, y - 15, "RESUMO FINANCEIRO")
+
+    pdf.setFont("Helvetica", 10)
+    pdf.drawString(70, y - 35, "Valor Base do Serviço:")
+    pdf.drawRightString(largura - 70, y - 35, f"R$ {dados['valor_total']:.2f}")
+
+    # Aqui listamos as taxas (se você tiver campos de taxas extras no futuro, aparecem aqui)
+    pdf.drawString(70, y - 50, "Taxas Adicionais / Descontos:")
+    pdf.drawRightString(largura - 70, y - 50, "R$ 0,00")
+
+    pdf.setStrokeColor(colors.lightgrey)
+    pdf.line(70, y - 58, largura - 70, y - 58)
+
+    # Valor Total Destacado
+    pdf.setFillColor(cor_roxo_dark)
+    pdf.setFont("Helvetica-Bold", 14)
+    pdf.drawString(70, y - 75, "VALOR TOTAL PAGO")
+
+    pdf.setFillColor(cor_gold)
+    pdf.setFont("Helvetica-Bold", 16)
+    pdf.drawRightString(largura - 70, y - 75, f"R$ {dados['valor_total']:.2f}")
+
+    # --- 5. RODAPÉ ---
+    y_final = 100
+    pdf.setFillColor(cor_roxo_vibrante)
+    pdf.setFont("Helvetica-Bold", 11)
+    pdf.drawCentredString(largura / 2, y_final, "Obrigado por confiar na DJ WASH!")
+
+    pdf.setFont("Helvetica", 9)
+    pdf.setFillColor(colors.grey)
+    pdf.drawCentredString(largura / 2, y_final - 15,
+                          "O QR Code para pagamento e a chave PIX foram enviados via mensagem.")
+    pdf.drawCentredString(largura / 2, y_final - 28, "Siga-nos no Instagram: @_djwash_")
+
+    pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+# --- CACHE DE RECIBOS ---
+# Chave = lavagem + versão do conteúdo (hash de tudo que vai no PDF, menos a emissão).
+# Qualquer mudança na lavagem, no cliente ou no veículo muda a versão, então o PDF antigo
+# nunca é servido; a versão também é o ETag da resposta.
+def versao(dados: dict) -> str:
+    conteudo = {k: v for k, v in dados.items() if k != "emissao"}
+    return hashlib.sha256(json.dumps(conteudo, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+
+def etag_confere(if_none_match: Optional[str], versao_atual: str) -> bool:
+    if not if_none_match:
+        return False
+    etags = [e.strip().removeprefix("W/").strip('"') for e in if_none_match.split(",")]
+    return "*" in etags or versao_atual in etags
+
+
+def caminho_cache(lavagem_id: int, versao_atual: str, modelo: str = "djwash") -> str:
+    return os.path.join(PASTA_CACHE, f"{modelo}_{lavagem_id}_{versao_atual}.pdf")
+
+
+def gravar_cache(destino: str, conteudo: bytes):
+    """Grava o PDF de forma atômica e apaga as versões antigas do mesmo recibo."""
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    temporario = f"{destino}.{uuid.uuid4().hex}.tmp"
+    with open(temporario, "wb") as f:
+        f.write(conteudo)
+    os.replace(temporario, destino)
+    prefixo = destino.rsplit("_", 1)[0]
+    for antigo in glob.glob(f"{prefixo}_*.pdf"):
+        if antigo != destino:
+            _remover(antigo)
+
+
+def invalidar(*lavagens_ids: int):
+    # Lavagens apagadas: remove os PDFs de todos os modelos, numa varredura só da pasta
+    # (nome: <modelo>_<lavagem_id>_<versao>.pdf)
+    ids = {str(i) for i in lavagens_ids}
+    if not ids:
+        return
+    try:
+        nomes = os.listdir(PASTA_CACHE)
+    except FileNotFoundError:
+        return
+    for nome in nomes:
+        partes = nome.split("_")
+        if nome.endswith(".pdf") and len(partes) >= 3 and partes[-2] in ids:
+            _remover(os.path.join(PASTA_CACHE, nome))
+
+
+def _remover(arquivo: str):
+    try:
+        os.remove(arquivo)
+    except FileNotFoundError:
+        pass
+
+
+def obter_recibo(dados: dict) -> Tuple[bytes, str]:
+    """PDF do recibo (do cache ou renderizado agora no executor de PDFs) e sua versão."""
+    versao_atual = versao(dados)
+    destino = caminho_cache(dados["id"], versao_atual)
+    try:
+        with open(destino, "rb") as f:
+            return f.read(), versao_atual
+    except FileNotFoundError:
+        pass
+    conteudo = renderizar_pdf(renderizar_recibo, dados)
+    gravar_cache(destino, conteudo)
+    return conteudo, versao_atual
+
+
+def _pre_renderizar(lavagem_id: int):
+    from app.database import SessionLeitura
+
+    db = SessionLeitura()
+    try:
+        lavagem = db.query(models.Lavagem).filter(models.Lavagem.id == lavagem_id).first()
+        if not lavagem:
+            return
+        dados = dados_recibo(lavagem)
+    finally:
+        db.close()
+    destino = caminho_cache(lavagem_id, versao(dados))
+    if not os.path.exists(destino):
+        try:
+            gravar_cache(destino, renderizar_recibo(dados))
+        except Exception:
+            logger.exception("Falha ao pré-renderizar o recibo %s", lavagem_id)
+
+
+def agendar(lavagem_id: int):
+    # Renderiza no pool de PDFs logo após a finalização; o cliente abre o link já pronto
+    executor_pdf.submit(_pre_renderizar, lavagem_id)
+
+
+if __name__ == "__main__":
+    # Uso: python -m app.recibos  -> limpa o cache de recibos (é recriado sob demanda)
+    arquivos = glob.glob(os.path.join(PASTA_CACHE, "*.pdf"))
+    for arquivo in arquivos:
+        _remover(arquivo)
+    print(f"Recibos em cache removidos: {len(arquivos)}")
@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session, selectinload
+
+from app import models
+
+# Ordenações aceitas pela tela e pela API de campanhas
+ORDENACOES = ("dias_desc", "dias_asc", "nome")
+POR_PAGINA_PADRAO = 50
+POR_PAGINA_MAXIMO = 500
+
+
+def _subquery_ultima_visita(db: Session):
+    # Uma única agregação: última lavagem concluída de cada cliente
+    return db.query(
+        models.Veiculo.cliente_id.label("cliente_id"),
+        func.max(models.Lavagem.data_inicio).label("ultima_visita")
+    ).join(
+        models.Lavagem, models.Lavagem.veiculo_id == models.Veiculo.id
+    ).filter(
+        models.Lavagem.status == "concluida"
+    ).group_by(models.Veiculo.cliente_id).subquery()
+
+
+def query_retencao(db: Session, hoje: datetime, dias_min: Optional[int] = None, dias_max: Optional[int] = None):
+    """(consulta dos clientes com a última visita, subquery da visita), sem ordenação nem página."""
+    ultima = _subquery_ultima_visita(db)
+    query = db.query(models.Cliente, ultima.c.ultima_visita).outerjoin(
+        ultima, ultima.c.cliente_id == models.Cliente.id
+    )
+
+    # Os filtros viram comparações de data (dias >= N  <=>  visita <= hoje - N dias)
+    if dias_min is not None:
+        query = query.filter(ultima.c.ultima_visita <= hoje - timedelta(days=dias_min))
+    if dias_max is not None:
+        query = query.filter(ultima.c.ultima_visita > hoje - timedelta(days=dias_max + 1))
+    return query, ultima
+
+
+def buscar_retencao(
+    db: Session,
+    dias_min: Optional[int] = None,
+    dias_max: Optional[int] = None,
+    ordenar: str = "dias_desc",
+    pagina: int = 1,
+    por_pagina: int = POR_PAGINA_PADRAO,
+    hoje: Optional[datetime] = None,
+    carregar_veiculos: bool = True
+) -> Tuple[List[models.Cliente], int]:
+    """Clientes com `ultima_visita` e `dias_ausente` calculados no banco.
+
+    `dias_min`/`dias_max` são inclusivos; com qualquer um deles informado,
+    clientes sem visita registrada ficam de fora. Retorna (página, total).
+    """
+    hoje = hoje or datetime.utcnow()
+    pagina = max(pagina, 1)
+    por_pagina = max(1, min(por_pagina, POR_PAGINA_MAXIMO))
+
+    query, ultima = query_retencao(db, hoje, dias_min, dias_max)
+    total = query.count()
+
+    if ordenar == "nome":
+        query = query.order_by(models.Cliente.nome, models.Cliente.id)
+    elif ordenar == "dias_asc":
+        query = query.order_by(ultima.c.ultima_visita.desc().nullslast(), models.Cliente.id)
+    else:
+        query = query.order_by(ultima.c.ultima_visita.asc().nullslast(), models.Cliente.id)
+
+    if carregar_veiculos:
+        query = query.options(selectinload(models.Cliente.veiculos))
+
+    linhas = query.offset((pagina - 1) * por_pagina).limit(por_pagina).all()
+
+    clientes = []
+    for cliente, ultima_visita in linhas:
+        cliente.ultima_visita = ultima_visita
+        cliente.dias_ausente = (hoje - ultima_visita).days if ultima_visita else None
+        clientes.append(cliente)
+
+    return clientes, total
+
+
+def cliente_para_dict(cliente: models.Cliente) -> dict:
+    return {
+        "id": cliente.id,
+        "nome": cliente.nome,
+        "telefone": cliente.telefone,
+        "ultima_visita": cliente.ultima_visita.isoformat() if cliente.ultima_visita else None,
+        "dias_ausente": cliente.dias_ausente
+    }
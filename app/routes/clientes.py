@@ -1,6 +1,5 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
-from typing import List
 from app.database import get_db
 from app import models, schemas
 router = APIRouter(
@@ -20,6 +19,5 @@ def criar_cliente(cliente: schemas.ClienteCreate, db: Session = Depends(get_db))
     db.refresh(db_cliente)
     return db_cliente
 
-@router.get("/", response_model=List[schemas.ClienteResponse])
-def listar_clientes(db: Session = Depends(get_db)):
-    return db.query(models.Cliente).all()
\ No newline at end of file
+
+# Listagem paginada: GET /clientes/ em app/routes/listagens.py
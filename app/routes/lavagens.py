@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from sqlalchemy.orm import Session
 from datetime import datetime
 from app.database import get_db
 from app import models, schemas
-from typing import List
 from fastapi import File, UploadFile # Para lidar com arquivos
+import io
 import shutil
 import os
 from fastapi.responses import FileResponse
@@ -13,7 +13,9 @@ from reportlab.lib.colors import HexColor  # O 'H' é maiúsculo
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 from reportlab.pdfgen import canvas
+from app import fotos, miniaturas, recibos
 router = APIRouter(prefix="/lavagens", tags=["Lavagens"])
+# Listagem paginada: GET /lavagens/ em app/routes/listagens.py
 
 
 @router.post("/iniciar", response_model=schemas.LavagemResponse)
@@ -52,11 +54,6 @@ def finalizar_lavagem(lavagem_id: int, dados: schemas.LavagemFinalizar, db: Sess
     db.refresh(db_lavagem)
     return db_lavagem
 
-@router.get("/", response_model=List[schemas.LavagemResponse])
-def listar_lavagens(db: Session = Depends(get_db)):
-    return db.query(models.Lavagem).all()
-
-
 @router.post("/{lavagem_id}/upload-foto")
 def upload_foto(
     lavagem_id: int,
@@ -77,25 +74,39 @@ def upload_foto(
     with open(caminho_final, "wb") as buffer:
         shutil.copyfileobj(arquivo.file, buffer)
 
-    # Salva o caminho no banco de dados
+    # Registra a foto (uma por tipo: a nova substitui a anterior)
     url_foto = f"/static/uploads/{nome_arquivo}"
-    if tipo == "antes":
-        db_lavagem.foto_antes = url_foto
-    else:
-        db_lavagem.foto_depois = url_foto
+    fotos.anexar(db, lavagem_id, "antes" if tipo == "antes" else "depois", [url_foto], substituir=True)
 
     db.commit()
     return {"url": url_foto}
 
 
 @router.get("/{lavagem_id}/recibo")
-def gerar_recibo(lavagem_id: int, db: Session = Depends(get_db)):
+def gerar_recibo(lavagem_id: int, request: Request, db: Session = Depends(get_db)):
     lavagem = db.query(models.Lavagem).filter(models.Lavagem.id == lavagem_id).first()
     veiculo = db.query(models.Veiculo).filter(models.Veiculo.id == lavagem.veiculo_id).first()
     cliente = db.query(models.Cliente).filter(models.Cliente.id == veiculo.cliente_id).first()
-
-    pdf_path = f"app/static/uploads/recibo_{lavagem_id}.pdf"
-    c = canvas.Canvas(pdf_path, pagesize=A4)
+    entrega = fotos.anexos(db, lavagem_id, ("antes", "depois"))
+    foto_antes, foto_depois = next(iter(entrega["antes"]), None), next(iter(entrega["depois"]), None)
+    derivadas = miniaturas.registradas(db, (foto_antes, foto_depois))
+
+    # Versão = tudo que é desenhado (inclusive qual variante de cada foto); muda -> novo PDF
+    versao = recibos.versao({
+        "cliente": cliente.nome, "marca": veiculo.marca, "modelo": veiculo.modelo, "placa": veiculo.placa,
+        "produtos": lavagem.produtos_usados, "tempo": lavagem.tempo_total, "valor": lavagem.valor_total,
+        "fotos": [miniaturas.melhor_variante(f, "print", derivadas) for f in (foto_antes, foto_depois)],
+    })
+    cabecalhos = {"ETag": f'"{versao}"', "Cache-Control": "private, no-cache"}
+    if recibos.etag_confere(request.headers.get("if-none-match"), versao):
+        return Response(status_code=304, headers=cabecalhos)
+
+    pdf_path = recibos.caminho_cache(lavagem_id, versao, modelo="galeria")
+    if os.path.exists(pdf_path):
+        return FileResponse(pdf_path, media_type='application/pdf', headers=cabecalhos)
+
+    buffer = io.BytesIO()
+    c = canvas.Canvas(buffer, pagesize=A4)
     largura, altura = A4
 
     # Cores da Marca
@@ -145,7 +156,7 @@ def gerar_recibo(lavagem_id: int, db: Session = Depends(get_db)):
     c.rect(largura - 7 * cm, altura - 9.8 * cm, 5.5 * cm, 1.5 * cm, fill=1)
     c.setFillColor(cor_destaque)
     c.setFont("Helvetica-Bold", 16)
-    c.drawRightString(largura - 2 * cm, altura - 9 * cm, f"TOTAL R$ {lavagem.valor:.2f}")
+    c.drawRightString(largura - 2 * cm, altura - 9 * cm, f"TOTAL R$ {(lavagem.valor_total or 0.0):.2f}")
 
     # --- FOTOS (Layout de Galeria) ---
     y_fotos = altura - 16 * cm
@@ -155,7 +166,8 @@ def gerar_recibo(lavagem_id: int, db: Session = Depends(get_db)):
         c.setFont("Helvetica-Bold", 10)
         c.drawString(x, y_fotos + 4.2 * cm, label)
 
-        caminho = os.path.join("app", url.lstrip('/')) if url else ""
+        # Versão de impressão (bem menor que a foto da câmera) quando já foi gerada
+        caminho = os.path.join("app", miniaturas.melhor_variante(url, "print", derivadas).lstrip('/')) if url else ""
         if caminho and os.path.exists(caminho):
             # Moldura fina em volta da foto
             c.setStrokeColor(colors.lightgrey)
@@ -167,8 +179,8 @@ def gerar_recibo(lavagem_id: int, db: Session = Depends(get_db)):
             c.setFillColor(colors.gray)
             c.drawCentredString(x + 4 * cm, y_fotos + 2 * cm, "Registro não disponível")
 
-    desenhar_moldura_foto(lavagem.foto_antes, 1.5 * cm, "REGISTRO: ANTES")
-    desenhar_moldura_foto(lavagem.foto_depois, 11 * cm, "REGISTRO: DEPOIS")
+    desenhar_moldura_foto(foto_antes, 1.5 * cm, "REGISTRO: ANTES")
+    desenhar_moldura_foto(foto_depois, 11 * cm, "REGISTRO: DEPOIS")
 
     # --- RODAPÉ COM PIX ---
     pix_path = os.path.join("app", "static", "pix_qr.png")
@@ -185,4 +197,5 @@ def gerar_recibo(lavagem_id: int, db: Session = Depends(get_db)):
 
     c.showPage()
     c.save()
-    return FileResponse(pdf_path, media_type='application/pdf')
\ No newline at end of file
+    recibos.gravar_cache(pdf_path, buffer.getvalue())
+    return FileResponse(pdf_path, media_type='application/pdf', headers=cabecalhos)
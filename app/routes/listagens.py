@@ -0,0 +1,66 @@
+from datetime import date
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
+
+from app import listagem
+from app.database import get_db_leitura
+
+# Listagens JSON para integrações: ?limit=&cursor=&fields=&desde=&ate=&status=&formato=ndjson
+# (a resposta paginada traz "proximo_cursor"; com formato=ndjson vem tudo, uma linha por registro)
+router = APIRouter(tags=["Listagens"])
+
+
+def _responder(db: Session, nome: str, formato: str, limite: int, **parametros):
+    if formato == "ndjson":
+        return StreamingResponse(
+            listagem.preparar_ndjson(nome, **parametros), media_type="application/x-ndjson",
+            headers={"Content-Disposition": f"attachment; filename={nome}.ndjson"}
+        )
+    return listagem.listar(db, nome, limite=limite, **parametros)
+
+
+@router.get("/lavagens/")
+def listar_lavagens(
+    limit: int = Query(listagem.LIMITE_PADRAO, ge=1, le=listagem.LIMITE_MAXIMO),
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None,
+    desde: Optional[date] = None,
+    ate: Optional[date] = None,
+    status: Optional[str] = None,
+    formato: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db_leitura)
+):
+    return _responder(db, "lavagens", formato, limit, fields=fields, cursor=cursor,
+                      desde=desde, ate=ate, status=status)
+
+
+@router.get("/clientes/")
+def listar_clientes(
+    limit: int = Query(listagem.LIMITE_PADRAO, ge=1, le=listagem.LIMITE_MAXIMO),
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None,
+    desde: Optional[date] = None,
+    ate: Optional[date] = None,
+    formato: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db_leitura)
+):
+    return _responder(db, "clientes", formato, limit, fields=fields, cursor=cursor, desde=desde, ate=ate)
+
+
+@router.get("/clientes/{cliente_id}/lavagens/")
+def listar_lavagens_do_cliente(
+    cliente_id: int,
+    limit: int = Query(listagem.LIMITE_PADRAO, ge=1, le=listagem.LIMITE_MAXIMO),
+    cursor: Optional[int] = None,
+    fields: Optional[str] = None,
+    desde: Optional[date] = None,
+    ate: Optional[date] = None,
+    status: Optional[str] = "concluida",
+    formato: str = Query("json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_db_leitura)
+):
+    return _responder(db, "lavagens", formato, limit, fields=fields, cursor=cursor, desde=desde, ate=ate,
+                      status=status, cliente_id=cliente_id)
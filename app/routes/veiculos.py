@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from app.database import get_db
-from app import models, schemas
+from app import busca, models, schemas
 
 router = APIRouter(prefix="/veiculos", tags=["Veículos"])
 
@@ -16,6 +16,8 @@ def cadastrar_veiculo(veiculo: schemas.VeiculoCreate, db: Session = Depends(get_
 
     db_veiculo = models.Veiculo(**veiculo.model_dump())
     db.add(db_veiculo)
+    db.flush()
+    busca.indexar_clientes(db, [db_veiculo.cliente_id])
     db.commit()
     db.refresh(db_veiculo)
     return db_veiculo
\ No newline at end of file
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from typing import List, Optional, Tuple
+
+from fastapi import HTTPException, UploadFile
+
+from app.executores import executor_arquivos
+
+PASTA_UPLOADS = "app/static/uploads"
+
+# Limites (MB) configuráveis por ambiente
+TAMANHO_CHUNK = 1024 * 1024
+LIMITE_ARQUIVO = int(float(os.getenv("DJWASH_UPLOAD_MAX_MB", "15")) * 1024 * 1024)
+LIMITE_REQUISICAO = int(float(os.getenv("DJWASH_UPLOAD_MAX_REQ_MB", "80")) * 1024 * 1024)
+LIMITE_IMPORTACAO = int(float(os.getenv("DJWASH_IMPORTACAO_MAX_MB", "50")) * 1024 * 1024)
+LIMITE_FORMULARIO = int(float(os.getenv("DJWASH_FORM_MAX_MB", "1")) * 1024 * 1024)
+
+# Limite do corpo por rota (LimiteUploadMiddleware): só as rotas de foto aceitam LIMITE_REQUISICAO,
+# a importação tem o seu e qualquer outro POST/PUT/PATCH fica em LIMITE_FORMULARIO
+LIMITES_POR_ROTA = (
+    (re.compile(r"/lavagens/\d+/finalizar"), LIMITE_REQUISICAO),
+    (re.compile(r"/lavagem/\d+/checklist"), LIMITE_REQUISICAO),
+    (re.compile(r"/importacao/csv"), LIMITE_IMPORTACAO),
+)
+
+# Assinaturas (magic bytes) das imagens aceitas e a extensão gravada para cada uma
+_ASSINATURAS = (
+    (0, b"\xff\xd8\xff", "jpg"),         # JPEG
+    (0, b"\x89PNG\r\n\x1a\n", "png"),    # PNG
+    (8, b"WEBP", "webp"),                # WEBP (RIFF....WEBP)
+    (4, b"ftypheic", "heic"),            # HEIC (iPhone)
+    (4, b"ftypheix", "heic"),
+    (4, b"ftypmif1", "heic"),
+)
+
+
+def _extensao_da_imagem(inicio: bytes) -> Optional[str]:
+    # A extensão vem do conteúdo, nunca do nome enviado (x.html com bytes de JPEG vira .jpg)
+    for pos, assinatura, extensao in _ASSINATURAS:
+        if inicio[pos:pos + len(assinatura)] == assinatura:
+            return extensao
+    return None
+
+
+async def _em_thread(funcao, *args):
+    # Escrita em disco no executor limitado de arquivos, sem travar o event loop
+    return await asyncio.get_running_loop().run_in_executor(executor_arquivos, funcao, *args)
+
+
+class _Orcamento:
+    # Bytes ainda disponíveis para a requisição inteira (compartilhado entre as fotos)
+    def __init__(self, limite: int):
+        self.restante = limite
+
+    def consumir(self, n: int):
+        self.restante -= n
+        if self.restante < 0:
+            raise HTTPException(status_code=413, detail="Fotos excedem o limite total da requisição")
+
+
+def _escrever(destino, hash_sha256, chunk: bytes):
+    destino.write(chunk)
+    hash_sha256.update(chunk)
+
+
+async def _gravar_temporario(arquivo: UploadFile, pasta: str, orcamento: _Orcamento) -> Tuple[str, str, str]:
+    temporario = os.path.join(pasta, f".tmp-{uuid.uuid4().hex}")
+    destino = await _em_thread(open, temporario, "wb")
+    hash_sha256 = hashlib.sha256()
+    tamanho = 0
+    extensao = None
+    try:
+        while chunk := await arquivo.read(TAMANHO_CHUNK):
+            if tamanho == 0 and (extensao := _extensao_da_imagem(chunk[:16])) is None:
+                raise HTTPException(status_code=415, detail=f"Arquivo '{arquivo.filename}' não é uma imagem")
+            tamanho += len(chunk)
+            if tamanho > LIMITE_ARQUIVO:
+                raise HTTPException(status_code=413, detail=f"Foto '{arquivo.filename}' excede o limite por arquivo")
+            orcamento.consumir(len(chunk))
+            await _em_thread(_escrever, destino, hash_sha256, chunk)
+    except BaseException:
+        await _em_thread(destino.close)
+        await _em_thread(_remover, temporario)
+        raise
+    await _em_thread(destino.close)
+    if extensao is None:
+        await _em_thread(_remover, temporario)
+        raise HTTPException(status_code=415, detail=f"Arquivo '{arquivo.filename}' não é uma imagem")
+    return temporario, hash_sha256.hexdigest(), extensao
+
+
+def _remover(caminho: str):
+    if os.path.exists(caminho):
+        os.remove(caminho)
+
+
+def _publicar(temporario: str, final: str):
+    # Mesmo conteúdo já armazenado: descarta o temporário (nenhum byte extra em disco)
+    if os.path.exists(final):
+        os.remove(temporario)
+        os.utime(final)  # Marca o uso recente para a coleta de lixo não apagar agora
+    else:
+        os.replace(temporario, final)
+
+
+async def salvar_fotos(fotos: List[Tuple[Optional[UploadFile], str]]) -> List[Optional[str]]:
+    """Grava várias fotos em paralelo e devolve os caminhos relativos (static/uploads/...).
+
+    Cada item é (arquivo, subpasta); o resultado segue a mesma ordem, com None para
+    campos de arquivo vazios. Os bytes vão em chunks para temporários na pasta de
+    destino e o nome final é o sha256 do conteúdo, então uma foto repetida reaproveita
+    o arquivo existente. Nada é publicado se qualquer foto falhar nos limites.
+    As referências no banco ficam a cargo de app.fotos.
+
+    Quando a rota roda, o Starlette já leu o formulário inteiro (spool em memória/disco):
+    os limites daqui só validam cada foto. Quem limita memória e disco da requisição é o
+    LimiteUploadMiddleware, antes do parse.
+    """
+    validas = [i for i, (arquivo, _) in enumerate(fotos) if arquivo and arquivo.filename]
+    caminhos: List[Optional[str]] = [None] * len(fotos)
+    if not validas:
+        return caminhos
+
+    orcamento = _Orcamento(LIMITE_REQUISICAO)
+    for i in validas:
+        os.makedirs(os.path.join(PASTA_UPLOADS, fotos[i][1]), exist_ok=True)
+
+    resultados = await asyncio.gather(
+        *(_gravar_temporario(fotos[i][0], os.path.join(PASTA_UPLOADS, fotos[i][1]), orcamento) for i in validas),
+        return_exceptions=True
+    )
+    erros = [r for r in resultados if isinstance(r, BaseException)]
+    if erros:
+        for r in resultados:
+            if not isinstance(r, BaseException):
+                await _em_thread(_remover, r[0])
+        raise erros[0]
+
+    for i, (temporario, sha256, extensao) in zip(validas, resultados):
+        subpasta = fotos[i][1]
+        nome_arquivo = f"{sha256}.{extensao}"
+        await _em_thread(_publicar, temporario, os.path.join(PASTA_UPLOADS, subpasta, nome_arquivo))
+        caminhos[i] = f"static/uploads/{subpasta}/{nome_arquivo}"
+    return caminhos
+
+
+class LimiteUploadMiddleware:
+    """Recusa com 413 corpos maiores que o limite da rota (LIMITES_POR_ROTA) antes do parse
+    do formulário.
+
+    Usa o Content-Length quando existe e, em uploads chunked, conta os bytes recebidos.
+    """
+
+    def __init__(self, app, limites=LIMITES_POR_ROTA, padrao: int = LIMITE_FORMULARIO):
+        self.app = app
+        self.limites = limites
+        self.padrao = padrao
+
+    def _limite(self, caminho: str) -> int:
+        return next((limite for padrao, limite in self.limites if padrao.fullmatch(caminho)), self.padrao)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            return await self.app(scope, receive, send)
+
+        limite = self._limite(scope["path"])
+        headers = dict(scope.get("headers") or [])
+        tamanho = headers.get(b"content-length")
+        if tamanho is not None and tamanho.isdigit() and int(tamanho) > limite:
+            return await self._recusar(send)
+
+        recebido = 0
+
+        async def receive_limitado():
+            nonlocal recebido
+            mensagem = await receive()
+            if mensagem["type"] == "http.request":
+                recebido += len(mensagem.get("body", b""))
+                if recebido > limite:
+                    raise HTTPException(status_code=413, detail="Requisição excede o limite de upload")
+            return mensagem
+
+        return await self.app(scope, receive_limitado, send)
+
+    async def _recusar(self, send):
+        corpo = b'{"detail":"Requisi\\u00e7\\u00e3o excede o limite de upload"}'
+        await send({"type": "http.response.start", "status": 413, "headers": [
+            (b"content-type", b"application/json"), (b"content-length", str(len(corpo)).encode())
+        ]})
+        await send({"type": "http.response.body", "body": corpo})
@@ -0,0 +1,108 @@
+"""Análise de rentabilidade (app.analise): consulta agrupada e cache por período.
+
+Popula um banco temporário com N lavagens concluídas (serviços x categorias x horários
+variados) e mede, para alguns períodos (com e sem meses pela metade):
+  - agrupamento direto no SQLite, sem nenhuma soma guardada (como num startup frio);
+  - período novo com as somas mensais já em memória (app.analise.calcular);
+  - período repetido (app.analise.rentabilidade, que só confere a assinatura no resumo).
+
+Uso (na raiz do projeto):
+    python benchmarks/analise_rentabilidade.py [--lavagens 100000] [--repeticoes 30]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import insert
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CATEGORIAS = ("hatch", "sedan", "suv", "pickup")
+
+
+def _popular(db, models, lavagens):
+    random.seed(7)
+    db.add(models.Configuracao(valor_hora=30.0))
+    db.execute(insert(models.ServicoCatalogo), [
+        {"nome": f"Serviço {i}", "preco_hatch": 50.0 + 10 * i, "preco_sedan": 60.0 + 10 * i,
+         "preco_suv": 80.0 + 10 * i, "preco_pickup": 90.0 + 10 * i} for i in range(12)
+    ])
+    veiculos = lavagens // 5
+    db.execute(insert(models.Cliente), [{"nome": f"Cliente {i}", "telefone": f"11{i:09d}"} for i in range(veiculos)])
+    db.execute(insert(models.Veiculo), [
+        {"marca": "VW", "modelo": "Gol", "placa": f"BEN{i:05d}", "categoria": CATEGORIAS[i % 4], "cliente_id": i + 1}
+        for i in range(veiculos)
+    ])
+    inicio = datetime(2022, 1, 1, 8)
+    linhas = []
+    for i in range(lavagens):
+        entrada = inicio + timedelta(days=i * 1000 // lavagens, hours=random.randrange(11), minutes=random.randrange(60))
+        minutos = random.randrange(30, 240)
+        valor, insumos, mao_de_obra = random.uniform(50, 300), random.uniform(5, 40), minutos / 2
+        linhas.append({
+            "veiculo_id": random.randrange(veiculos) + 1, "servico_id": random.randrange(12) + 1,
+            "status": "concluida", "data_inicio": entrada, "data_fim": entrada + timedelta(minutes=minutos),
+            "minutos_totais": minutos, "valor_total": valor, "custo_insumos": insumos,
+            "custo_mao_de_obra": mao_de_obra, "lucro_real": valor - insumos - mao_de_obra,
+        })
+    db.execute(insert(models.Lavagem), linhas)
+    db.commit()
+
+
+def _medir(SessionLeitura, funcao, repeticoes, antes=None):
+    tempos = []
+    for _ in range(repeticoes):
+        if antes:
+            antes()
+        db = SessionLeitura()
+        try:
+            inicio = time.perf_counter()
+            funcao(db)
+            tempos.append((time.perf_counter() - inicio) * 1000)
+        finally:
+            db.close()
+    tempos.sort()
+    return tempos[len(tempos) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lavagens", type=int, default=100000)
+    parser.add_argument("--repeticoes", type=int, default=30)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="djwash_bench_")
+    os.environ["DJWASH_DB_URL"] = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+    sys.path.insert(0, RAIZ)
+    from app import analise, financeiro, migracoes, models
+    from app.database import SessionLeitura, SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    db = SessionLocal()
+    _popular(db, models, args.lavagens)
+    financeiro.reconstruir(db)
+    db.close()
+
+    periodos = {
+        "tudo": (None, None),
+        "2 anos": (date(2022, 3, 15), date(2024, 3, 14)),
+        "um ano": (date(2023, 1, 1), date(2023, 12, 31)),
+        "um mês": (date(2023, 6, 1), date(2023, 6, 30)),
+        "10 dias": (date(2023, 6, 10), date(2023, 6, 19)),
+    }
+    print(f"{'período':>8} {'lavagens':>9} {'frio (ms)':>10} {'meses em cache (ms)':>20} {'período em cache (ms)':>22}")
+    for nome, (desde, ate) in periodos.items():
+        frio = _medir(SessionLeitura, lambda s: analise.calcular(s, desde, ate), max(args.repeticoes // 5, 1),
+                      antes=analise.limpar_cache)
+        analise.aquecer(SessionLeitura)
+        meses = _medir(SessionLeitura, lambda s: analise.calcular(s, desde, ate), args.repeticoes)
+        quantidade = analise.rentabilidade(SessionLeitura(), desde, ate)["total"]["quantidade"]
+        quente = _medir(SessionLeitura, lambda s: analise.rentabilidade(s, desde, ate), args.repeticoes)
+        print(f"{nome:>8} {quantidade:>9} {frio:>10.1f} {meses:>20.1f} {quente:>22.2f}")
+
+
+if __name__ == "__main__":
+    main()
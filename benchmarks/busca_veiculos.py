@@ -0,0 +1,103 @@
+"""Type-ahead do check-in: índice FTS5 normalizado x LIKE nas tabelas.
+
+Popula um banco temporário com N clientes/veículos (placas antigas e Mercosul,
+telefones com formatação variada, nomes com acento) e mede p50/p99 de cada
+termo digitado, do jeito que o formulário /novo consulta enquanto o usuário digita.
+
+Uso (na raiz do projeto):
+    python benchmarks/busca_veiculos.py [--veiculos 50000] [--repeticoes 200]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+NOMES = ["João", "José", "Márcia", "Antônio", "Conceição", "Luís", "Fábio", "Sebastião", "Ana", "Paulo"]
+SOBRENOMES = ["Silva", "Souza", "Gonçalves", "Araújo", "Simões", "Lima", "Brandão", "Estêvão"]
+TERMOS = ["jo", "joao", "joao sil", "sebast", "abc", "abc1", "abc1c", "abc-1234", "11", "1198", "(11) 98765", "98765-43"]
+
+
+def _placa(i):
+    letras = "".join(random.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ") for _ in range(3))
+    if i % 2:
+        return f"{letras}-{random.randint(0, 9999):04d}"
+    return f"{letras}{random.randint(0, 9)}{random.choice('ABCDEFGHIJ')}{random.randint(0, 99):02d}"
+
+
+def _telefone():
+    ddd, numero = random.choice(["11", "21", "92", "31"]), f"9{random.randint(0, 99999999):08d}"
+    return random.choice([f"({ddd}) {numero[:5]}-{numero[5:]}", f"{ddd} {numero}", f"{ddd}{numero}"])
+
+
+def _popular(conn, n):
+    random.seed(42)
+    conn.exec_driver_sql("DELETE FROM veiculos")
+    conn.exec_driver_sql("DELETE FROM clientes")
+    conn.exec_driver_sql(
+        "INSERT INTO clientes (id, nome, telefone) VALUES (?, ?, ?)",
+        [(i, f"{random.choice(NOMES)} {random.choice(SOBRENOMES)}", _telefone()) for i in range(1, n + 1)]
+    )
+    placas = set()
+    while len(placas) < n:
+        placas.add(_placa(len(placas)))
+    conn.exec_driver_sql(
+        "INSERT INTO veiculos (id, marca, modelo, placa, categoria, cliente_id) VALUES (?, 'VW', 'Gol', ?, 'hatch', ?)",
+        [(i, placa, i) for i, placa in enumerate(placas, start=1)]
+    )
+
+
+def _like(db, termo):
+    from sqlalchemy import text
+
+    padrao = f"%{termo}%"
+    return db.execute(text(
+        "SELECT v.id FROM veiculos v JOIN clientes c ON c.id = v.cliente_id "
+        "WHERE v.placa LIKE :p OR c.telefone LIKE :p OR c.nome LIKE :p LIMIT 10"
+    ), {"p": padrao}).fetchall()
+
+
+def _percentis(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return tempos[len(tempos) // 2], tempos[int(len(tempos) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--veiculos", type=int, default=50000)
+    parser.add_argument("--repeticoes", type=int, default=200)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="djwash_bench_")
+    os.environ["DJWASH_DB_URL"] = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+    sys.path.insert(0, RAIZ)
+    from app import busca, migracoes
+    from app.database import SessionLeitura, engine
+
+    migracoes.aplicar(engine)
+    with engine.begin() as conn:
+        _popular(conn, args.veiculos)
+        inicio = time.perf_counter()
+        busca.reconstruir(conn)
+        print(f"Índice de {args.veiculos} veículos reconstruído em {time.perf_counter() - inicio:.1f}s")
+
+    db = SessionLeitura()
+    print(f"{'termo':<12} {'achados':>7} {'FTS p50/p99 (ms)':>17} {'LIKE p50/p99 (ms)':>18}")
+    for termo in TERMOS:
+        achados = len(busca.buscar(db, termo))
+        fts = _percentis(lambda: busca.buscar(db, termo), args.repeticoes)
+        like = _percentis(lambda: _like(db, termo), max(args.repeticoes // 10, 5))
+        print(f"{termo:<12} {achados:>7} {fts[0]:>8.2f}/{fts[1]:<8.2f} {like[0]:>9.2f}/{like[1]:<8.2f}")
+    db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Latência do dashboard (/) com uploads de fotos em andamento.
+
+Sobe o app num uvicorn separado, com um banco temporário, e mede p50/p99 do
+GET / em duas fases: sem carga e com N uploads de checklist simultâneos.
+
+Uso (na raiz do projeto):
+    python benchmarks/concorrencia_dashboard.py [--uploads 4] [--mb 5] [--requisicoes 200]
+"""
+import argparse
+import os
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+import uuid
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTAS_UPLOAD = [os.path.join(RAIZ, "app", "static", "uploads", p) for p in ("checklists", "entregas")]
+
+
+def _listar_uploads():
+    return {os.path.join(p, f) for p in PASTAS_UPLOAD if os.path.isdir(p) for f in os.listdir(p)}
+
+
+def _preparar_banco(caminho, env):
+    subprocess.run([sys.executable, "-m", "app.migracoes"], cwd=RAIZ, env=env, check=True, capture_output=True)
+    conn = sqlite3.connect(caminho)
+    conn.execute("INSERT INTO clientes (id, nome, telefone) VALUES (1, 'Bench', '11999999999')")
+    conn.execute("INSERT INTO veiculos (id, marca, modelo, placa, categoria, cliente_id) VALUES (1, 'VW', 'Gol', 'BEN0001', 'hatch', 1)")
+    conn.execute("INSERT INTO servicos_catalogo (id, nome, preco_hatch, preco_sedan, preco_suv, preco_pickup) VALUES (1, 'Simples', 40, 45, 50, 55)")
+    for i in range(1, 301):
+        status = "em_andamento" if i % 20 == 0 else "concluida"
+        conn.execute(
+            "INSERT INTO lavagens (id, veiculo_id, servico_id, data_inicio, data_fim, status, valor_total, lucro_real) "
+            "VALUES (?, 1, 1, datetime('now'), datetime('now'), ?, 40, 30)", (i, status)
+        )
+    conn.commit()
+    conn.close()
+
+
+def _multipart(campo, nome_arquivo, conteudo):
+    fronteira = uuid.uuid4().hex
+    corpo = (
+        f"--{fronteira}\r\nContent-Disposition: form-data; name=\"combustivel\"\r\n\r\n1/2\r\n"
+        f"--{fronteira}\r\nContent-Disposition: form-data; name=\"{campo}\"; filename=\"{nome_arquivo}\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + conteudo + f"\r\n--{fronteira}--\r\n".encode()
+    return corpo, f"multipart/form-data; boundary={fronteira}"
+
+
+def _enviar_uploads(base, conteudo, parar):
+    corpo, tipo = _multipart("fotos_checklist", "bench.jpg", conteudo)
+    while not parar.is_set():
+        req = urllib.request.Request(f"{base}/lavagem/20/checklist", data=corpo, headers={"Content-Type": tipo})
+        try:
+            urllib.request.urlopen(req, timeout=60).read()
+        except Exception:
+            pass
+
+
+def _medir(base, n):
+    tempos = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        urllib.request.urlopen(f"{base}/", timeout=60).read()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return tempos
+
+
+def _resumo(nome, tempos):
+    q = statistics.quantiles(tempos, n=100)
+    print(f"{nome:<22} p50={q[49]:7.1f} ms   p99={q[98]:7.1f} ms   máx={max(tempos):7.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=4, help="uploads simultâneos")
+    parser.add_argument("--mb", type=float, default=5, help="tamanho de cada foto (MB)")
+    parser.add_argument("--requisicoes", type=int, default=200, help="GET / por fase")
+    parser.add_argument("--porta", type=int, default=8765)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="djwash_bench_")
+    banco = os.path.join(pasta, "bench.db")
+    env = dict(os.environ, DJWASH_DB_URL=f"sqlite:///{banco}")
+    _preparar_banco(banco, env)
+
+    antes = _listar_uploads()
+    base = f"http://127.0.0.1:{args.porta}"
+    servidor = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(args.porta), "--log-level", "warning"],
+        cwd=RAIZ, env=env
+    )
+    try:
+        for _ in range(100):
+            try:
+                urllib.request.urlopen(f"{base}/", timeout=1).read()
+                break
+            except Exception:
+                time.sleep(0.1)
+
+        _medir(base, 10)  # aquecimento
+        _resumo("sem uploads", _medir(base, args.requisicoes))
+
+        parar = threading.Event()
+        conteudo = b"\xff\xd8\xff\xe0" + os.urandom(int(args.mb * 1024 * 1024))  # cabeçalho JPEG
+        threads = [threading.Thread(target=_enviar_uploads, args=(base, conteudo, parar)) for _ in range(args.uploads)]
+        for t in threads:
+            t.start()
+        time.sleep(0.5)
+        _resumo(f"com {args.uploads} uploads", _medir(base, args.requisicoes))
+        parar.set()
+        for t in threads:
+            t.join()
+    finally:
+        servidor.terminate()
+        servidor.wait()
+        # Remove as fotos geradas pelo benchmark
+        for arquivo in _listar_uploads() - antes:
+            os.remove(arquivo)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Custo de insumos na finalização: consulta por produto x custeio pelo catálogo.
+
+Compara, para N produtos selecionados, o laço antigo (um Query.get por id), uma
+única consulta IN e o app.custeio (custos por dose do catálogo em memória).
+Cada repetição usa uma sessão nova, como numa requisição.
+
+Uso (na raiz do projeto):
+    python benchmarks/custeio_produtos.py [--produtos 1 5 15 50] [--repeticoes 500]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _por_id(db, models, ids):
+    total = 0.0
+    for p_id in ids:
+        produto = db.query(models.Produto).get(p_id)
+        if produto and produto.ml_total > 0:
+            total += (produto.preco_compra / produto.ml_total) * produto.ml_por_uso
+    return total
+
+
+def _consulta_in(db, models, ids):
+    produtos = db.query(models.Produto).filter(models.Produto.id.in_(ids)).all()
+    return sum((p.preco_compra / p.ml_total) * p.ml_por_uso for p in produtos if p.ml_total > 0)
+
+
+def _medir(SessionLocal, funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        db = SessionLocal()
+        try:
+            inicio = time.perf_counter()
+            funcao(db)
+            tempos.append((time.perf_counter() - inicio) * 1_000_000)
+        finally:
+            db.close()
+    tempos.sort()
+    return tempos[len(tempos) // 2]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--produtos", type=int, nargs="+", default=[1, 5, 15, 50])
+    parser.add_argument("--repeticoes", type=int, default=500)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="djwash_bench_")
+    os.environ["DJWASH_DB_URL"] = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+    sys.path.insert(0, RAIZ)
+    from app import catalogo, custeio, migracoes, models
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    db = SessionLocal()
+    db.add(models.Configuracao(valor_hora=30.0))
+    db.add_all(models.Produto(nome=f"Produto {i}", preco_compra=50.0 + i, ml_total=1000, ml_por_uso=20)
+               for i in range(max(args.produtos)))
+    catalogo.invalidar(db)
+    db.commit()
+    db.close()
+
+    fim = datetime.now()
+    inicio = fim - timedelta(hours=1)
+    print(f"{'produtos':>8} {'por id (µs)':>12} {'IN (µs)':>10} {'custeio (µs)':>13}")
+    for n in args.produtos:
+        ids = list(range(1, n + 1))
+        por_id = _medir(SessionLocal, lambda s: _por_id(s, models, ids), args.repeticoes)
+        em_lote = _medir(SessionLocal, lambda s: _consulta_in(s, models, ids), args.repeticoes)
+        cache = _medir(
+            SessionLocal, lambda s: custeio.calcular(catalogo.obter(s), inicio, fim, ids, 100.0), args.repeticoes
+        )
+        print(f"{n:>8} {por_id:>12.0f} {em_lote:>10.0f} {cache:>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Importação em massa (app.importacao): tempo e pico de memória por tamanho de arquivo.
+
+Gera CSVs com N lavagens antigas de uma base fixa de clientes/veículos e importa cada
+um num banco temporário novo. O pico de memória (tracemalloc, numa segunda rodada)
+deve ficar estável quando N cresce: o arquivo é lido em lotes.
+
+Uso (na raiz do projeto):
+    python benchmarks/importacao_csv.py [--lavagens 10000 100000] [--veiculos 20000]
+"""
+import argparse
+import csv
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_MEDIR = """
+import sys, time, tracemalloc
+from app import importacao, migracoes
+from app.database import SessionLocal, engine
+migracoes.aplicar(engine)
+if sys.argv[2] == "memoria":
+    tracemalloc.start()
+db = SessionLocal()
+with open(sys.argv[1], "rb") as arquivo:
+    relatorio = importacao.importar(db, importacao.abrir_texto(arquivo))
+db.close()
+pico = tracemalloc.get_traced_memory()[1] / 1024 / 1024 if sys.argv[2] == "memoria" else 0
+print(relatorio["segundos"], relatorio["lavagens_novas"], relatorio["total_erros"], round(pico, 1))
+"""
+
+
+def _gerar(caminho, lavagens, veiculos):
+    random.seed(7)
+    inicio = datetime(2023, 1, 1, 8)
+    with open(caminho, "w", newline="", encoding="utf-8") as arquivo:
+        escritor = csv.writer(arquivo, delimiter=";")
+        escritor.writerow(["Nome", "Telefone", "Marca", "Modelo", "Placa", "Categoria", "Data Início", "Data Fim",
+                           "Valor Total", "Custo Insumos", "Custo Mão de Obra"])
+        for i in range(lavagens):
+            v = random.randrange(veiculos)
+            entrada = inicio + timedelta(minutes=37 * i)
+            escritor.writerow([
+                f"Cliente {v // 2}", f"(11) 9{v // 2:08d}", "VW", "Gol", f"IMP{v:04d}"[:3] + f"{v % 10000:04d}",
+                "hatch", entrada.strftime("%d/%m/%Y %H:%M"), (entrada + timedelta(minutes=75)).strftime("%d/%m/%Y %H:%M"),
+                "89,90", "12,50", "30,00",
+            ])
+
+
+def _rodar(csv_caminho, modo):
+    pasta = tempfile.mkdtemp(prefix="djwash_bench_")
+    env = dict(os.environ, DJWASH_DB_URL=f"sqlite:///{os.path.join(pasta, 'bench.db')}")
+    saida = subprocess.run([sys.executable, "-c", _MEDIR, csv_caminho, modo], cwd=RAIZ, env=env,
+                           check=True, capture_output=True, text=True).stdout.split()
+    shutil.rmtree(pasta, ignore_errors=True)
+    return saida
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lavagens", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--veiculos", type=int, default=20000)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="djwash_bench_csv_")
+    print(f"{'lavagens':>9} {'tamanho':>9} {'tempo (s)':>10} {'linhas/s':>9} {'erros':>6} {'pico (MB)':>10}")
+    for n in args.lavagens:
+        caminho = os.path.join(pasta, f"lavagens_{n}.csv")
+        _gerar(caminho, n, args.veiculos)
+        segundos, gravadas, erros, _ = _rodar(caminho, "tempo")
+        pico = _rodar(caminho, "memoria")[3]
+        tamanho = os.path.getsize(caminho) / 1024 / 1024
+        print(f"{gravadas:>9} {tamanho:>7.1f}MB {float(segundos):>10.2f} {n / float(segundos):>9.0f} {erros:>6} {pico:>10}")
+    shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
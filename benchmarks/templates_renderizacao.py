@@ -0,0 +1,111 @@
+"""Renderização dos templates: partida a frio (compilação) e regime (cache de fragmentos).
+
+Partida a frio: tempo para um Environment novo (como um worker recém-criado) carregar
+todos os templates, compilando do zero e lendo o bytecode já gravado em disco.
+Regime: renderização do dashboard (index.html) com N cards e do /clientes_gestao,
+com o cache de fragmentos desligado e aquecido.
+
+Uso (na raiz do projeto):
+    python benchmarks/templates_renderizacao.py [--lavagens 60] [--repeticoes 50]
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from jinja2 import Environment, FileSystemBytecodeCache, FileSystemLoader
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _mediana(funcao, repeticoes):
+    tempos = []
+    for _ in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    tempos.sort()
+    return tempos[len(tempos) // 2]
+
+
+def _carregar_todos(fragmentos, filtros, pasta_bytecode=None):
+    env = Environment(loader=FileSystemLoader(os.path.join(RAIZ, "app", "templates")), autoescape=True)
+    env.filters.update(filtros)
+    if pasta_bytecode:
+        env.bytecode_cache = FileSystemBytecodeCache(pasta_bytecode)
+    env.add_extension(fragmentos.CacheFragmentos)
+    return fragmentos.precompilar(env)
+
+
+def _popular(SessionLocal, models, n):
+    db = SessionLocal()
+    db.add(models.ServicoCatalogo(nome="Completa", preco_hatch=80, preco_sedan=90, preco_suv=100, preco_pickup=110))
+    for i in range(1, n + 1):
+        cliente = models.Cliente(nome=f"Cliente {i}", telefone=f"1199999{i:04d}")
+        veiculo = models.Veiculo(marca="VW", modelo="Gol", placa=f"BEN{i:04d}", categoria="hatch", cliente=cliente)
+        status = "em_andamento" if i % 3 == 0 else "concluida"
+        db.add(models.Lavagem(veiculo=veiculo, servico_id=1, status=status, valor_total=80.0,
+                              lucro_real=35.0, tempo_total="01:10" if status == "concluida" else None))
+    db.commit()
+    db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lavagens", type=int, default=60)
+    parser.add_argument("--repeticoes", type=int, default=50)
+    args = parser.parse_args()
+
+    pasta = tempfile.mkdtemp(prefix="djwash_bench_")
+    os.environ["DJWASH_DB_URL"] = f"sqlite:///{os.path.join(pasta, 'bench.db')}"
+    os.environ["DJWASH_CACHE_TEMPLATES"] = os.path.join(pasta, "templates")
+    os.chdir(RAIZ)
+    sys.path.insert(0, RAIZ)
+    from app import agenda, dashboard, fragmentos, migracoes, models, retencao
+    from app.database import SessionLocal, engine
+    from app.main import templates
+
+    # --- Partida a frio ---
+    filtros = templates.env.filters
+    n_templates = _carregar_todos(fragmentos, filtros)
+    sem_bytecode = _mediana(lambda: _carregar_todos(fragmentos, filtros), 10)
+    pasta_bytecode = os.path.join(pasta, "bytecode")
+    os.makedirs(pasta_bytecode)
+    _carregar_todos(fragmentos, filtros, pasta_bytecode)
+    com_bytecode = _mediana(lambda: _carregar_todos(fragmentos, filtros, pasta_bytecode), 10)
+    print(f"Partida a frio ({n_templates} templates): compilando {sem_bytecode:.1f} ms | "
+          f"bytecode em disco {com_bytecode:.1f} ms")
+
+    # --- Regime ---
+    migracoes.aplicar(engine)
+    _popular(SessionLocal, models, args.lavagens)
+    db = SessionLocal()
+    ativas = dashboard.buscar_lavagens_ativas(db)
+    concluidas, cursor = dashboard.buscar_lavagens_concluidas(db)
+    contexto_index = {
+        "request": None, "lavagens": ativas + concluidas, "produtos_disponiveis": [],
+        "clientes_recentes": db.query(models.Cliente).limit(10).all(), "proximo_cursor": cursor,
+        "previsoes": agenda.prever(db, ativas),
+    }
+    clientes, total = retencao.buscar_retencao(db)
+    contexto_clientes = {"request": None, "clientes": clientes, "total": total, "pagina": 1,
+                         "tem_proxima": False, "dias_min": None, "ordenar": "dias_desc"}
+    db.close()
+
+    print(f"{'página':<16} {'sem cache (ms)':>15} {'cache quente (ms)':>18}")
+    for nome, contexto in (("index.html", contexto_index), ("clientes.html", contexto_clientes)):
+        template = templates.env.get_template(nome)
+        fragmentos.MAX_FRAGMENTOS = 0
+        desligado = _mediana(lambda: template.render(contexto), args.repeticoes)
+        fragmentos.MAX_FRAGMENTOS = 5000
+        template.render(contexto)
+        quente = _mediana(lambda: template.render(contexto), args.repeticoes)
+        print(f"{nome:<16} {desligado:>15.2f} {quente:>18.2f}")
+
+    shutil.rmtree(pasta, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
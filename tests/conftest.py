@@ -0,0 +1,31 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+# Banco temporário para os testes (o app lê DJWASH_DB_URL na importação de app.database)
+_PASTA = tempfile.mkdtemp(prefix="djwash_testes_")
+os.environ.setdefault("DJWASH_DB_URL", f"sqlite:///{os.path.join(_PASTA, 'testes.db')}")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def db():
+    from app import migracoes, models
+    from app.database import SessionLocal, engine
+
+    migracoes.aplicar(engine)
+    sessao = SessionLocal()
+    try:
+        yield sessao
+    finally:
+        sessao.rollback()
+        sessao.close()
+        # Cada teste começa com as tabelas vazias
+        with engine.begin() as conn:
+            conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+            for tabela in reversed(models.Base.metadata.sorted_tables):
+                conn.execute(tabela.delete())
+            conn.exec_driver_sql("DELETE FROM busca_veiculos")  # Índice FTS5, fora dos modelos
+            conn.exec_driver_sql("PRAGMA foreign_keys=ON")
@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+
+from app import agenda, models
+
+
+def _lavagem(db):
+    servico = models.ServicoCatalogo(nome="Lavagem simples")
+    veiculo = models.Veiculo(placa="ABC1D23", modelo="Gol", categoria="Hatch")
+    db.add_all([servico, veiculo])
+    db.flush()
+    lavagem = models.Lavagem(veiculo_id=veiculo.id, servico_id=servico.id, status="em_andamento",
+                             data_inicio=datetime(2025, 3, 1, 9))
+    db.add(lavagem)
+    db.flush()
+    return lavagem
+
+
+def _finalizar(db, lavagem, minutos):
+    # Mesma ordem de _finalizar_no_banco: registra a duração e só depois conclui
+    lavagem.data_fim = lavagem.data_inicio + timedelta(minutes=minutos)
+    agenda.registrar_duracao(db, lavagem, minutos * 60)
+    lavagem.status = "concluida"
+    db.flush()
+
+
+def test_reenvio_da_finalizacao_nao_conta_a_duracao_duas_vezes(db):
+    lavagem = _lavagem(db)
+    _finalizar(db, lavagem, 40)
+    _finalizar(db, lavagem, 90)  # Formulário enviado de novo (duplo clique, nova tentativa)
+
+    estimativa = db.query(models.EstimativaDuracao).one()
+    assert (estimativa.servico_id, estimativa.categoria) == (lavagem.servico_id, "hatch")
+    assert estimativa.amostras == 1
+    assert estimativa.media_segundos == 40 * 60
@@ -0,0 +1,22 @@
+from app import busca, models
+
+
+def _cadastrar(db, nome, telefone):
+    cliente = models.Cliente(nome=nome, telefone=telefone)
+    db.add(cliente)
+    db.flush()
+    busca.indexar_clientes(db, [cliente.id])
+    db.commit()
+    return cliente
+
+
+def test_cliente_por_telefone_com_e_sem_ddd(db):
+    sem_ddd = _cadastrar(db, "Ana", "98765-4321")
+    com_ddd = _cadastrar(db, "Bia", "(21) 3333-4444")
+
+    assert busca.cliente_por_telefone(db, "(11) 98765-4321").id == sem_ddd.id
+    assert busca.cliente_por_telefone(db, "+55 11 98765-4321").id == sem_ddd.id
+    assert busca.cliente_por_telefone(db, "987654321").id == sem_ddd.id
+    assert busca.cliente_por_telefone(db, "3333-4444").id == com_ddd.id
+    assert busca.cliente_por_telefone(db, "+55 (21) 3333-4444").id == com_ddd.id
+    assert busca.cliente_por_telefone(db, "(11) 91234-5678") is None
@@ -0,0 +1,31 @@
+from datetime import datetime, timedelta
+
+from app import custeio
+
+
+def _catalogo(**produtos):
+    return {
+        "valor_hora": 30.0,
+        "produtos": {
+            i: {"id": i, "nome": nome, "custo_dose": custo, "ml_total": ml_total, "ml_por_uso": 20}
+            for i, (nome, custo, ml_total) in enumerate(produtos.values(), start=1)
+        },
+        "servicos": {},
+    }
+
+
+def test_produto_sem_preco_continua_na_lavagem():
+    cat = _catalogo(shampoo=("Shampoo", 2.5, 1000), brinde=("Cera doada", 0.0, 500), quebrado=("Sem frasco", 0.0, 0))
+    inicio = datetime(2025, 3, 10, 9)
+
+    custos = custeio.calcular(cat, inicio, inicio + timedelta(hours=1), [1, 2, 3], valor_cobrado=100.0)
+
+    assert [p["id"] for p in custos["produtos"]] == [1, 2]
+    assert custos["produtos_usados"] == "Shampoo, Cera doada"
+    assert custos["custo_insumos"] == 2.5
+    assert custos["lucro_real"] == round(100.0 - 2.5 - 30.0, 2)
+
+
+def test_produto_desconhecido_e_ignorado():
+    cat = _catalogo(shampoo=("Shampoo", 2.5, 1000))
+    assert custeio.produtos_da_lista(cat, [1, 99]) == [cat["produtos"][1]]
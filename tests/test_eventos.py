@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+from sqlalchemy import func, select
+
+from app import eventos
+from app.database import SessionLocal
+
+
+@pytest.fixture(autouse=True)
+def consulta_rapida(monkeypatch):
+    monkeypatch.setattr(eventos, "INTERVALO_CONSULTA", 0.01)
+
+
+def _receber(ultimo_id, quantos, publicar_depois=()):
+    # Conecta, publica (como outro worker, por outra sessão) e junta as mensagens recebidas
+    async def rodar():
+        recebidas = []
+
+        async def desconectado():
+            return len(recebidas) >= quantos
+
+        fluxo = eventos.assinar(ultimo_id, desconectado)
+        async for mensagem in fluxo:
+            if mensagem.startswith("retry"):
+                for tipo in publicar_depois:
+                    outro_worker = SessionLocal()
+                    eventos.publicar(outro_worker, tipo, {})
+                    outro_worker.close()
+                continue
+            recebidas.append(mensagem)
+            if len(recebidas) >= quantos:
+                break
+        await fluxo.aclose()
+        return recebidas
+
+    return asyncio.run(asyncio.wait_for(rodar(), 5))
+
+
+def _tipos(mensagens):
+    return [m.split("\n")[1].removeprefix("event: ") for m in mensagens]
+
+
+def test_evento_gravado_chega_em_qualquer_worker(db):
+    assert _tipos(_receber(None, 2, publicar_depois=("lavagem_criada", "previsoes"))) == ["lavagem_criada", "previsoes"]
+
+
+def test_reconexao_recebe_os_perdidos(db):
+    eventos.publicar(db, "lavagem_criada", {"id": 1})
+    ultimo = db.execute(select(func.max(eventos.E.id))).scalar()
+    eventos.publicar(db, "lavagem_finalizada", {"id": 1})
+
+    assert _tipos(_receber(str(ultimo), 1)) == ["lavagem_finalizada"]
+
+
+@pytest.mark.parametrize("ultimo_id", ["abc", "999999", "antigo"])
+def test_id_desconhecido_ou_antigo_pede_recarga(db, monkeypatch, ultimo_id):
+    monkeypatch.setattr(eventos, "HISTORICO", 2)
+    for _ in range(4):
+        eventos.publicar(db, "lavagem_criada", {})
+    if ultimo_id == "antigo":
+        ultimo_id = str(db.execute(select(func.min(eventos.E.id))).scalar() - 2)
+
+    assert _tipos(_receber(ultimo_id, 1)) == ["recarregar"]
+
+
+def test_publicar_varios_grava_tudo_num_commit(db, monkeypatch):
+    commits = []
+    monkeypatch.setattr(db, "commit", lambda: commits.append(1))
+    eventos.publicar_varios(db, [("lavagens_excluidas", {"ids": [1, 2, 3]}), ("previsoes", {})])
+
+    assert len(commits) == 1
+    tipos = [t for (t,) in db.execute(select(eventos.E.tipo).order_by(eventos.E.id))]
+    assert tipos == ["lavagens_excluidas", "previsoes"]
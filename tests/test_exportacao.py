@@ -0,0 +1,33 @@
+import json
+import os
+import time
+from datetime import date
+
+from app import exportacao
+
+
+def test_estado_fica_em_disco_para_outros_workers(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacao, "PASTA_EXPORTACOES", str(tmp_path))
+
+    exportacao_id = exportacao.iniciar(date(2025, 1, 1), date(2025, 1, 31))
+    while (estado := exportacao.progresso(exportacao_id))["status"] in ("na_fila", "processando"):
+        time.sleep(0.05)
+
+    assert estado["status"] == "concluida"
+    assert estado["percentual"] == 100.0
+    with open(tmp_path / f"{exportacao_id}.json") as arquivo:
+        assert json.load(arquivo)["arquivo"] == str(tmp_path / f"{exportacao_id}.zip")
+    assert os.path.exists(estado["arquivo"])
+    assert exportacao.progresso("../../etc/passwd") is None
+
+
+def test_exportacao_de_processo_que_morreu(tmp_path, monkeypatch):
+    monkeypatch.setattr(exportacao, "PASTA_EXPORTACOES", str(tmp_path))
+    antigo = time.time() - exportacao.ABANDONO_SEGUNDOS - 1
+    exportacao._gravar_estado({
+        "id": "a" * 32, "data_inicio": "2025-01-01", "data_fim": "2025-01-31", "status": "processando",
+        "total": 10, "feitos": 3, "arquivo": None, "erro": None, "criado_em": antigo, "terminado_em": None,
+        "atualizado_em": antigo,
+    })
+
+    assert exportacao.progresso("a" * 32)["status"] == "erro"
@@ -0,0 +1,29 @@
+import hashlib
+import json
+
+from app import fotos, models
+
+
+def test_deduplicar_atualiza_fotos_das_exclusoes_arquivadas(db, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    pasta = tmp_path / "app" / "static" / "uploads" / "entregas"
+    pasta.mkdir(parents=True)
+    conteudo = b"foto antiga"
+    (pasta / "entrada_1_1700000000.jpg").write_bytes(conteudo)
+    antigo = "static/uploads/entregas/entrada_1_1700000000.jpg"
+    novo = f"static/uploads/entregas/{hashlib.sha256(conteudo).hexdigest()}.jpg"
+    db.add(models.FotoArmazenada(caminho=antigo, referencias=1, tamanho=len(conteudo)))
+    arquivo = models.ExclusaoArquivada(tipo="veiculo", descricao="ABC1234", lavagens=1, dados=json.dumps({
+        "clientes": [], "veiculos": [], "lavagens": [{"id": 1}],
+        "anexos": [{"lavagem_id": 1, "tipo": "antes", "caminho": antigo, "criado_em": "2024-01-01T10:00:00"}],
+    }))
+    db.add(arquivo)
+    db.commit()
+
+    fotos.deduplicar(db)
+
+    db.refresh(arquivo)
+    assert json.loads(arquivo.dados)["anexos"][0]["caminho"] == novo
+    assert (tmp_path / "app" / novo).read_bytes() == conteudo
+    assert db.get(models.FotoArmazenada, novo).referencias == 1
+    assert db.get(models.FotoArmazenada, antigo) is None
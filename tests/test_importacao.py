@@ -0,0 +1,23 @@
+import io
+
+from app import importacao, models
+
+
+def _importar(db, csv):
+    return importacao.importar(db, io.StringIO(csv))
+
+
+def test_cliente_existente_com_e_sem_ddd(db):
+    db.add_all([models.Cliente(nome="Ana", telefone="98765-4321"), models.Cliente(nome="Bia", telefone="(21) 3333-4444")])
+    db.commit()
+
+    relatorio = _importar(db, "nome,telefone,placa\n"
+                              "Ana Souza,+55 11 98765-4321,ABC1234\n"
+                              "Bia,3333-4444,XYZ9876\n"
+                              "Caio,(11) 91234-5678,DEF5678\n"
+                              "Caio S.,912345678,GHI9012\n")
+
+    assert relatorio["total_erros"] == 0
+    assert relatorio["clientes_novos"] == 1
+    donos = {v.placa: v.cliente.nome for v in db.query(models.Veiculo)}
+    assert donos == {"ABC1234": "Ana", "XYZ9876": "Bia", "DEF5678": "Caio", "GHI9012": "Caio"}
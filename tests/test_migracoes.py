@@ -0,0 +1,25 @@
+from datetime import datetime, timedelta
+
+from app import financeiro, migracoes, models
+
+
+def _lavagem(inicio, **valores):
+    return models.Lavagem(status="concluida", data_inicio=inicio, data_fim=inicio + timedelta(hours=1), **valores)
+
+
+def test_resumo_remontado_confere_com_as_lavagens(db):
+    db.add_all([
+        _lavagem(datetime(2025, 3, 10, 9), valor_total=100.125, custo_insumos=2.5, lucro_real=60.0,
+                 custo_fixo_rateado=12.345),
+        _lavagem(datetime(2025, 3, 10, 14), valor_total=80.0, custo_mao_de_obra=30.0, lucro_real=50.0),
+        _lavagem(datetime(2025, 3, 11, 9), valor_total=50.0, lucro_real=None),
+        models.Lavagem(status="em_andamento", data_inicio=datetime(2025, 3, 11, 10), valor_total=999.0),
+    ])
+    db.add(models.ResumoFinanceiroDiario(dia=datetime(2025, 3, 1).date(), quantidade=7, faturamento_centavos=1))
+    db.commit()
+
+    migracoes._v12_remontar_resumo(db.connection())
+    db.commit()
+
+    assert financeiro.conferir(db) == []
+    assert [r.quantidade for r in db.query(models.ResumoFinanceiroDiario).order_by("dia")] == [2, 1]
@@ -0,0 +1,20 @@
+import os
+
+from app import miniaturas, models
+
+FOTO = "static/uploads/entregas/" + "a" * 64 + ".jpg"
+
+
+def test_variante_gravada_dispensa_o_disco(db, monkeypatch):
+    db.add(models.FotoArmazenada(caminho=FOTO, referencias=1, caminho_web="static/uploads/derivadas/entregas/w.jpg"))
+    db.commit()
+    consultas = []
+    monkeypatch.setattr(os.path, "exists", lambda c: consultas.append(c) or False)
+
+    derivadas = miniaturas.registradas(db, ["/" + FOTO])
+
+    assert miniaturas.melhor_variante("/" + FOTO, "web", derivadas) == "/static/uploads/derivadas/entregas/w.jpg"
+    assert consultas == []
+    # Coluna vazia: cai para o disco, e sem derivada no disco fica o original
+    assert miniaturas.melhor_variante(FOTO, "thumb", derivadas) == FOTO
+    assert consultas == [miniaturas._arquivo(miniaturas.caminho_variante(FOTO, "thumb"))]
@@ -0,0 +1,11 @@
+from app import planos
+
+
+def test_consultas_quentes_usam_indice(db):
+    assert planos.verificar_planos(db.get_bind()) == []
+
+
+def test_usa_indice():
+    assert not planos._usa_indice(["SCAN lavagens"])
+    assert planos._usa_indice(["SEARCH lavagens USING INDEX ix_lavagens_status_data_fim (status=?)"])
+    assert planos._usa_indice(["MATERIALIZE anon_1", "SEARCH lavagens USING INDEX ix (status=?)", "SCAN anon_1"])
@@ -0,0 +1,47 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app import catalogo, models, rateio
+
+
+@pytest.fixture
+def custos_fixos(db):
+    # R$ 3.000,00 de custos fixos por mês, rateados pelos minutos de cada lavagem
+    db.add(models.Configuracao(valor_hora=30.0, criterio_rateio="minutos"))
+    db.add(models.CustoFixo(item="Aluguel", valor=3000.0))
+    db.commit()
+    catalogo.invalidar(db)
+    return db
+
+
+def _concluir(db, fim, minutos, valor=100.0):
+    lavagem = models.Lavagem(status="concluida", data_inicio=fim - timedelta(minutes=minutos), data_fim=fim,
+                             minutos_totais=minutos, valor_total=valor)
+    lavagem.custo_fixo_rateado = rateio.ratear(db, fim, minutos, valor)
+    db.add(lavagem)
+    db.flush()
+    return lavagem.custo_fixo_rateado
+
+
+def test_primeira_lavagem_do_mes_paga_a_taxa_do_mes_fechado(custos_fixos):
+    db = custos_fixos
+    # Fevereiro: 100 lavagens de 60 min (6.000 min); fechado na primeira finalização de março
+    for i in range(100):
+        _concluir(db, datetime(2025, 2, 1, 9) + timedelta(hours=6 * i), 60)
+
+    primeira = _concluir(db, datetime(2025, 3, 1, 8, 5), 60)
+
+    assert db.get(models.RateioMensal, "2025-02").fechado_em is not None
+    assert primeira == 30.0  # R$ 3.000 / 6.000 min x 60 min
+    assert _concluir(db, datetime(2025, 3, 1, 9), 0) == 0.0
+
+
+def test_sem_mes_fechado_usa_a_capacidade_e_o_valor_cobrado_limita(custos_fixos):
+    db = custos_fixos
+
+    parte = _concluir(db, datetime(2025, 3, 1, 8, 5), 60)
+
+    assert parte == round(3000 * 60 / rateio.CAPACIDADE_MINUTOS, 2)
+    assert parte < 100
+    assert _concluir(db, datetime(2025, 3, 1, 12), 600, valor=20.0) == 20.0
@@ -0,0 +1,14 @@
+from app import recibos
+
+
+def test_invalidar_remove_so_os_pdfs_das_lavagens(tmp_path, monkeypatch):
+    monkeypatch.setattr(recibos, "PASTA_CACHE", str(tmp_path))
+    for nome in ("djwash_1_abc.pdf", "galeria_1_def.pdf", "djwash_11_abc.pdf", "djwash_2_abc.pdf", "djwash_3_abc.pdf"):
+        (tmp_path / nome).write_bytes(b"%PDF")
+
+    recibos.invalidar(1, 2)
+
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["djwash_11_abc.pdf", "djwash_3_abc.pdf"]
+    recibos.invalidar()  # Nada a apagar
+    monkeypatch.setattr(recibos, "PASTA_CACHE", str(tmp_path / "nao_existe"))
+    recibos.invalidar(3)
@@ -0,0 +1,57 @@
+import asyncio
+import io
+import os
+import re
+
+import pytest
+from fastapi import HTTPException, UploadFile
+
+from app import uploads
+
+JPEG = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00" + b"\x00" * 64
+
+
+def _salvar(*arquivos):
+    return asyncio.run(uploads.salvar_fotos([(UploadFile(io.BytesIO(c), filename=n), "testes") for n, c in arquivos]))
+
+
+def test_extensao_vem_da_assinatura(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "PASTA_UPLOADS", str(tmp_path))
+
+    (caminho,) = _salvar(("x.html", JPEG))
+
+    assert caminho.endswith(".jpg")
+    assert os.listdir(tmp_path / "testes") == [os.path.basename(caminho)]
+
+
+def test_arquivo_que_nao_e_imagem_e_recusado(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, "PASTA_UPLOADS", str(tmp_path))
+
+    with pytest.raises(HTTPException) as erro:
+        _salvar(("foto.jpg", b"<script>alert(1)</script>"))
+
+    assert erro.value.status_code == 415
+    assert os.listdir(tmp_path / "testes") == []
+
+
+def test_limite_do_corpo_depende_da_rota():
+    from fastapi import FastAPI, Request
+    from fastapi.testclient import TestClient
+
+    app = FastAPI()
+
+    @app.post("/{caminho:path}")
+    async def eco(request: Request):
+        return {"bytes": len(await request.body())}
+
+    app.add_middleware(uploads.LimiteUploadMiddleware, padrao=10, limites=(
+        (re.compile(r"/lavagens/\d+/finalizar"), 100),
+        (re.compile(r"/importacao/csv"), 50),
+    ))
+    cliente = TestClient(app)
+
+    assert cliente.post("/lavagens/1/finalizar", content=b"x" * 100).status_code == 200
+    assert cliente.post("/lavagens/1/finalizar", content=b"x" * 101).status_code == 413
+    assert cliente.post("/importacao/csv", content=b"x" * 100).status_code == 413
+    assert cliente.post("/importacao/csv", content=b"x" * 50).status_code == 200
+    assert cliente.post("/clientes", content=b"x" * 11).status_code == 413